@@ -1,22 +1,67 @@
 # Standard library
 from abc import ABC, abstractmethod
+import asyncio
+import bisect
+import concurrent.futures
+import contextlib
+import contextvars
+import copy
+import functools
+import hashlib
+import heapq
+import random
+import sqlite3
+import statistics
+import threading
 import time
 import json
+import math
 import re
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from enum import Enum
+from types import SimpleNamespace
 from typing import Callable, Any, Optional, Type, Union, List, Tuple
 from urllib.parse import urlparse, urlunparse
 
 # Third-party libraries
 import torch
 import requests
+import httpx
 import openai
 import anthropic
 
+# ComfyUI server, used to push streamed text to the frontend and serve metrics. Not available outside of ComfyUI
+try:
+    from server import PromptServer
+    from aiohttp import web
+except ImportError:
+    PromptServer = None
+    web = None
+
+# ComfyUI's processing-interrupted flag, set when the user cancels the running queue item. Not available outside of ComfyUI
+try:
+    import comfy.model_management as model_management
+except ImportError:
+    model_management = None
+
+# Optional exact token counts for OpenAI models, a heuristic estimate is used without it
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Optional faster JSON encoding/decoding of request and response bodies, the json module is used without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Local modules
 from .mng_json import json_manager, TroubleSgltn
 from .fetch_models import RequestMode
-from .utils import ImageUtils
+from .utils import ImageUtils, TransportSgltn, CircuitBreakerSgltn, ClientPoolSgltn, HealthProberSgltn
 
 
 class ImportedSgltn:
@@ -62,8 +107,49 @@ class ImportedSgltn:
             self.get_imports()
         return self._dalle()
        
+def is_http_response(response: Any) -> bool:
+    """True for raw http responses from either the sync (requests) or async (httpx) clients"""
+    return isinstance(response, (requests.Response, httpx.Response, HttpEnvelope))
+
+
+def encode_json(obj: Any) -> bytes:
+    """Compact UTF-8 JSON bytes, with orjson when it's installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits, let the json module handle them
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def decode_json(data: Union[bytes, str]) -> Any:
+    """Parses JSON text or bytes, with orjson when it's installed. Raises ValueError on invalid JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 class RetryConfig:
     """Configuration for retry behavior"""
+
+    # What to do with each error class of ErrorParser.classify(): "retry" or "fail_fast".
+    # Errors without a class fall back to retryable_http_status_codes and retryable_exceptions.
+    ERROR_POLICY = {
+        "timeout": "retry",
+        "connection": "retry",
+        "rate_limit": "retry",
+        "overloaded": "retry",
+        "server_error": "retry",
+        "content_policy": "fail_fast",
+        "invalid_model": "fail_fast",
+        "context_length": "fail_fast",
+        "auth": "fail_fast",
+        "quota": "fail_fast",
+        "not_found": "fail_fast",
+        "invalid_request": "fail_fast",
+        "deadline": "fail_fast"
+    }
+
     def __init__(
         self,
         max_retries: int = 3,
@@ -71,13 +157,21 @@ class RetryConfig:
         max_delay: float = 10.0,
         exponential_base: float = 2.0,
         retryable_exceptions: Optional[List[Type[Exception]]] = None,
-        retryable_http_status_codes: Optional[List[int]] = None
+        retryable_http_status_codes: Optional[List[int]] = None,
+        jitter: str = "full",
+        respect_retry_after: bool = True,
+        max_retry_after: float = 60.0,
+        error_policy: Optional[dict] = None
     ):
         self.max_retries = max_retries
         self.base_delay = base_delay
         self.max_delay = max_delay
         self.exponential_base = exponential_base
+        self.jitter = jitter                            # "none", "full" or "decorrelated"
+        self.respect_retry_after = respect_retry_after  # Wait as long as the server's rate limit headers ask
+        self.max_retry_after = max_retry_after          # Upper bound on a header driven wait
         self.retryable_exceptions = retryable_exceptions
+        self.error_policy = {**self.ERROR_POLICY, **(error_policy or {})}
         self.retryable_http_status_codes = retryable_http_status_codes or [
             408,  # Request Timeout
             429,  # Too Many Requests
@@ -90,6 +184,46 @@ class RetryConfig:
 
 class ErrorParser:
     """Extracts standardized error information from various API responses"""
+
+    # Error classes recognized from the type, code and message of an error body, checked in order
+    ERROR_PATTERNS = (
+        ("quota", ("insufficient_quota", "billing_hard_limit", "exceeded your current quota", "credit balance is too low")),
+        ("content_policy", ("content_policy", "content_filter", "content management policy", "safety system",
+                            "moderation")),
+        ("context_length", ("context_length_exceeded", "maximum context length", "context window", "prompt is too long",
+                            "reduce the length of the messages")),
+        ("invalid_model", ("model_not_found", "model_decommissioned", "not_found_error", "model not found",
+                           "unknown model", "invalid model", "does not exist or you do not have access",
+                           "not found, try pulling")),
+        ("auth", ("invalid_api_key", "authentication_error", "permission_error", "incorrect api key", "invalid api key", "invalid x-api-key")),
+        ("rate_limit", ("rate_limit", "rate limit", "too many requests")),
+        ("overloaded", ("overloaded", "temporarily unavailable")),
+        ("timeout", ("timeout", "timed out"))
+    )
+
+    # Error classes of http status codes.  Server errors and 429s are classed by status whatever their body says,
+    # other statuses only when the body doesn't say more
+    STATUS_CLASSES = {
+        400: "invalid_request",
+        401: "auth",
+        403: "auth",
+        404: "not_found",
+        408: "timeout",
+        413: "context_length",
+        422: "invalid_request",
+        429: "rate_limit",
+        500: "server_error",
+        502: "server_error",
+        503: "overloaded",
+        504: "timeout",
+        529: "overloaded"  # Anthropic
+    }
+
+    TIMEOUT_EXCEPTIONS = (requests.exceptions.Timeout, httpx.TimeoutException, openai.APITimeoutError,
+                          anthropic.APITimeoutError, TimeoutError)
+
+    CONNECTION_EXCEPTIONS = (requests.exceptions.ConnectionError, httpx.TransportError, openai.APIConnectionError,
+                             anthropic.APIConnectionError, ConnectionError)
     
     @staticmethod
     def get_error_code(response: Any) -> Optional[int]:
@@ -98,7 +232,7 @@ class ErrorParser:
         Returns error code if found, None otherwise.
         """
         # Handle HTTP Response objects
-        if isinstance(response, requests.Response):
+        if is_http_response(response):
             return response.status_code
 
         # OpenAI-style errors (and compatible services like OpenRouter)
@@ -154,23 +288,410 @@ class ErrorParser:
 
         return None
 
+    @staticmethod
+    def get_error_details(response: Any) -> dict:
+        """
+        The status and error object of a failed response or SDK exception as {"status", "type", "code", "message"},
+        None for the parts that are missing.  Reads OpenAI style {"error": {"type", "code", "message"}} bodies and
+        Anthropic style {"type": "error", "error": {"type", "message"}} ones.
+        """
+        body = None
+        if is_http_response(response):
+            try:
+                body = response.json()
+            except (ValueError, TypeError, AttributeError):
+                body = None
+        elif isinstance(response, dict):
+            body = response
+        elif isinstance(getattr(response, 'body', None), dict):  # openai/anthropic APIStatusError
+            body = response.body
+        elif isinstance(getattr(response, 'error', None), dict):
+            body = response.error
+
+        error = body
+        while isinstance(error, dict) and isinstance(error.get('error'), dict):
+            error = error['error']
+        if not isinstance(error, dict):
+            error = {}
+        message = error.get('message')
+        if message is None and isinstance(error.get('error'), str):  # Ollama style {"error": "model ... not found"}
+            message = error['error']
+        if message is None and isinstance(response, Exception) and hasattr(response, 'body'):
+            message = getattr(response, 'message', None)
+        return {"status": ErrorParser.get_error_code(response),
+                "type": error.get('type'),
+                "code": error.get('code'),
+                "message": message}
+
+    @staticmethod
+    def classify(response: Any) -> Optional[str]:
+        """
+        The error class of a failed response or exception, e.g. "content_policy", "context_length", "auth",
+        "rate_limit" or "overloaded" (see RetryConfig.ERROR_POLICY).  5xx and 429 statuses are classed by
+        status (a 429 only becomes "quota" if its error type or code says so), otherwise the error body's
+        type, code and message decide first, then the exception type, then the http status.
+        None if nothing identifies the error.
+        """
+        if isinstance(response, DeadlineExceededError):
+            return "deadline"
+        details = ErrorParser.get_error_details(response)
+        status = details["status"]
+        if isinstance(status, int) and status >= 500:
+            return ErrorParser.STATUS_CLASSES.get(status, "server_error")
+        if status == 429:
+            codes = " ".join(str(details[part]) for part in ("type", "code") if details[part] is not None).lower()
+            quota_patterns = dict(ErrorParser.ERROR_PATTERNS)["quota"]
+            return "quota" if any(pattern in codes for pattern in quota_patterns) else "rate_limit"
+        text = " ".join(str(details[part]) for part in ("type", "code", "message") if details[part] is not None).lower()
+        if text:
+            for error_class, patterns in ErrorParser.ERROR_PATTERNS:
+                if any(pattern in text for pattern in patterns):
+                    return error_class
+        if isinstance(response, ErrorParser.TIMEOUT_EXCEPTIONS):
+            return "timeout"
+        if isinstance(response, ErrorParser.CONNECTION_EXCEPTIONS):
+            return "connection"
+        return ErrorParser.STATUS_CLASSES.get(status)
+
+    @staticmethod
+    def get_headers(response: Any) -> Optional[Any]:
+        """Returns the http headers of a raw response or of an SDK exception, if there are any"""
+        if is_http_response(response):
+            return response.headers
+        # openai/anthropic APIStatusError carry the httpx response
+        raw_response = getattr(response, 'response', None)
+        if is_http_response(raw_response):
+            return raw_response.headers
+        return None
+
+    @staticmethod
+    def parse_duration(value: str) -> Optional[float]:
+        """
+        Parses the duration formats used in rate limit headers into seconds:
+        plain seconds ('12', '1.5'), Go style durations ('6m0s', '250ms', '1h2m3.5s'),
+        RFC3339 timestamps (Anthropic) and HTTP dates (Retry-After).
+        """
+        value = str(value).strip()
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        if re.fullmatch(r'(\d+(\.\d+)?(h|ms|m|s))+', value):
+            units = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+            return sum(float(number) * units[unit]
+                       for number, _, unit in re.findall(r'(\d+(\.\d+)?)(h|ms|m|s)', value))
+
+        moment = None
+        try:
+            moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            try:
+                moment = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+    @staticmethod
+    def get_retry_after(response: Any) -> Optional[float]:
+        """
+        Seconds the server asked us to wait before retrying, from Retry-After style headers
+        on a raw response or SDK exception.  Returns None if the server gave no indication.
+        """
+        headers = ErrorParser.get_headers(response)
+        if not headers:
+            return None
+
+        for name, scale in (('retry-after-ms', 0.001), ('retry-after', 1.0)):
+            value = headers.get(name)
+            if value:
+                seconds = ErrorParser.parse_duration(value)
+                if seconds is not None:
+                    return seconds * scale
+
+        # Rate limit reset headers: only the exhausted limits tell us how long to wait
+        waits = []
+        for limit in ('requests', 'tokens', 'input-tokens', 'output-tokens'):
+            for remaining_name, reset_name in ((f'x-ratelimit-remaining-{limit}', f'x-ratelimit-reset-{limit}'),
+                                               (f'anthropic-ratelimit-{limit}-remaining', f'anthropic-ratelimit-{limit}-reset')):
+                remaining = headers.get(remaining_name)
+                reset = headers.get(reset_name)
+                if reset and remaining is not None and str(remaining).strip() == "0":
+                    seconds = ErrorParser.parse_duration(reset)
+                    if seconds is not None:
+                        waits.append(seconds)
+        return max(waits) if waits else None
+
+class RetryExhaustedError(RuntimeError):
+    """Raised when every attempt returned a retryable error response"""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a request's deadline has passed, or would pass before the next attempt could start"""
+
+
+class Deadline:
+    """
+    The point in time a request has to be finished by.  Shared by all of a request's attempts, backoff
+    waits and rate limiter waits, each attempt's timeout is cut to the time that's left.
+    """
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    @classmethod
+    def from_seconds(cls, seconds: Any) -> Optional['Deadline']:
+        """
+        A Deadline for a node's deadline input, None if the input is empty or 0 (no deadline).
+        An existing Deadline is passed through, so several requests of one node can share it.
+        """
+        if isinstance(seconds, Deadline):
+            return seconds
+        try:
+            seconds = float(seconds or 0)
+        except (TypeError, ValueError):
+            return None
+        return cls(seconds) if seconds > 0 else None
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def allows(self, wait: float) -> bool:
+        """True if there's time left after waiting wait seconds"""
+        return wait < self.remaining()
+
+    def check(self) -> float:
+        """Returns the seconds left, raises DeadlineExceededError if there are none"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"Request deadline of {self.seconds:g} seconds exceeded")
+        return remaining
+
+
+class RequestInterruptedError(Exception):
+    """Raised in place of ComfyUI's InterruptProcessingException when running outside of ComfyUI"""
+
+
+class Interruption:
+    """
+    Waits that end early when the user cancels the running ComfyUI queue item.  ComfyUI's processing-interrupted
+    flag is checked every POLL_INTERVAL seconds, once it's set the wait raises ComfyUI's
+    InterruptProcessingException so ComfyUI reports the run as cancelled and gets its execution thread back.
+    Outside of ComfyUI nothing sets the flag and these are plain waits.
+    Code inside a cancel_scope() can also be cancelled on its own (e.g. the losing copy of a hedged request),
+    its waits then raise RequestInterruptedError.
+    """
+    POLL_INTERVAL = 0.05
+
+    MAX_WORKERS = 32  # Threads blocking calls run on, further calls queue for a free one
+
+    ERROR = getattr(model_management, 'InterruptProcessingException', RequestInterruptedError)
+
+    _executor = None
+    _executor_lock = threading.Lock()
+    _scope = contextvars.ContextVar('plush_cancel_scope', default=None)
+
+    @staticmethod
+    def interrupted() -> bool:
+        return model_management is not None and model_management.processing_interrupted()
+
+    @classmethod
+    @contextlib.contextmanager
+    def cancel_scope(cls, event: threading.Event):
+        """Setting event cancels the waits and calls made inside the with block"""
+        token = cls._scope.set(event)
+        try:
+            yield event
+        finally:
+            cls._scope.reset(token)
+
+    @classmethod
+    def cancelled(cls) -> bool:
+        """True if the current cancel_scope() has been cancelled"""
+        event = cls._scope.get()
+        return event is not None and event.is_set()
+
+    @classmethod
+    def is_interruption(cls, e: BaseException) -> bool:
+        return isinstance(e, (cls.ERROR, RequestInterruptedError))
+
+    @classmethod
+    def check(cls) -> None:
+        if cls.interrupted():
+            raise cls.ERROR()
+        if cls.cancelled():
+            raise RequestInterruptedError("Request cancelled")
+
+    @classmethod
+    def _slices(cls, timeout: Optional[float]):
+        """Yields the length of each poll until timeout (None = forever) runs out, checking the flag first"""
+        end = None if timeout is None else time.monotonic() + max(0.0, timeout)
+        while True:
+            cls.check()
+            remaining = cls.POLL_INTERVAL if end is None else end - time.monotonic()
+            if remaining <= 0:
+                return
+            yield min(cls.POLL_INTERVAL, remaining)
+
+    @classmethod
+    def sleep(cls, seconds: float) -> None:
+        for interval in cls._slices(seconds):
+            time.sleep(interval)
+
+    @classmethod
+    async def sleep_async(cls, seconds: float) -> None:
+        for interval in cls._slices(seconds):
+            await asyncio.sleep(interval)
+
+    @classmethod
+    def wait(cls, event: threading.Event, timeout: Optional[float] = None) -> bool:
+        """threading.Event.wait() that raises if the run is cancelled first"""
+        for interval in cls._slices(timeout):
+            if event.wait(interval):
+                return True
+        return event.is_set()
+
+    @classmethod
+    def result(cls, future: concurrent.futures.Future) -> Any:
+        """future.result() that raises if the run is cancelled first"""
+        for interval in cls._slices(None):
+            try:
+                return future.result(interval)
+            except concurrent.futures.TimeoutError:
+                if future.done():
+                    raise  # The future's own result is a TimeoutError
+        return future.result()
+
+    @classmethod
+    def _workers(cls) -> concurrent.futures.ThreadPoolExecutor:
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = concurrent.futures.ThreadPoolExecutor(max_workers=cls.MAX_WORKERS,
+                                                                          thread_name_prefix="plush-request")
+        return cls._executor
+
+    @classmethod
+    def call(cls, func: Callable, *args, abort: Optional[Callable[[int], Any]] = None, **kwargs) -> Any:
+        """
+        Calls a blocking func (e.g. an http request) on a worker thread so the caller can return as soon as the run
+        is cancelled.  On cancellation abort, if given, is called with the worker's thread ident to stop the
+        transfer (e.g. TransportSgltn.abort).  If the worker is still running after that the raised exception
+        carries its future, see pending(), so whoever lent it a resource can wait for it before taking it back.
+        """
+        if model_management is None and cls._scope.get() is None:
+            return func(*args, **kwargs)
+        context = contextvars.copy_context()
+        worker = {}
+
+        def _run():
+            worker['thread'] = threading.get_ident()
+            return context.run(func, *args, **kwargs)
+
+        future = cls._workers().submit(_run)
+        try:
+            return cls.result(future)
+        except BaseException as e:
+            if not cls.is_interruption(e) or future.cancel():  # Cancelled before a worker picked it up
+                raise
+            if abort is not None and 'thread' in worker and not future.done():
+                try:
+                    abort(worker['thread'])
+                except Exception:  # pylint: disable=broad-except
+                    pass
+            if not future.done():
+                e.pending = future
+            raise
+
+    @staticmethod
+    def pending(e: BaseException) -> Optional[concurrent.futures.Future]:
+        """The still running call an interruption left behind, see call()"""
+        future = getattr(e, 'pending', None)
+        return future if isinstance(future, concurrent.futures.Future) and not future.done() else None
+
+    @classmethod
+    async def guard(cls, awaitable: Any) -> Any:
+        """Awaits awaitable, cancelling it (and with it any http call it's making) if the run is cancelled"""
+        task = asyncio.ensure_future(awaitable)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=cls.POLL_INTERVAL)
+                if done:
+                    return task.result()
+                cls.check()
+        finally:
+            if not task.done():
+                task.cancel()
+
+
 class RetryHandler:
-    """Handles retry logic for API calls"""
-    def __init__(self, config: RetryConfig, logger: Any):
+    """
+    Handles retry logic for API calls.
+    sleep, async_sleep and rng can be replaced (e.g. with a fake clock) to exercise the
+    backoff schedule without waiting.
+    """
+    def __init__(self, config: RetryConfig, logger: Any,
+                 sleep: Callable[[float], None] = Interruption.sleep,
+                 async_sleep: Callable[[float], Any] = Interruption.sleep_async,
+                 rng: Optional[random.Random] = None,
+                 deadline: Optional[Deadline] = None):
         self.config = config
         self.logger = logger
+        self.deadline = deadline
         self.error_parser = ErrorParser()
+        self._sleep = sleep
+        self._async_sleep = async_sleep
+        self._rng = rng or random.Random()
+        self._last_delay = config.base_delay
 
-    def calculate_delay(self, attempt: int) -> float:
-        """Calculate delay with exponential backoff"""
-        delay = min(
+    def clone(self) -> 'RetryHandler':
+        """A handler with the same config, clock and deadline but its own backoff state, for a concurrent copy"""
+        return RetryHandler(self.config, self.logger, sleep=self._sleep, async_sleep=self._async_sleep,
+                            deadline=self.deadline)
+
+    def calculate_delay(self, attempt: int, response: Any = None) -> float:
+        """
+        Calculate delay with jittered exponential backoff.
+        If the failed response or exception carries Retry-After or rate limit reset headers,
+        the wait is at least that long (capped at config.max_retry_after) plus a little jitter
+        so throttled workers don't all come back at the same moment.
+        """
+        ceiling = min(
             self.config.base_delay * (self.config.exponential_base ** attempt),
             self.config.max_delay
         )
+
+        if self.config.jitter == "full":
+            delay = self._rng.uniform(0, ceiling)
+        elif self.config.jitter == "decorrelated":
+            delay = min(self.config.max_delay,
+                        self._rng.uniform(self.config.base_delay, max(self.config.base_delay, self._last_delay * 3)))
+        else:
+            delay = ceiling
+        self._last_delay = delay
+
+        if self.config.respect_retry_after and response is not None:
+            retry_after = self.error_parser.get_retry_after(response)
+            if retry_after is not None:
+                retry_after = min(retry_after, self.config.max_retry_after)
+                delay = retry_after + self._rng.uniform(0, self.config.base_delay)
+                self._last_delay = delay
+
         return delay
 
     def should_retry(self, response: Any) -> bool:
-        """Determine if the response is retryable"""
+        """
+        Determine if the response is retryable.  Errors with a class in the config's error_policy table
+        follow it, others are retried if their status code or exception type is listed as retryable.
+        """
+        error_class = self.error_parser.classify(response)
+        if error_class in self.config.error_policy:
+            return self.config.error_policy[error_class] == "retry"
+
         error_code = self.error_parser.get_error_code(response)
         
         if error_code:
@@ -183,101 +704,166 @@ class RetryHandler:
         
         return False
 
-    def execute_with_retry(self, func: Callable, *args, **kwargs) -> Any:
-        """Execute function with retry logic"""
-        last_exception = None
-        last_error_info = None  # Track the last error information
-        self.logger.log_events(f"Maximum tries set to: {self.config.max_retries}",
-                               is_trouble=True)
-        
-        for attempt in range(self.config.max_retries):
+    def _response_delay(self, response: Any, attempt: int, state: dict) -> Optional[float]:
+        """
+        Inspects a response returned without an exception.
+        Returns the number of seconds to wait before the next attempt if the response
+        carries a retryable error, or None if the response should be handed back to the caller.
+        """
+        # For HTTP responses
+        if is_http_response(response):
             try:
-                response = func(*args, **kwargs)
-
-                # For HTTP responses
-                if isinstance(response, requests.Response):
-                    try:
-                        response_json = response.json()
-                        if 'error' in response_json:
-                            error_code = self.error_parser.get_error_code(response_json)
-                            if error_code in self.config.retryable_http_status_codes:
-                                last_error_info = response_json['error']  # Store error info
-                                delay = self.calculate_delay(attempt)
-                                
-                                self.logger.log_events(
-                                    f"Retryable error detected in response content ({error_code}), "
-                                    f"retrying in {delay:.2f} seconds...",
-                                    TroubleSgltn.Severity.WARNING,
-                                    True
-                                )
-                                time.sleep(delay)
-                                continue
-                    except ValueError:
-                        pass
-
-                    # Then check status codes
-                    if 200 <= response.status_code < 300:
-                        return response
-                    elif self.should_retry(response):
-                        last_error_info = {'status': response.status_code, 'text': response.text}
-                        delay = self.calculate_delay(attempt)
+                response_json = response.json()
+                if 'error' in response_json:
+                    error_code = self.error_parser.get_error_code(response_json)
+                    if error_code is not None and self.should_retry(response_json):
+                        state['error_info'] = response_json['error']  # Store error info
+                        delay = self.calculate_delay(attempt, response)
+                        
                         self.logger.log_events(
-                            f"Rate limit or server error {response.status_code}, "
+                            f"Retryable error detected in response content ({error_code}), "
                             f"retrying in {delay:.2f} seconds...",
                             TroubleSgltn.Severity.WARNING,
                             True
                         )
-                        time.sleep(delay)
-                        continue
-                    else:
-                        return response
-
-                # For OpenAI/API responses with embedded errors
-                error_code = self.error_parser.get_error_code(response)
-                if error_code and error_code in self.config.retryable_http_status_codes:
-                    last_error_info = response.error if hasattr(response, 'error') else str(response)
-                    delay = self.calculate_delay(attempt)
-                    self.logger.log_events(
-                        f"Rate limit or error detected in API response ({error_code}), "
-                        f"retrying in {delay:.2f} seconds...",
-                        TroubleSgltn.Severity.WARNING,
-                        True
-                    )
-                    time.sleep(delay)
-                    continue
-
-                return response
-
-            except Exception as e:
-                last_exception = e
-                last_error_info = str(e)  # Store exception info
-                
-                if not self.should_retry(e):
-                    self.logger.log_events(
-                        f"Non-retryable error occurred: {str(e)}",
-                        TroubleSgltn.Severity.ERROR,
-                        True
-                    )
-                    raise
-
-                delay = self.calculate_delay(attempt)
+                        return delay
+            except (ValueError, TypeError):
+                pass
+
+            # Then check status codes
+            if 200 <= response.status_code < 300:
+                return None
+            if self.should_retry(response):
+                state['error_info'] = {'status': response.status_code, 'text': response.text}
+                delay = self.calculate_delay(attempt, response)
                 self.logger.log_events(
-                    f"Attempt {attempt + 1}/{self.config.max_retries} failed. "
-                    f"Retrying in {delay:.2f} seconds. Error: {str(e)}",
+                    f"Rate limit or server error {response.status_code}, "
+                    f"retrying in {delay:.2f} seconds...",
                     TroubleSgltn.Severity.WARNING,
                     True
                 )
-                time.sleep(delay)
+                return delay
+            return None
+
+        # For OpenAI/API responses with embedded errors
+        error_code = self.error_parser.get_error_code(response)
+        if error_code and self.should_retry(response):
+            state['error_info'] = response.error if hasattr(response, 'error') else str(response)
+            delay = self.calculate_delay(attempt, response)
+            self.logger.log_events(
+                f"Rate limit or error detected in API response ({error_code}), "
+                f"retrying in {delay:.2f} seconds...",
+                TroubleSgltn.Severity.WARNING,
+                True
+            )
+            return delay
+
+        return None
 
+    def _exception_delay(self, e: Exception, attempt: int, state: dict) -> float:
+        """
+        Returns the number of seconds to wait before retrying after exception e.
+        Re-raises e if it isn't retryable.
+        """
+        if Interruption.is_interruption(e):
+            raise e
+        state['exception'] = e
+        state['error_info'] = str(e)  # Store exception info
+        
+        if not self.should_retry(e):
+            error_class = self.error_parser.classify(e)
+            self.logger.log_events(
+                f"Non-retryable {error_class.replace('_', ' ') + ' ' if error_class else ''}error occurred: {str(e)}",
+                TroubleSgltn.Severity.ERROR,
+                True
+            )
+            raise e
+
+        delay = self.calculate_delay(attempt, e)
+        self.logger.log_events(
+            f"Attempt {attempt + 1}/{self.config.max_retries} failed. "
+            f"Retrying in {delay:.2f} seconds. Error: {str(e)}",
+            TroubleSgltn.Severity.WARNING,
+            True
+        )
+        return delay
+
+    def _raise_exhausted(self, state: dict) -> None:
         # Create a meaningful exception with the last error information
         error_message = f"Maximum retry attempts ({self.config.max_retries}) exceeded. "
-        if last_error_info:
-            error_message += f"Last error: {last_error_info}"
+        if state['error_info']:
+            error_message += f"Last error: {state['error_info']}"
         
         # Raise the original exception if we have one, otherwise raise a RuntimeError
-        if last_exception:
-            raise last_exception
-        raise RuntimeError(error_message)
+        if state['exception']:
+            raise state['exception']
+        raise RetryExhaustedError(error_message)
+
+    def _check_backoff(self, delay: float, state: dict) -> float:
+        """Returns delay, or gives up on the request if waiting it out would run past the deadline"""
+        if self.deadline is not None and not self.deadline.allows(delay):
+            self.logger.log_events(
+                f"Not retrying: a {delay:.2f} second wait would run past the "
+                f"{self.deadline.seconds:g} second deadline",
+                TroubleSgltn.Severity.WARNING,
+                True
+            )
+            if state['exception']:
+                raise state['exception']
+            raise DeadlineExceededError(f"Request deadline of {self.deadline.seconds:g} seconds exceeded. "
+                                        f"Last error: {state['error_info']}")
+        return delay
+
+    def _log_limits(self) -> None:
+        self.logger.log_events(f"Maximum tries set to: {self.config.max_retries}",
+                               is_trouble=True)
+        if self.deadline is not None:
+            self.logger.log_events(f"Deadline set to: {self.deadline.seconds:g} seconds",
+                                   is_trouble=True)
+
+    def execute_with_retry(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute function with retry logic"""
+        state = {'exception': None, 'error_info': None}  # Track the last error information
+        self._log_limits()
+        
+        for attempt in range(self.config.max_retries):
+            try:
+                response = func(*args, **kwargs)
+            except Exception as e:
+                delay = self._exception_delay(e, attempt, state)
+                if attempt + 1 < self.config.max_retries:
+                    self._sleep(self._check_backoff(delay, state))
+                continue
+
+            delay = self._response_delay(response, attempt, state)
+            if delay is None:
+                return response
+            if attempt + 1 < self.config.max_retries:
+                self._sleep(self._check_backoff(delay, state))
+
+        self._raise_exhausted(state)
+
+    async def execute_with_retry_async(self, func: Callable, *args, **kwargs) -> Any:
+        """Execute coroutine function with retry logic, backoff waits don't block the event loop"""
+        state = {'exception': None, 'error_info': None}
+        self._log_limits()
+
+        for attempt in range(self.config.max_retries):
+            try:
+                response = await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._exception_delay(e, attempt, state)
+                if attempt + 1 < self.config.max_retries:
+                    await self._async_sleep(self._check_backoff(delay, state))
+                continue
+
+            delay = self._response_delay(response, attempt, state)
+            if delay is None:
+                return response
+            if attempt + 1 < self.config.max_retries:
+                await self._async_sleep(self._check_backoff(delay, state))
+
+        self._raise_exhausted(state)
 
 class RetryConfigFactory:
     """Factory for creating retry configurations based on request type"""
@@ -288,6 +874,7 @@ class RetryConfigFactory:
             requests.exceptions.Timeout,
             requests.exceptions.ConnectionError,
             requests.exceptions.RequestException,
+            httpx.TransportError,  # Async path
             ConnectionError,
             TimeoutError
         ]
@@ -339,6 +926,13 @@ class RetryConfigFactory:
                 retryable_exceptions=web_exceptions,
                 retryable_http_status_codes=[408, 429, 500, 502, 503, 504]
             ),
+            RequestMode.OLLAMA: RetryConfig(
+                max_retries=3,
+                base_delay=1.0,
+                max_delay=8.0,
+                retryable_exceptions=web_exceptions,
+                retryable_http_status_codes=[408, 429, 500, 502, 503, 504]
+            ),
             RequestMode.GROQ: RetryConfig(
                 max_retries=3,
                 base_delay=1.0,
@@ -357,7 +951,7 @@ class RetryConfigFactory:
                 max_retries=3,
                 base_delay=2.0,
                 max_delay=15.0,
-                retryable_http_status_codes=[400,429],
+                retryable_http_status_codes=[429],
                 retryable_exceptions=[
                     openai.APIConnectionError,
                     openai.RateLimitError,
@@ -365,67 +959,3196 @@ class RetryConfigFactory:
                 ]
             )
         }
-        return configs.get(request_type, RetryConfig())
+        config = configs.get(request_type, RetryConfig())
+        RetryConfigFactory.apply_overrides(config, request_type)
+        return config
+
+    # RetryConfig attributes that can be tuned from config.json
+    TUNABLE = {
+        "max_retries": int,
+        "base_delay": float,
+        "max_delay": float,
+        "exponential_base": float,
+        "jitter": str,
+        "respect_retry_after": bool,
+        "max_retry_after": float,
+        "retryable_http_status_codes": list
+    }
+
+    @staticmethod
+    def apply_overrides(config: RetryConfig, request_type: Optional[RequestMode]) -> None:
+        """
+        Applies the user's 'retry_policy' settings from config.json.  The 'default' entry applies to
+        every service, entries named after a RequestMode (e.g. "GROQ", "OLLAMA") apply to that service only.
+        """
+        try:
+            policy = ImportedSgltn().cfig.get_setting('retry_policy', {})
+        except Exception:
+            return
+        if not isinstance(policy, dict):
+            return
+
+        sections = [policy.get('default')]
+        if request_type is not None:
+            sections.append(policy.get(request_type.name))
+
+        for section in sections:
+            if not isinstance(section, dict):
+                continue
+            for name, value in section.items():
+                if name == 'error_classes':
+                    RetryConfigFactory._apply_error_classes(config, value)
+                    continue
+                cast = RetryConfigFactory.TUNABLE.get(name)
+                if cast is None:
+                    continue
+                try:
+                    setattr(config, name, cast(value))
+                except (TypeError, ValueError):
+                    json_manager().log_events(f"Invalid retry_policy value for '{name}': {value}",
+                                              TroubleSgltn.Severity.WARNING)
+
+    @staticmethod
+    def _apply_error_classes(config: RetryConfig, error_classes: Any) -> None:
+        """Merges an 'error_classes' entry, e.g. {"overloaded": "fail_fast"}, into the config's error_policy table"""
+        if not isinstance(error_classes, dict):
+            json_manager().log_events(f"Invalid retry_policy value for 'error_classes': {error_classes}",
+                                      TroubleSgltn.Severity.WARNING)
+            return
+        for error_class, action in error_classes.items():
+            if action not in ("retry", "fail_fast"):
+                json_manager().log_events(f"Invalid retry_policy action for error class '{error_class}': {action}. "
+                                          "Use 'retry' or 'fail_fast'",
+                                          TroubleSgltn.Severity.WARNING)
+                continue
+            config.error_policy[error_class] = action
     
 
-class Request(ABC):
-    """Abstract base class for all request types"""
+class ResponseCacheSgltn:
+    """
+    Singleton two-tier cache for completion results.
+    Tier 1 is an in-memory LRU bounded by bytes, tier 2 is a SQLite file in the Plush 'cache' directory
+    so results survive a ComfyUI restart.  Entries are keyed by a canonical hash of the request params
+    and expire after a TTL.  Settings come from the 'response_cache' section of config.json.
+    """
+    _instance = None
+    _lock = threading.Lock()
 
-    class RequestType(Enum):
-        COMPLETION = "completion"
-        POST = "post"
-        IMAGE = "image"
-        ANTHROPIC = "claude"
+    DEFAULTS = {
+        "enabled": True,
+        "ttl_seconds": 86400,
+        "memory_max_bytes": 8 * 1024 * 1024,
+        "disk_enabled": True,
+        "disk_max_bytes": 64 * 1024 * 1024,
+        "max_entry_bytes": 256 * 1024
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
 
     def __init__(self):
-        self.imps = ImportedSgltn()
-        self.utils = request_utils()
-        self.cFig = self.imps.cfig
-        self.mode = RequestMode
-        self.dalle = self.imps.dalle
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
         self.j_mngr = json_manager()
-        
-        # Initialize retry configuration and handler
-        retry_config = RetryConfigFactory.create_config(self.cFig.lm_request_mode)
-        self.retry_handler = RetryHandler(retry_config, self.j_mngr)
+        self._mem_lock = threading.Lock()
+        self._memory = OrderedDict()  # key: (expires_at, value, size)
+        self._memory_bytes = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+
+        settings = ImportedSgltn().cfig.get_setting('response_cache', {})
+        if not isinstance(settings, dict):
+            settings = {}
+        self.settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+
+        if self.settings['enabled'] and self.settings['disk_enabled']:
+            self._open_db()
+
+    def _open_db(self) -> None:
+        cache_dir = self.j_mngr.find_child_directory(self.j_mngr.script_dir, 'cache', True)
+        if not cache_dir:
+            self.j_mngr.log_events("Unable to create the response cache directory, disk cache disabled",
+                                   TroubleSgltn.Severity.WARNING)
+            return
+        try:
+            db_path = self.j_mngr.append_filename_to_path(cache_dir, 'response_cache.db')
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+            self._db.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        except sqlite3.Error as e:
+            self._db = None
+            self.j_mngr.log_events(f"Unable to open the response cache database, disk cache disabled: {e}",
+                                   TroubleSgltn.Severity.WARNING)
 
-    def _initialize_retry_handler(self, **kwargs):
-        """Initialize retry handler with optional override from kwargs"""
-        # Get base configuration
-        retry_config = RetryConfigFactory.create_config(self.cFig.lm_request_mode)
-        
-        # Override max_retries if provided in kwargs otherwise use default
-        if 'tries' in kwargs and kwargs['tries']:
-            tries = kwargs['tries']
-            if isinstance(tries, str) and tries != "default":
-                retry_config.max_retries = int(tries)
-               
-        self.retry_handler = RetryHandler(retry_config, self.j_mngr)
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings['enabled'])
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Canonical sha256 hash of json serializable parts, dict key order doesn't matter"""
+        canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Tuple[Optional[str], str]:
+        """Returns (value, tier) where tier is 'memory' or 'disk', or (None, '') on a miss"""
+        now = time.time()
+        with self._mem_lock:
+            entry = self._memory.get(key)
+            if entry:
+                expires, value, size = entry
+                if expires >= now:
+                    self._memory.move_to_end(key)
+                    return value, "memory"
+                del self._memory[key]
+                self._memory_bytes -= size
+
+        if self._db is None:
+            return None, ""
+
+        with self._db_lock:
+            try:
+                row = self._db.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None, ""
+                value, expires = row
+                if expires < now:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None, ""
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                self.j_mngr.log_events(f"Response cache read failed: {e}", TroubleSgltn.Severity.WARNING)
+                return None, ""
+
+        self._put_memory(key, value, expires)  # Promote to the memory tier
+        return value, "disk"
+
+    def put(self, key: str, value: str) -> None:
+        size = len(value.encode('utf-8'))
+        if size > self.settings['max_entry_bytes']:
+            return
+        now = time.time()
+        expires = now + float(self.settings['ttl_seconds'])
+        self._put_memory(key, value, expires)
+
+        if self._db is None:
+            return
+
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, expires, now)
+                )
+                self._evict_disk()
+            except sqlite3.Error as e:
+                self.j_mngr.log_events(f"Response cache write failed: {e}", TroubleSgltn.Severity.WARNING)
+
+    def _put_memory(self, key: str, value: str, expires: float) -> None:
+        size = len(value.encode('utf-8'))
+        max_bytes = self.settings['memory_max_bytes']
+        if size > max_bytes:
+            return
+        with self._mem_lock:
+            old_entry = self._memory.pop(key, None)
+            if old_entry:
+                self._memory_bytes -= old_entry[2]
+            self._memory[key] = (expires, value, size)
+            self._memory_bytes += size
+            while self._memory_bytes > max_bytes and self._memory:
+                _, (_, _, evicted_size) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def _evict_disk(self) -> None:
+        """Deletes expired entries, then least recently used ones until the file is under its byte limit"""
+        self._db.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        excess = total - self.settings['disk_max_bytes']
+        if excess <= 0:
+            return
+        freed = 0
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self) -> None:
+        with self._mem_lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+
+
+class SingleFlightSgltn:
+    """
+    Singleton that coalesces identical requests made at the same time.  The first caller for a key
+    sends the request, callers that arrive with the same key while it's in flight wait for it and
+    receive the same result (or exception).  Works across threads and event loops.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self._calls = {}
+        self._calls_lock = threading.Lock()
+
+    def _join(self, key: str) -> Tuple[concurrent.futures.Future, bool]:
+        """Returns the future for key and whether the caller is the one who has to fulfil it"""
+        with self._calls_lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            return future, True
+
+    def _finish(self, key: str, future: concurrent.futures.Future, result: Any = None,
+                exception: Optional[BaseException] = None) -> None:
+        with self._calls_lock:
+            self._calls.pop(key, None)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def _log_join(self) -> None:
+        self.j_mngr.log_events("An identical request is already in flight, waiting for its result.",
+                               is_trouble=True)
+
+    def run(self, key: str, func: Callable, *args, **kwargs) -> Any:
+        """Calls func(*args, **kwargs) unless an identical call (same key) is already running"""
+        future, is_leader = self._join(key)
+        if not is_leader:
+            self._log_join()
+            return Interruption.result(future)
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def run_async(self, key: str, func: Callable, *args, **kwargs) -> Any:
+        """Coroutine version of run(), func must be a coroutine function"""
+        future, is_leader = self._join(key)
+        if not is_leader:
+            self._log_join()
+            return await asyncio.wrap_future(future)
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at per_minute / 60 tokens a second.
+    reserve() takes tokens immediately (the balance may go negative) and returns how long the caller must
+    wait for the debt to be repaid, so concurrent callers queue up in order instead of all polling.
+    A bucket with per_minute <= 0 has no limit of its own but still honours holds set from response headers.
+    refund() gives back a reservation whose request was never sent.
+    """
+    def __init__(self, per_minute: float = 0, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute or 0)
+        self.rate = self.capacity / 60.0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._hold_until = 0.0
+
+    @property
+    def limited(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self, now: float) -> None:
+        if self.limited:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float = 1) -> float:
+        """Takes amount tokens and returns the seconds to wait before using them"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            wait = 0.0
+            if self.limited:
+                # A single request bigger than the bucket would never fit, let it through at full capacity
+                self._tokens -= min(float(amount), self.capacity)
+                if self._tokens < 0:
+                    wait = -self._tokens / self.rate
+            return max(wait, self._hold_until - now)
+
+    def refund(self, amount: float = 1) -> None:
+        """Returns the tokens of a reserve(amount) whose request wasn't sent after all"""
+        with self._lock:
+            self._refill(self._clock())
+            if self.limited:
+                self._tokens = min(self.capacity, self._tokens + min(float(amount), self.capacity))
+
+    def sync(self, remaining: Optional[float], reset_seconds: Optional[float]) -> None:
+        """Aligns the bucket with the provider's view of the quota, from rate limit response headers"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if remaining is None:
+                return
+            if self.limited:
+                self._tokens = min(self._tokens, float(remaining))
+            if remaining <= 0 and reset_seconds:
+                self._hold_until = max(self._hold_until, now + reset_seconds)
+
+
+class RateLimiterSgltn:
+    """
+    Singleton admission control for API calls.  Each service (RequestMode) and model gets a requests per
+    minute and an estimated tokens per minute TokenBucket, requests wait locally for both before being sent
+    instead of being sent and rejected with a 429.  Buckets also follow the x-ratelimit-* and
+    anthropic-ratelimit-* headers of each response so quota used elsewhere (other apps, other machines
+    on the same key) is accounted for.
+    Limits come from the 'rate_limits' section of config.json, a limit of 0 means no local limit.
+    Entries are looked up as "default", then the service name (e.g. "GROQ") then "service/model".
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    DEFAULTS = {
+        "enabled": True,
+        "learn_from_headers": True  # Adjust buckets from the rate limit headers providers return
+    }
+
+    # Header names for the (remaining, reset) values of the request and token quotas
+    HEADERS = {
+        "requests": (("x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),
+                     ("anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-reset")),
+        "tokens": (("x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+                   ("anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset"))
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+        settings = ImportedSgltn().cfig.get_setting('rate_limits', {})
+        if not isinstance(settings, dict):
+            settings = {}
+        self.settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+        self.limits = {k: v for k, v in settings.items() if isinstance(v, dict)}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings['enabled'])
+
+    def _limits_for(self, service: str, model: str) -> Tuple[float, float]:
+        rpm = tpm = 0
+        for name in ("default", service, f"{service}/{model}"):
+            entry = self.limits.get(name, {})
+            rpm = entry.get('rpm', rpm)
+            tpm = entry.get('tpm', tpm)
+        return float(rpm or 0), float(tpm or 0)
+
+    def _get_buckets(self, service: str, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        key = (service, model)
+        with self._buckets_lock:
+            buckets = self._buckets.get(key)
+            if buckets is None:
+                rpm, tpm = self._limits_for(service, model)
+                buckets = (TokenBucket(rpm), TokenBucket(tpm))
+                self._buckets[key] = buckets
+        return buckets
+
+    def reserve(self, service: str, model: str, tokens: int = 0) -> float:
+        """Reserves one request and an estimated number of tokens, returns the seconds to wait before sending"""
+        if not self.enabled:
+            return 0.0
+        request_bucket, token_bucket = self._get_buckets(service, model)
+        return max(request_bucket.reserve(1), token_bucket.reserve(tokens))
+
+    def refund(self, service: str, model: str, tokens: int = 0) -> None:
+        """Gives back a reserve() whose request was abandoned before it was sent"""
+        if not self.enabled:
+            return
+        request_bucket, token_bucket = self._get_buckets(service, model)
+        request_bucket.refund(1)
+        token_bucket.refund(tokens)
+
+    def observe(self, service: str, model: str, headers: Any) -> None:
+        """Updates the buckets for service/model from a response's rate limit headers"""
+        if not headers or not self.enabled or not self.settings['learn_from_headers']:
+            return
+        request_bucket, token_bucket = self._get_buckets(service, model)
+        for bucket, quota in ((request_bucket, "requests"), (token_bucket, "tokens")):
+            for remaining_name, reset_name in self.HEADERS[quota]:
+                remaining = headers.get(remaining_name)
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except (TypeError, ValueError):
+                    continue
+                reset = headers.get(reset_name)
+                reset_seconds = ErrorParser.parse_duration(reset) if reset else None
+                if remaining <= 0:
+                    self.j_mngr.log_events(
+                        f"{service} {model} {quota} quota is exhausted, "
+                        f"new requests will wait {reset_seconds or 0:.1f} seconds.",
+                        TroubleSgltn.Severity.WARNING,
+                        True
+                    )
+                bucket.sync(remaining, reset_seconds)
+                break
+
+
+class TokenEstimatorSgltn:
+    """
+    Singleton local token counter and context window budget.
+    Each model family can have a registered tokenizer (a callable returning the token count of a string),
+    tiktoken is used for OpenAI models when it's installed.  Anything else gets a fast characters per token
+    heuristic.  Context windows are looked up by the longest known model name prefix that ends on a version
+    boundary (so 'gpt-4' doesn't match 'gpt-4.1' or 'gpt-4o'), the 'windows' entry of the 'context_budget'
+    config section adds to or overrides the built in table.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    DEFAULTS = {
+        "enabled": True,
+        "reserve_tokens": 128,  # Headroom kept free of the window for estimation error
+        "default_window": 0,    # Window assumed for unknown models, 0 means they're not budgeted
+        "min_keep_tokens": 64   # Shortest truncated example worth keeping, shorter ones are dropped
+    }
+
+    # (model name fragment, family)
+    FAMILIES = (("gpt", "openai"), ("o1", "openai"), ("o3", "openai"), ("claude", "claude"),
+                ("gemini", "gemini"), ("llama", "llama"), ("mistral", "mistral"), ("mixtral", "mistral"),
+                ("qwen", "qwen"), ("gemma", "gemma"))
+
+    # UTF-8 bytes per token for the heuristic
+    BYTES_PER_TOKEN = {"openai": 4.0, "claude": 3.5, "default": 3.6}
+
+    # Fixed cost of an attached image
+    IMAGE_TOKENS = {"openai": 765, "claude": 1600, "default": 1000}
+
+    # Per message formatting overhead (role markers etc.)
+    MESSAGE_TOKENS = 4
+
+    CONTEXT_WINDOWS = {
+        "gpt-5": 400000, "gpt-4.5": 128000, "gpt-4.1": 1047576, "gpt-4o": 128000, "chatgpt-4o": 128000,
+        "gpt-4-turbo": 128000, "gpt-4-1106": 128000, "gpt-4-0125": 128000, "gpt-4-32k": 32768, "gpt-4": 8192,
+        "gpt-3.5-turbo": 16385, "o1-preview": 128000, "o1-mini": 128000, "o1": 200000, "o3-mini": 200000,
+        "o3": 200000, "o4-mini": 200000, "claude": 200000, "gemini-2.5": 1048576, "gemini-2.0": 1048576,
+        "gemini-1.5": 1000000, "gemini-1.0": 32760, "gemini-pro": 32760,
+        "llama-3.1": 131072, "llama-3.2": 131072, "llama-3.3": 131072, "llama3.1": 131072, "llama3.2": 131072,
+        "llama3.3": 131072, "llama3-": 8192, "mixtral-8x7b": 32768, "gemma2": 8192, "gemma-7b": 8192
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self._tokenizers = {}
+        if tiktoken is not None:
+            self._tokenizers["openai"] = self._tiktoken_counter
+
+        settings = ImportedSgltn().cfig.get_setting('context_budget', {})
+        if not isinstance(settings, dict):
+            settings = {}
+        self.settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+        windows = settings.get('windows', {})
+        self.windows = {**self.CONTEXT_WINDOWS, **(windows if isinstance(windows, dict) else {})}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings['enabled'])
+
+    def register_tokenizer(self, family: str, counter: Callable[[str, str], int]) -> None:
+        """Counts the family's tokens with counter(text, model) -> int instead of the heuristic"""
+        self._tokenizers[family] = counter
+
+    @staticmethod
+    def _tiktoken_counter(text: str, model: str = "") -> int:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def family(self, model: str) -> str:
+        name = (model or "").lower()
+        for fragment, family in self.FAMILIES:
+            if fragment in name:
+                return family
+        return "default"
+
+    def count_text(self, text: str, model: str = "") -> int:
+        if not text:
+            return 0
+        family = self.family(model)
+        counter = self._tokenizers.get(family)
+        if counter is not None:
+            try:
+                return counter(text, model)
+            except Exception as e:
+                self._tokenizers.pop(family, None)
+                self.j_mngr.log_events(f"Tokenizer for {family} models failed, using the estimate instead: {e}",
+                                       TroubleSgltn.Severity.WARNING)
+        per_token = self.BYTES_PER_TOKEN.get(family, self.BYTES_PER_TOKEN["default"])
+        return math.ceil(len(text.encode('utf-8')) / per_token)
+
+    def count_content(self, content: Any, model: str = "") -> int:
+        """Tokens in a message's content: a string or a list of text and image parts"""
+        if isinstance(content, str):
+            return self.count_text(content, model)
+        if not isinstance(content, list):
+            return self.count_text(str(content or ""), model)
+        tokens = 0
+        image_tokens = self.IMAGE_TOKENS.get(self.family(model), self.IMAGE_TOKENS["default"])
+        for part in content:
+            part_type = part.get('type') if isinstance(part, dict) else None
+            if part_type in ('image_url', 'image'):
+                tokens += image_tokens
+            elif part_type == 'text':
+                tokens += self.count_text(part.get('text', ""), model)
+            else:
+                tokens += self.count_text(str(part), model)
+        return tokens
+
+    def count_messages(self, messages: list, model: str = "", system: Any = "") -> int:
+        tokens = self.count_content(system, model) if system else 0
+        image_tokens = self.IMAGE_TOKENS.get(self.family(model), self.IMAGE_TOKENS["default"])
+        for message in messages or []:
+            tokens += self.MESSAGE_TOKENS + self.count_content(message.get('content'), model)
+            tokens += len(message.get('images') or []) * image_tokens  # Ollama's native format
+        return tokens
+
+    @staticmethod
+    def output_tokens(params: dict) -> int:
+        """The request's output allowance in tokens, Ollama's native requests set it in 'options'"""
+        options = params.get('options') if isinstance(params.get('options'), dict) else {}
+        try:
+            return int(params.get('max_tokens') or params.get('max_completion_tokens') or
+                       options.get('num_predict') or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def _names_model(fragment: str, name: str) -> bool:
+        """
+        True if fragment is a prefix of name, or of a part of it after a provider path (e.g. 'meta-llama/'),
+        and ends on a version boundary: 'gpt-4' names 'gpt-4-0613' but not 'gpt-4.1' or 'gpt-4o'.
+        """
+        fragment = fragment.lower()
+        if not fragment:
+            return False
+        boundary = "" if not fragment[-1].isalnum() else r'(?![a-z0-9.])'
+        return re.search(r'(?:^|[/:])' + re.escape(fragment) + boundary, name) is not None
+
+    def context_window(self, model: str) -> int:
+        """The model's context window in tokens, 0 if it isn't known"""
+        name = (model or "").lower()
+        matches = [fragment for fragment in self.windows if self._names_model(fragment, name)]
+        if matches:
+            return int(self.windows[max(matches, key=len)])
+        # Groq style names end with the parameter count then the window size, e.g. 'llama3-70b-8192'.
+        # Other trailing numbers are dates or versions ('mistral-large-2407'), not windows.
+        trailing = re.search(r'-\d+(?:x\d+)?b-(\d{4,7})$', name)
+        if trailing:
+            return int(trailing.group(1))
+        return int(self.settings['default_window'] or 0)
+
+    def input_budget(self, model: str, max_tokens: Any = 0, window: int = 0) -> int:
+        """
+        Tokens available for the request's input, 0 if the model's window isn't known.
+        window overrides the model's known window, e.g. with the num_ctx an Ollama request loads the model with.
+        """
+        try:
+            window = int(window or 0)
+        except (TypeError, ValueError):
+            window = 0
+        window = window or self.context_window(model)
+        if not window:
+            return 0
+        try:
+            output = int(max_tokens or 0)
+        except (TypeError, ValueError):
+            output = 0
+        return max(0, window - output - int(self.settings['reserve_tokens']))
+
+    def fit(self, params: dict) -> Tuple[int, int, List[str]]:
+        """
+        Drops (or truncates) the oldest example turns of params['messages'] in place until the input fits
+        the model's budget.  The system message, system param and the final message are never touched.
+
+        Returns:
+            (estimated input tokens, budget, list of actions taken).  A budget of 0 means none was applied.
+        """
+        model = str(params.get('model') or "")
+        messages = params.get('messages')
+        system = params.get('system', "")
+        tokens = self.count_messages(messages, model, system) if isinstance(messages, list) else 0
+        options = params.get('options') if isinstance(params.get('options'), dict) else {}
+        budget = self.input_budget(model, self.output_tokens(params), options.get('num_ctx') or 0)
+        actions = []
+        if not budget or tokens <= budget:
+            return tokens, budget, actions
+
+        start = 1 if messages and messages[0].get('role') == 'system' else 0
+        dropped_turns = dropped_messages = 0
+        while tokens > budget and len(messages) - start > 1:
+            oldest = messages[start]
+            cost = self.MESSAGE_TOKENS + self.count_content(oldest.get('content'), model)
+            excess = tokens - budget
+            keep = cost - self.MESSAGE_TOKENS - excess
+            if isinstance(oldest.get('content'), str) and keep >= int(self.settings['min_keep_tokens']):
+                tail = self._keep_tail(oldest['content'], keep, model)
+                if len(tail) < len(oldest['content']):
+                    # A copy, the example dicts belong to the caller
+                    messages[start] = {**oldest, 'content': tail}
+                    tokens = self.count_messages(messages, model, system)
+                    actions.append(f"shortened the oldest remaining example turn ({oldest.get('role')}) to ~{keep} tokens")
+                    continue
+            # An example is a user/assistant pair, drop both so the turns keep alternating
+            drop = 2 if (len(messages) - start > 2 and oldest.get('role') == 'user'
+                         and messages[start + 1].get('role') == 'assistant') else 1
+            del messages[start:start + drop]
+            tokens = self.count_messages(messages, model, system)
+            dropped_turns += 1
+            dropped_messages += drop
+        if dropped_turns:
+            actions.insert(0, f"dropped the {dropped_turns} oldest example turn(s), {dropped_messages} message(s)")
+        return tokens, budget, actions
+
+    def _keep_tail(self, text: str, tokens: int, model: str) -> str:
+        """The end of text, cut to roughly 'tokens' tokens at a word boundary"""
+        ratio = len(text) / max(1, self.count_text(text, model))
+        tail = text[-int(tokens * ratio):]
+        space = tail.find(" ")
+        if 0 <= space < len(tail) // 4:
+            tail = tail[space + 1:]
+        return "..." + tail
+
+
+class EndpointPoolSgltn:
+    """
+    Singleton that spreads requests across a pool of equivalent endpoints (e.g. several Ollama or LM Studio
+    servers entered in LLM_URL).  It tracks the number of outstanding requests per endpoint and picks
+    either the least busy healthy endpoint or, with the 'power_of_two' strategy, the less busy of two
+    randomly sampled ones.  Health comes from each endpoint's circuit breaker.
+    Settings come from the 'endpoint_pool' section of config.json.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    DEFAULTS = {
+        "strategy": "least_outstanding"  # or "power_of_two"
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self._outstanding = {}
+        self._count_lock = threading.Lock()
+        self._rng = random.Random()
+
+        settings = ImportedSgltn().cfig.get_setting('endpoint_pool', {})
+        if not isinstance(settings, dict):
+            settings = {}
+        self.settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+
+    def outstanding(self, url: str) -> int:
+        return self._outstanding.get(url, 0)
+
+    def choose(self, urls: List[str], is_healthy: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """
+        Picks the endpoint for the next request from urls.  Unhealthy endpoints are skipped unless
+        none are healthy, in which case all are considered so their breakers can decide.
+        """
+        if not urls:
+            return None
+        candidates = [url for url in urls if is_healthy is None or is_healthy(url)] or list(urls)
+        with self._count_lock:
+            if self.settings['strategy'] == "power_of_two" and len(candidates) > 2:
+                candidates = self._rng.sample(candidates, 2)
+            fewest = min(self.outstanding(url) for url in candidates)
+            return self._rng.choice([url for url in candidates if self.outstanding(url) == fewest])
+
+    @contextlib.contextmanager
+    def track(self, url: str):
+        """Counts a request to url as outstanding for the duration of the with block"""
+        with self._count_lock:
+            self._outstanding[url] = self._outstanding.get(url, 0) + 1
+        try:
+            yield
+        finally:
+            with self._count_lock:
+                self._outstanding[url] -= 1
+
+
+def prometheus_labels(**labels) -> str:
+    """A Prometheus label set, e.g. {service="OPENAI",le="0.5"}"""
+    def _escape(value: Any) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest rank percentile (0-100) of values, None if there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(len(ordered) * min(100.0, max(0.0, float(pct))) / 100.0)
+    return ordered[max(0, rank - 1)]
+
+
+class Histogram:
+    """Fixed bucket histogram in the Prometheus style, not thread-safe on its own (see MetricSeries)"""
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(upper bound, cumulative count) pairs, ending with +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append(("+Inf" if bound == float('inf') else f"{bound:g}", total))
+        return result
+
+    def to_dict(self) -> dict:
+        return {"buckets": dict(self.cumulative()), "sum": self.sum, "count": self.count}
+
+
+class MetricSeries:
+    """All the measurements for one service/model/endpoint combination, guarded by its own lock"""
+    def __init__(self, latency_buckets: Tuple[float, ...], tps_buckets: Tuple[float, ...], recent: int = 50):
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=recent)  # (latency, failed) of the latest requests, for rolling percentiles
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.errors = {}  # Exception class name: count
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency = Histogram(latency_buckets)
+        self.ttfb = Histogram(latency_buckets)
+        self.tokens_per_second = Histogram(tps_buckets)
+
+
+class RequestMetricsSgltn:
+    """
+    Singleton registry of request metrics per service (RequestMode), model and endpoint: latency and
+    time to first byte histograms, retries, error classes, token counts, payload bytes and tokens/sec.
+    Each series has its own lock so concurrent requests to different services don't contend.
+    Served as Prometheus text on /plush/metrics and as JSON on /plush/metrics.json.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+    TPS_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500)
+    RECENT_WINDOW = 50  # Latest requests per series kept for rolling percentiles and error rates
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self._series = {}
+        self._series_lock = threading.Lock()
+
+    def _get_series(self, key: Tuple[str, str, str]) -> MetricSeries:
+        series = self._series.get(key)
+        if series is None:
+            with self._series_lock:
+                series = self._series.setdefault(key, MetricSeries(self.LATENCY_BUCKETS, self.TPS_BUCKETS,
+                                                                   self.RECENT_WINDOW))
+        return series
+
+    def record(self, service: str, model: str, endpoint: str, latency: float, ttfb: Optional[float] = None,
+               retries: int = 0, error: Optional[str] = None, prompt_tokens: Optional[int] = None,
+               completion_tokens: Optional[int] = None, request_bytes: int = 0, response_bytes: int = 0) -> None:
+        """Records one finished request (including its retries)"""
+        series = self._get_series((service or "", model or "", endpoint or "default"))
+        with series.lock:
+            series.requests += 1
+            series.retries += max(0, retries)
+            series.latency.observe(latency)
+            series.recent.append((latency, bool(error)))
+            if ttfb is not None:
+                series.ttfb.observe(ttfb)
+            if error:
+                series.failures += 1
+                series.errors[error] = series.errors.get(error, 0) + 1
+            series.prompt_tokens += prompt_tokens or 0
+            series.completion_tokens += completion_tokens or 0
+            series.request_bytes += request_bytes
+            series.response_bytes += response_bytes
+            if completion_tokens and latency > 0:
+                # Over the whole request: a non-streamed body arrives with its first byte
+                series.tokens_per_second.observe(completion_tokens / latency)
+
+    def recent(self, service: str, model: str, pct: float = 95) -> dict:
+        """
+        Rolling stats of the latest requests to a service and model, all endpoints together: the number of
+        samples, the error rate and the pct percentile latency of the successful ones (None without any).
+        """
+        with self._series_lock:
+            matching = [series for (s_service, s_model, _), series in self._series.items()
+                        if s_service == service and s_model == model]
+        samples = []
+        for series in matching:
+            with series.lock:
+                samples += list(series.recent)
+        latencies = [latency for latency, failed in samples if not failed]
+        return {"samples": len(samples),
+                "error_rate": (len(samples) - len(latencies)) / len(samples) if samples else 0.0,
+                "latency": percentile(latencies, pct)}
+
+    def snapshot(self) -> dict:
+        """All series as plain data"""
+        with self._series_lock:
+            items = list(self._series.items())
+        series_list = []
+        for (service, model, endpoint), series in items:
+            with series.lock:
+                series_list.append({
+                    "service": service,
+                    "model": model,
+                    "endpoint": endpoint,
+                    "requests": series.requests,
+                    "failures": series.failures,
+                    "retries": series.retries,
+                    "errors": dict(series.errors),
+                    "prompt_tokens": series.prompt_tokens,
+                    "completion_tokens": series.completion_tokens,
+                    "request_bytes": series.request_bytes,
+                    "response_bytes": series.response_bytes,
+                    "latency_seconds": series.latency.to_dict(),
+                    "ttfb_seconds": series.ttfb.to_dict(),
+                    "tokens_per_second": series.tokens_per_second.to_dict()
+                })
+        return {"series": series_list}
+
+    @staticmethod
+    def _labels(entry: dict, **extra) -> str:
+        return prometheus_labels(service=entry["service"], model=entry["model"], endpoint=entry["endpoint"], **extra)
+
+    def prometheus(self) -> str:
+        """The registry in the Prometheus text exposition format"""
+        series_list = self.snapshot()["series"]
+        lines = []
+
+        counters = (("plush_requests_total", "requests", "Requests sent, retries not included"),
+                    ("plush_request_failures_total", "failures", "Requests that failed after all retries"),
+                    ("plush_retries_total", "retries", "Retry attempts"),
+                    ("plush_prompt_tokens_total", "prompt_tokens", "Prompt (input) tokens reported by the service"),
+                    ("plush_completion_tokens_total", "completion_tokens", "Completion (output) tokens reported by the service"),
+                    ("plush_request_bytes_total", "request_bytes", "Request payload bytes"),
+                    ("plush_response_bytes_total", "response_bytes", "Response payload bytes"))
+        for name, field, help_text in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f"{name}{self._labels(entry)} {entry[field]}" for entry in series_list]
+
+        lines += ["# HELP plush_errors_total Failed requests by exception class", "# TYPE plush_errors_total counter"]
+        for entry in series_list:
+            lines += [f"plush_errors_total{self._labels(entry, error_class=error)} {count}"
+                      for error, count in entry["errors"].items()]
+
+        histograms = (("plush_request_latency_seconds", "latency_seconds", "Total request time, including retries"),
+                      ("plush_time_to_first_byte_seconds", "ttfb_seconds", "Time until the first response byte or token"),
+                      ("plush_tokens_per_second", "tokens_per_second", "Completion tokens per second of request time"))
+        for name, field, help_text in histograms:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for entry in series_list:
+                histogram = entry[field]
+                lines += [f"{name}_bucket{self._labels(entry, le=bound)} {count}"
+                          for bound, count in histogram["buckets"].items()]
+                lines.append(f"{name}_sum{self._labels(entry)} {histogram['sum']}")
+                lines.append(f"{name}_count{self._labels(entry)} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+class SchedulerTicket:
+    """A request's place in a RequestSchedulerSgltn lane: waiting for a slot, or holding one once granted"""
+    def __init__(self, lane: Any, priority: str, sort_key: tuple, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.lane = lane
+        self.priority = priority
+        self.sort_key = sort_key
+        self.enqueued = time.perf_counter()
+        self.granted = False
+        self.cancelled = False
+        self._loop = loop
+        self._event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def __lt__(self, other: 'SchedulerTicket') -> bool:
+        return self.sort_key < other.sort_key
+
+    def notify(self) -> None:
+        """Wakes the waiting thread or task, called outside the scheduler's lock"""
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(True)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return Interruption.wait(self._event, timeout)
+
+
+class SchedulerLane:
+    """The slots and the waiting queue of one service/endpoint"""
+    def __init__(self, service: str, endpoint: str, limit: int):
+        self.service = service
+        self.endpoint = endpoint
+        self.limit = limit
+        self.configured = limit  # The limit from config.json (or set_limit()), the adaptive ceiling by default
+        self.active = 0
+        self.queued = 0
+        self.granted = 0
+        self.waiting = []  # Heap of SchedulerTickets, cancelled ones are skipped when popped
+        self.wait_times = {}  # priority: Histogram
+        # Adaptive limit state
+        self.latencies = []  # Latencies of the current window
+        self.peak = 0  # Most slots in use during the current window
+        self.baseline = None  # p50 latency the windows are compared to
+        self.cut_at = 0.0  # time.monotonic() of the last decrease
+        self.changes = {"increase": 0, "decrease": 0}
+
+
+class RequestSchedulerSgltn:
+    """
+    Singleton scheduler that admits requests to each service (RequestMode) and endpoint up to a concurrency
+    limit.  Requests over the limit wait in a priority queue: 'interactive' requests go ahead of 'batch'
+    ones, and with shortest_job_first smaller requests (by estimated tokens) go first within a priority.
+    Settings come from the 'request_scheduler' section of config.json, 'limits' are looked up by endpoint
+    (base url), then RequestMode name, then "default".  Limits apply to this ComfyUI instance only.
+
+    With 'adaptive' enabled each lane's limit is tuned AIMD style: it's multiplied by 'decrease' on a 429/503
+    response or when a window's p50 latency goes over 'latency_tolerance' times the lane's baseline, and grows
+    by 'increase' after every window of completed requests whose p50 latency stays within that tolerance while
+    the lane was saturated.  The configured limit is the ceiling, so e.g. a single slot local server is never
+    sent more than it's set up for, unless 'exceed_configured' lets limits grow up to 'max_limit'.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    PRIORITIES = ("interactive", "batch")  # Highest priority first
+
+    WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+    OVERLOAD_STATUS = (429, 503)  # Responses that cut an adaptive limit straight away
+
+    BASELINE_DRIFT = 0.1  # Share of a slower window's p50 taken into the baseline, so a lasting change is accepted
+
+    DEFAULTS = {
+        "enabled": True,
+        "shortest_job_first": False,
+        "limits": {"default": 8, "OPENAI": 32, "CLAUDE": 16, "GROQ": 8, "OLLAMA": 1, "LMSTUDIO": 1},
+        "adaptive": {"enabled": True, "exceed_configured": False, "min_limit": 1, "max_limit": 64, "increase": 1,
+                     "decrease": 0.5, "latency_tolerance": 2.0, "window": 10}
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self._lanes = {}
+        self._lanes_lock = threading.Lock()
+        self._sequence = 0
+
+        settings = ImportedSgltn().cfig.get_setting('request_scheduler', {})
+        if not isinstance(settings, dict):
+            settings = {}
+        self.settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+        limits = settings.get('limits')
+        self.limits = {**self.DEFAULTS['limits'], **(limits if isinstance(limits, dict) else {})}
+        adaptive = settings.get('adaptive')
+        self.adaptive = {**self.DEFAULTS['adaptive'], **(adaptive if isinstance(adaptive, dict) else {})}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings['enabled'])
+
+    @property
+    def shortest_job_first(self) -> bool:
+        return bool(self.settings['shortest_job_first'])
+
+    @property
+    def adaptive_enabled(self) -> bool:
+        return bool(self.adaptive['enabled'])
+
+    def limit_for(self, service: str, endpoint: str = "") -> int:
+        for name in (endpoint, service, "default"):
+            if name and name in self.limits:
+                try:
+                    return max(1, int(self.limits[name]))
+                except (TypeError, ValueError):
+                    self.j_mngr.log_events(f"Invalid request_scheduler limit for '{name}': {self.limits[name]}",
+                                           TroubleSgltn.Severity.WARNING)
+        return int(self.DEFAULTS['limits']['default'])
+
+    def _lane(self, service: str, endpoint: str) -> SchedulerLane:
+        """Must be called holding _lanes_lock"""
+        lane = self._lanes.get((service, endpoint))
+        if lane is None:
+            lane = self._lanes[(service, endpoint)] = SchedulerLane(service, endpoint, self.limit_for(service, endpoint))
+        return lane
+
+    def set_limit(self, service: str, endpoint: str, limit: int) -> None:
+        """Changes a lane's concurrency limit, waiting requests are admitted at once if it was raised"""
+        with self._lanes_lock:
+            lane = self._lane(service, endpoint)
+            lane.limit = lane.configured = max(1, int(limit))
+            granted = self._dispatch(lane)
+        for ticket in granted:
+            ticket.notify()
+
+    def lane_limit(self, service: str, endpoint: str = "") -> int:
+        with self._lanes_lock:
+            return self._lane(service, endpoint).limit
+
+    def _enqueue(self, service: str, endpoint: str, priority: str, size: int,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> SchedulerTicket:
+        if priority not in self.PRIORITIES:
+            priority = self.PRIORITIES[0]
+        rank = self.PRIORITIES.index(priority)
+        with self._lanes_lock:
+            lane = self._lane(service, endpoint)
+            self._sequence += 1
+            ticket = SchedulerTicket(lane, priority, (rank, size if self.shortest_job_first else 0, self._sequence), loop)
+            if lane.active < lane.limit and not lane.queued:
+                lane.active += 1
+                lane.granted += 1
+                lane.peak = max(lane.peak, lane.active)
+                ticket.granted = True
+            else:
+                heapq.heappush(lane.waiting, ticket)
+                lane.queued += 1
+        return ticket
+
+    @staticmethod
+    def _dispatch(lane: SchedulerLane) -> List[SchedulerTicket]:
+        """Grants free slots to the best waiting tickets, must be called holding _lanes_lock"""
+        granted = []
+        while lane.active < lane.limit and lane.waiting:
+            ticket = heapq.heappop(lane.waiting)
+            if ticket.cancelled:
+                continue
+            lane.queued -= 1
+            lane.active += 1
+            lane.granted += 1
+            lane.peak = max(lane.peak, lane.active)
+            ticket.granted = True
+            granted.append(ticket)
+        return granted
+
+    def _cancel(self, ticket: SchedulerTicket) -> bool:
+        """Takes a waiting ticket out of its queue, False if it was granted in the meantime"""
+        with self._lanes_lock:
+            if ticket.granted:
+                return False
+            ticket.cancelled = True
+            ticket.lane.queued -= 1
+            return True
+
+    def _waited(self, ticket: SchedulerTicket) -> None:
+        waited = time.perf_counter() - ticket.enqueued
+        with self._lanes_lock:
+            histogram = ticket.lane.wait_times.get(ticket.priority)
+            if histogram is None:
+                histogram = ticket.lane.wait_times[ticket.priority] = Histogram(self.WAIT_BUCKETS)
+            histogram.observe(waited)
+        if waited >= 1:
+            self.j_mngr.log_events(f"Waited {waited:.2f} seconds for a free {ticket.lane.service} slot "
+                                   f"({ticket.priority} priority)",
+                                   is_trouble=True)
+
+    def _deadline_error(self, ticket: SchedulerTicket, deadline: Deadline) -> DeadlineExceededError:
+        return DeadlineExceededError(f"No free {ticket.lane.service} slot before the {deadline.seconds:g} second deadline")
+
+    def acquire(self, service: str, endpoint: str = "", priority: str = "interactive", size: int = 0,
+                deadline: Optional[Deadline] = None) -> Optional[SchedulerTicket]:
+        """
+        Blocks until the request may be sent and returns its ticket, hand it to release() when the request is done.
+        Returns None if the scheduler is disabled.  Raises DeadlineExceededError if the deadline passes first.
+        """
+        if not self.enabled:
+            return None
+        ticket = self._enqueue(service, endpoint, priority, size)
+        if not ticket.granted:
+            try:
+                granted = ticket.wait(deadline.remaining() if deadline is not None else None)
+            except BaseException:  # A user cancel, a cancelled cancel_scope() (RequestInterruptedError) or anything else
+                if not self._cancel(ticket):
+                    self.release(ticket)
+                raise
+            if not granted and self._cancel(ticket):
+                raise self._deadline_error(ticket, deadline)
+        self._waited(ticket)
+        return ticket
+
+    async def acquire_async(self, service: str, endpoint: str = "", priority: str = "interactive", size: int = 0,
+                            deadline: Optional[Deadline] = None) -> Optional[SchedulerTicket]:
+        """acquire() for the event loop, waiting doesn't block the loop"""
+        if not self.enabled:
+            return None
+        ticket = self._enqueue(service, endpoint, priority, size, asyncio.get_running_loop())
+        if not ticket.granted:
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.future),
+                                       deadline.remaining() if deadline is not None else None)
+            except asyncio.TimeoutError:
+                if self._cancel(ticket):
+                    raise self._deadline_error(ticket, deadline)
+            except asyncio.CancelledError:
+                if not self._cancel(ticket):
+                    self.release(ticket)
+                raise
+        self._waited(ticket)
+        return ticket
+
+    def _limit_bounds(self) -> Tuple[int, int]:
+        try:
+            low = max(1, int(self.adaptive['min_limit']))
+            return low, max(low, int(self.adaptive['max_limit']))
+        except (TypeError, ValueError):
+            return self.DEFAULTS['adaptive']['min_limit'], self.DEFAULTS['adaptive']['max_limit']
+
+    def _ceiling(self, lane: SchedulerLane) -> int:
+        """The most the adaptive controller may raise the lane's limit to"""
+        _, high = self._limit_bounds()
+        return high if self.adaptive.get('exceed_configured') else min(high, lane.configured)
+
+    def _decrease(self, lane: SchedulerLane, reason: str) -> Optional[str]:
+        """
+        Multiplicative decrease, at most once per baseline latency so one burst of errors is one cut.
+        Returns the message to log once the lock is released, must be called holding _lanes_lock.
+        """
+        now = time.monotonic()
+        if now - lane.cut_at < max(1.0, lane.baseline or 0):
+            return None
+        low, _ = self._limit_bounds()
+        limit = max(low, int(lane.limit * float(self.adaptive['decrease'])))
+        lane.latencies = []
+        lane.peak = lane.active
+        lane.cut_at = now
+        if limit >= lane.limit:
+            return None
+        message = f"{lane.service} concurrency limit lowered from {lane.limit} to {limit}: {reason}"
+        lane.limit = limit
+        lane.changes["decrease"] += 1
+        return message
+
+    def _adapt(self, lane: SchedulerLane, latency: Optional[float], overloaded: bool) -> Optional[str]:
+        """Feeds one finished request to the lane's AIMD controller, must be called holding _lanes_lock"""
+        if overloaded:
+            return self._decrease(lane, "the server reported it is overloaded")
+        if latency is None:
+            return None
+        lane.latencies.append(latency)
+        if len(lane.latencies) < max(1, int(self.adaptive['window'])):
+            return None
+        p50 = statistics.median(lane.latencies)
+        saturated = lane.peak >= lane.limit or lane.queued > 0
+        lane.latencies = []
+        lane.peak = lane.active
+        if lane.baseline is None or p50 < lane.baseline:
+            lane.baseline = p50
+        elif p50 > lane.baseline * float(self.adaptive['latency_tolerance']):
+            message = self._decrease(lane, f"p50 latency rose from {lane.baseline:.2f} to {p50:.2f} seconds")
+            lane.baseline += (p50 - lane.baseline) * self.BASELINE_DRIFT
+            return message
+        else:
+            lane.baseline += (p50 - lane.baseline) * self.BASELINE_DRIFT
+        high = self._ceiling(lane)
+        if saturated and lane.limit < high:
+            lane.limit = min(high, lane.limit + max(1, int(self.adaptive['increase'])))
+            lane.changes["increase"] += 1
+        return None
+
+    def release(self, ticket: Optional[SchedulerTicket], latency: Optional[float] = None,
+                overloaded: bool = False) -> None:
+        """
+        Frees the ticket's slot.  latency (seconds, successful requests only) and overloaded (a 429/503 reply)
+        feed the lane's adaptive limit.
+        """
+        if ticket is None:
+            return
+        message = None
+        with self._lanes_lock:
+            ticket.lane.active -= 1
+            if self.adaptive_enabled:
+                message = self._adapt(ticket.lane, latency, overloaded)
+            granted = self._dispatch(ticket.lane)
+        for waiting in granted:
+            waiting.notify()
+        if message:
+            self.j_mngr.log_events(message, is_trouble=True)
+
+    def service_load(self, service: str) -> dict:
+        """Queued and active requests and the concurrency limit of a service, all its lanes together"""
+        with self._lanes_lock:
+            lanes = [lane for lane in self._lanes.values() if lane.service == service]
+            return {"queued": sum(lane.queued for lane in lanes),
+                    "active": sum(lane.active for lane in lanes),
+                    "limit": sum(lane.limit for lane in lanes) or self.limit_for(service)}
+
+    def snapshot(self) -> dict:
+        with self._lanes_lock:
+            lanes = [{
+                "service": lane.service,
+                "endpoint": lane.endpoint or "default",
+                "limit": lane.limit,
+                "active": lane.active,
+                "queued": lane.queued,
+                "granted": lane.granted,
+                "baseline_p50_seconds": lane.baseline,
+                "limit_changes": dict(lane.changes),
+                "wait_seconds": {priority: histogram.to_dict() for priority, histogram in lane.wait_times.items()}
+            } for lane in self._lanes.values()]
+        return {"shortest_job_first": self.shortest_job_first, "adaptive": self.adaptive_enabled, "lanes": lanes}
+
+    def prometheus(self) -> str:
+        lanes = self.snapshot()["lanes"]
+        lines = []
+        gauges = (("plush_scheduler_queue_depth", "queued", "Requests waiting for a slot"),
+                  ("plush_scheduler_active", "active", "Requests holding a slot"),
+                  ("plush_scheduler_limit", "limit", "Concurrency limit"))
+        for name, field, help_text in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{prometheus_labels(service=lane['service'], endpoint=lane['endpoint'])} {lane[field]}"
+                      for lane in lanes]
+
+        name = "plush_scheduler_latency_baseline_seconds"
+        lines += [f"# HELP {name} p50 latency the adaptive limit compares each window to", f"# TYPE {name} gauge"]
+        lines += [f"{name}{prometheus_labels(service=lane['service'], endpoint=lane['endpoint'])} "
+                  f"{lane['baseline_p50_seconds']}"
+                  for lane in lanes if lane['baseline_p50_seconds'] is not None]
+
+        name = "plush_scheduler_limit_changes_total"
+        lines += [f"# HELP {name} Adaptive concurrency limit changes", f"# TYPE {name} counter"]
+        for lane in lanes:
+            lines += [f"{name}{prometheus_labels(service=lane['service'], endpoint=lane['endpoint'], direction=direction)} "
+                      f"{count}" for direction, count in lane['limit_changes'].items()]
+
+        name = "plush_scheduler_wait_seconds"
+        lines += [f"# HELP {name} Time requests waited for a slot", f"# TYPE {name} histogram"]
+        for lane in lanes:
+            for priority, histogram in lane["wait_seconds"].items():
+                labels = {"service": lane["service"], "endpoint": lane["endpoint"], "priority": priority}
+                lines += [f"{name}_bucket{prometheus_labels(**labels, le=bound)} {count}"
+                          for bound, count in histogram["buckets"].items()]
+                lines.append(f"{name}_sum{prometheus_labels(**labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{prometheus_labels(**labels)} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+class ProviderRouterSgltn:
+    """
+    Singleton that picks the (service, model) route for an "Auto (fastest healthy)" request from a set of
+    equivalent routes.  Each route is scored by its rolling latency percentile from RequestMetricsSgltn,
+    stretched by the requests queued at the service's RequestSchedulerSgltn lanes and by its recent error
+    rate.  Routes with an open circuit breaker or too many recent errors are skipped while any other is
+    healthy, routes without enough samples are tried first, and an 'explore' share of requests goes to
+    another healthy route so the numbers of routes that aren't the fastest stay current.
+    Settings come from the 'provider_routing' section of config.json, 'routes' is a list of
+    {"service": RequestMode name, "model": model} dicts used when a node doesn't supply its own.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    # Services a route can use, with the url their requests go to (for their circuit breaker)
+    SERVICE_URLS = {RequestMode.OPENAI: "", RequestMode.CLAUDE: "", RequestMode.GROQ: "https://api.groq.com/openai/v1"}
+
+    DEFAULTS = {
+        "routes": [],
+        "percentile": 95,
+        "min_samples": 3,
+        "max_error_rate": 0.5,
+        "explore": 0.05
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self.metrics = RequestMetricsSgltn()
+        self.scheduler = RequestSchedulerSgltn()
+        self.breakers = CircuitBreakerSgltn()
+        self._rng = random.Random()
+
+        settings = ImportedSgltn().cfig.get_setting('provider_routing', {})
+        if not isinstance(settings, dict):
+            settings = {}
+        self.settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+
+    def configured_routes(self) -> List[Tuple[RequestMode, str]]:
+        """The 'routes' from config.json, entries with an unknown service or no model are skipped"""
+        routes = []
+        for entry in self.settings['routes'] if isinstance(self.settings['routes'], list) else []:
+            mode = RequestMode.__members__.get(str(entry.get('service', '')).upper()) if isinstance(entry, dict) else None
+            if mode in self.SERVICE_URLS and entry.get('model'):
+                routes.append((mode, str(entry['model'])))
+            else:
+                self.j_mngr.log_events(f"Skipping invalid provider_routing route: {entry}",
+                                       TroubleSgltn.Severity.WARNING)
+        return routes
+
+    def _stats(self, route: Tuple[RequestMode, str]) -> dict:
+        mode, model = route
+        stats = self.metrics.recent(mode.name, model, float(self.settings['percentile']))
+        load = self.scheduler.service_load(mode.name)
+        breaker = self.breakers.get(mode.name, self.SERVICE_URLS[mode])
+        stats["queued"] = load["queued"]
+        stats["healthy"] = not (breaker is not None and breaker.is_open) and not (
+            stats["samples"] >= int(self.settings['min_samples'])
+            and stats["error_rate"] > float(self.settings['max_error_rate']))
+        if stats["latency"] is None:
+            stats["score"] = None
+        else:
+            # Expected wait for a good answer: slower with a queue ahead, and with failures that need another try
+            stats["score"] = (stats["latency"] * (1 + load["queued"] / max(1, load["limit"]))
+                              / max(0.05, 1 - stats["error_rate"]))
+        return stats
+
+    @staticmethod
+    def _describe(route: Tuple[RequestMode, str], stats: dict) -> str:
+        latency = f"{stats['latency']:.2f}s" if stats["latency"] is not None else "n/a"
+        return (f"{route[0].name} {route[1]} (latency {latency}, errors {stats['error_rate']:.0%}, "
+                f"queued {stats['queued']}{'' if stats['healthy'] else ', unhealthy'})")
+
+    def choose(self, routes: Optional[List[Tuple[RequestMode, str]]] = None) -> Optional[Tuple[RequestMode, str]]:
+        """
+        Picks the route for the next request from routes (the configured routes if not given) and records
+        the choice and the figures behind it in the troubleshooting output.  Returns None if there are no routes.
+        """
+        routes = [route for route in (routes or self.configured_routes()) if route[0] in self.SERVICE_URLS]
+        if not routes:
+            self.j_mngr.log_events("No routes to choose from for 'Auto (fastest healthy)', select models for the "
+                                   "services to route between or list them in the 'provider_routing' section of config.json",
+                                   TroubleSgltn.Severity.ERROR,
+                                   True)
+            return None
+
+        stats = {route: self._stats(route) for route in routes}
+        candidates = [route for route in routes if stats[route]["healthy"]] or routes
+        min_samples = int(self.settings['min_samples'])
+        unmeasured = [route for route in candidates
+                      if stats[route]["samples"] < min_samples or stats[route]["score"] is None]
+        measured = [route for route in candidates if route not in unmeasured]
+        if unmeasured:
+            route = min(unmeasured, key=lambda r: stats[r]["samples"])
+            reason = "too few recent requests to compare"
+        else:
+            route = min(measured, key=lambda r: stats[r]["score"])
+            reason = f"fastest at p{float(self.settings['percentile']):g}"
+            others = [other for other in measured if other != route]
+            if others and self._rng.random() < float(self.settings['explore']):
+                route = self._rng.choice(others)
+                reason = "exploring, to keep its latency figures current"
+
+        self.j_mngr.log_events(f"Auto route: {self._describe(route, stats[route])}, {reason}.  Candidates: "
+                               f"{'; '.join(self._describe(other, stats[other]) for other in routes if other != route) or 'none'}",
+                               TroubleSgltn.Severity.INFO,
+                               True)
+        return route
+
+
+class HedgingSgltn:
+    """
+    Singleton that decides when the 'hedge' pipeline stage sends a duplicate of a slow request.  A request
+    that hasn't answered within the 'percentile' of its service and model's recent latency (at least
+    'min_delay' seconds, and only once 'min_samples' requests have been measured) gets one duplicate.
+    Each service has a hedge budget: every request earns it 'budgets' (e.g. 0.05 = at most 5% extra
+    requests) of a hedge, up to 'burst' saved hedges, and each duplicate spends one.
+    Settings come from the 'hedging' section of config.json, budgets are looked up by RequestMode name,
+    then "default".  Off by default.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    DEFAULTS = {
+        "enabled": False,
+        "percentile": 95,
+        "min_samples": 20,
+        "min_delay": 1.0,
+        "burst": 5,
+        "budgets": {"default": 0.05}
+    }
+
+    MAX_WORKERS = 32  # Threads running the duplicates of synchronous hedged requests
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self.metrics = RequestMetricsSgltn()
+        self._credit = {}  # service: hedges it may send now
+        self._counts = {}  # service: {"requests", "hedges", "won"}
+        self._count_lock = threading.Lock()
+        self._executor = None
+        self._timers = []  # Heap of [due, sequence, callback], callback None once cancelled
+        self._timer_sequence = 0
+        self._timer_wakeup = threading.Condition()
+        self._timer_thread = None
+
+        settings = ImportedSgltn().cfig.get_setting('hedging', {})
+        if not isinstance(settings, dict):
+            settings = {}
+        self.settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+        budgets = settings.get('budgets')
+        self.budgets = {**self.DEFAULTS['budgets'], **(budgets if isinstance(budgets, dict) else {})}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.settings['enabled'])
+
+    @property
+    def executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Worker threads for the synchronous path, started on first use"""
+        with self._count_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_WORKERS,
+                                                                       thread_name_prefix="plush-hedge")
+            return self._executor
+
+    def schedule(self, delay: float, callback: Callable[[], Any]) -> list:
+        """
+        Calls callback on the shared timer thread after delay seconds, returns the timer for cancel().
+        The callback must be quick (e.g. submit work to the executor).
+        """
+        with self._timer_wakeup:
+            self._timer_sequence += 1
+            timer = [time.monotonic() + max(0.0, delay), self._timer_sequence, callback]
+            heapq.heappush(self._timers, timer)
+            if self._timer_thread is None:
+                self._timer_thread = threading.Thread(target=self._run_timers, name="plush-hedge-timer", daemon=True)
+                self._timer_thread.start()
+            self._timer_wakeup.notify()
+        return timer
+
+    def cancel(self, timer: list) -> None:
+        with self._timer_wakeup:
+            timer[2] = None
+
+    def _run_timers(self) -> None:
+        while True:
+            with self._timer_wakeup:
+                while self._timers and self._timers[0][2] is None:
+                    heapq.heappop(self._timers)
+                if not self._timers:
+                    self._timer_wakeup.wait()
+                    continue
+                wait = self._timers[0][0] - time.monotonic()
+                if wait > 0:
+                    self._timer_wakeup.wait(wait)
+                    continue
+                callback = heapq.heappop(self._timers)[2]
+            try:
+                callback()
+            except Exception as e:  # pylint: disable=broad-except
+                self.j_mngr.log_events(f"Hedge timer callback failed: {e}", TroubleSgltn.Severity.WARNING)
+
+    def budget_for(self, service: str) -> float:
+        for name in (service, "default"):
+            if name in self.budgets:
+                try:
+                    return max(0.0, float(self.budgets[name]))
+                except (TypeError, ValueError):
+                    self.j_mngr.log_events(f"Invalid hedging budget for '{name}': {self.budgets[name]}",
+                                           TroubleSgltn.Severity.WARNING)
+        return float(self.DEFAULTS['budgets']['default'])
+
+    def _count(self, service: str, field: str) -> None:
+        """Must be called holding _count_lock"""
+        counts = self._counts.setdefault(service, {"requests": 0, "hedges": 0, "won": 0})
+        counts[field] += 1
+
+    def hedge_delay(self, service: str, model: str) -> Optional[float]:
+        """
+        Counts a request towards the service's hedge budget and returns the seconds to wait for it before
+        sending a duplicate, or None if it won't be hedged (disabled, or too few latency samples)
+        """
+        if not self.enabled:
+            return None
+        with self._count_lock:
+            self._count(service, "requests")
+            self._credit[service] = min(float(self.settings['burst']),
+                                        self._credit.get(service, 0.0) + self.budget_for(service))
+        stats = self.metrics.recent(service, model, float(self.settings['percentile']))
+        if stats["samples"] < int(self.settings['min_samples']) or stats["latency"] is None:
+            return None
+        return max(float(self.settings['min_delay']), stats["latency"])
+
+    def spend(self, service: str) -> bool:
+        """Takes one hedge from the service's budget, False if it has none left"""
+        with self._count_lock:
+            if self._credit.get(service, 0.0) < 1:
+                return False
+            self._credit[service] -= 1
+            self._count(service, "hedges")
+            return True
+
+    def won(self, service: str) -> None:
+        """The duplicate answered before the original"""
+        with self._count_lock:
+            self._count(service, "won")
+
+    def snapshot(self) -> dict:
+        with self._count_lock:
+            services = {service: dict(counts) for service, counts in self._counts.items()}
+        return {"enabled": self.enabled, "services": services}
+
+    def prometheus(self) -> str:
+        services = self.snapshot()["services"]
+        lines = []
+        counters = (("plush_hedge_requests_total", "requests", "Requests that could be hedged"),
+                    ("plush_hedges_total", "hedges", "Duplicate requests sent"),
+                    ("plush_hedges_won_total", "won", "Duplicate requests that answered first"))
+        for name, field, help_text in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f"{name}{prometheus_labels(service=service)} {counts[field]}"
+                      for service, counts in services.items()]
+        return "\n".join(lines) + "\n"
+
+
+# Per call details (attempts, time to first byte, response size) noted while a request is being sent.
+# A context variable keeps concurrent requests on threads and event loop tasks apart.
+_CALL_STATS: contextvars.ContextVar = contextvars.ContextVar('plush_call_stats', default=None)
+
+
+class StreamRelay:
+    """
+    Collects the text deltas of a streamed completion.  Pushes the partial text to the node in
+    the ComfyUI frontend while the response arrives, and measures time to first token and
+    generation speed.
+    """
+    def __init__(self, node_id: Any = None, min_interval: float = 0.1):
+        self.node_id = str(node_id) if node_id is not None else None
+        self.min_interval = min_interval  # Seconds between frontend updates
+        self.reset()
+
+    def reset(self, timeout: Optional[float] = None) -> None:
+        """Starts over, called at the beginning of each attempt with the request's remaining time budget"""
+        self._parts = []
+        self.start_time = time.perf_counter()
+        self.stop_time = self.start_time + timeout if timeout is not None else None
+        self.first_token_time = None
+        self.end_time = None
+        self.chunks = 0
+        self._last_push = 0.0
+
+    def add(self, delta: Optional[str]) -> None:
+        Interruption.check()  # Raising here closes the stream, the request is aborted
+        now = time.perf_counter()
+        if self.stop_time is not None and now > self.stop_time:
+            # The clients' timeouts only limit the wait for each chunk, not the whole stream
+            raise DeadlineExceededError("Streamed response didn't finish before the request deadline")
+        if not delta:
+            return
+        if self.first_token_time is None:
+            self.first_token_time = now
+        self._parts.append(delta)
+        self.chunks += 1
+        if now - self._last_push >= self.min_interval:
+            self._last_push = now
+            self.push()
+
+    def finish(self) -> None:
+        self.end_time = time.perf_counter()
+        self.push()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from sending the request to receiving the first token"""
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+
+    def tokens_per_second(self, completion_tokens: Optional[int] = None) -> Optional[float]:
+        """
+        Generation speed after the first token.  Uses the server reported token count if
+        available, otherwise the number of streamed chunks (roughly one token each).
+        """
+        if self.first_token_time is None or self.end_time is None:
+            return None
+        elapsed = self.end_time - self.first_token_time
+        tokens = completion_tokens or self.chunks
+        if elapsed <= 0 or not tokens:
+            return None
+        return tokens / elapsed
+
+    def push(self) -> None:
+        """Sends the text received so far to the node's display in the ComfyUI frontend"""
+        if PromptServer is None or self.node_id is None or not self._parts:
+            return
+        server = getattr(PromptServer, 'instance', None)
+        if server is None:
+            return
+        try:
+            if hasattr(server, 'send_progress_text'):
+                server.send_progress_text(self.text, self.node_id)
+            else:
+                server.send_sync("plush.stream", {"node": self.node_id, "text": self.text})
+        except Exception:
+            pass  # The display is a convenience, never fail the request over it
+
+
+class StreamedResponse:
+    """
+    A streamed completion reassembled into the shape of a regular response, so retry handling
+    and the Request subclasses' _process_response() treat both the same way.
+    """
+    status_code = 200
+
+    def __init__(self, text: str, model: Optional[str] = None, usage: Any = None, error: Any = None):
+        self.model = model
+        self.usage = usage
+        self.error = error
+        self.choices = [SimpleNamespace(message=SimpleNamespace(content=text))] if error is None else []
+        self.text = text
+
+    def __contains__(self, key: str) -> bool:
+        return key == 'error' and self.error is not None
+
+    def json(self) -> dict:
+        if self.error is not None:
+            return {'error': self.error}
+        response_json = {'choices': [{'message': {'content': self.text}}]}
+        if self.model:
+            response_json['model'] = self.model
+        if self.usage:
+            response_json['usage'] = self.usage
+        return response_json
+
+
+class JsonPayload:
+    """
+    A POST body serialized once.  Retries, endpoint failover and the metrics registry all reuse the same
+    bytes instead of having requests/httpx re-encode what is often a multi-megabyte base64 image per attempt.
+    """
+    def __init__(self, params: dict):
+        self.params = params
+        self.data = encode_json(params)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @staticmethod
+    def headers(headers: dict) -> dict:
+        if any(key.lower() == 'content-type' for key in headers):
+            return headers
+        return {**headers, "Content-Type": "application/json"}
+
+
+class HttpEnvelope:
+    """
+    A raw http response (requests or httpx) whose body is read and parsed at most once.  The retry handler,
+    rate limiter, metrics and the Request subclass that turns it into text all share the parsed payload.
+    """
+    def __init__(self, response: Any):
+        self.raw = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        try:
+            self.elapsed = response.elapsed
+        except (AttributeError, RuntimeError):
+            self.elapsed = None  # httpx raises until the response is closed
+        self._content = None
+        self._text = None
+        self._json = None
+        self._json_error = None
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = self.raw.content
+        return self._content
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.raw.text
+        return self._text
+
+    def json(self) -> Any:
+        """The parsed body, parsing happens on the first call.  Raises ValueError if the body isn't JSON"""
+        if self._json is None and self._json_error is None:
+            try:
+                self._json = decode_json(self.content)
+            except ValueError as e:
+                self._json_error = str(e)
+        if self._json_error is not None:
+            raise ValueError(self._json_error)
+        return self._json
+
+
+class PreparedRequest:
+    """
+    Everything a Request subclass needs to send a single call and interpret the reply.
+    If 'result' is set the request is short-circuited (e.g. missing client or empty input)
+    and 'result' is handed back to the caller as is.
+    """
+    def __init__(
+        self,
+        request_type: Any = None,
+        params: Optional[dict] = None,
+        client: Any = None,
+        url: str = "",
+        headers: Optional[dict] = None,
+        result: Any = None,
+        endpoints: Optional[List[str]] = None
+    ):
+        self.request_type = request_type
+        self.params = params or {}
+        self.client = client
+        self.url = url
+        self.headers = headers or {}
+        self.result = result
+        self.endpoints = endpoints or []  # Pool of equivalent endpoints, the one used is chosen per request
+        self.relay = None  # StreamRelay when the response is streamed
+
+    @property
+    def params(self) -> dict:
+        return self._params
+
+    @params.setter
+    def params(self, params: dict) -> None:
+        self._params = params
+        self._payload = None  # Re-serialized on next use
+
+    @property
+    def payload(self) -> JsonPayload:
+        """The params serialized to JSON, built on first use and kept until params is replaced"""
+        if self._payload is None or self._payload.params is not self._params:
+            self._payload = JsonPayload(self._params)
+        return self._payload
+
+    def request_args(self, client: Any = None) -> tuple:
+        """Positional args for Request._make_request(), optionally swapping in a different client"""
+        if self.url:
+            args = (self.url, self.headers, self.payload)
+        else:
+            args = (client if client is not None else self.client, self.params)
+        if self.relay is not None:
+            args += (self.relay,)
+        return args
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised by the circuit_breaker stage when the endpoint's breaker refuses the request"""
+    def __init__(self, breaker: Any):
+        super().__init__(f"Circuit breaker for {breaker.name} is {breaker.state.value}")
+        self.breaker = breaker
+
+
+class RequestCall:
+    """
+    One request on its way through the RequestPipelineSgltn stages: the prepared request plus the
+    state the stages share.
+    """
+    def __init__(self, request: Any, prepared: PreparedRequest, retry_handler: Any, kwargs: Optional[dict] = None,
+                 async_client: Any = None):
+        self.request = request
+        self.prepared = prepared
+        self.retry_handler = retry_handler
+        self.kwargs = kwargs or {}
+        self.async_client = async_client  # Replaces prepared.client on the async path
+        self.breaker = None  # Breaker of the endpoint the call is sent to
+        self.sent = False  # Set once the current attempt reaches _make_request()
+        self.url = "" if prepared.endpoints else request._endpoint(prepared)  # Set per attempt for pools
+
+    @property
+    def deadline(self) -> Optional[Deadline]:
+        return getattr(self.retry_handler, 'deadline', None)
+
+    @property
+    def priority(self) -> str:
+        """The request's RequestSchedulerSgltn priority class"""
+        return self.kwargs.get('priority') or "interactive"
+
+    def fork(self) -> 'RequestCall':
+        """A copy of the call that can be sent alongside it (a hedge), with its own prepared request and retries"""
+        twin = copy.copy(self)
+        twin.prepared = copy.copy(self.prepared)
+        if hasattr(self.retry_handler, 'clone'):
+            twin.retry_handler = self.retry_handler.clone()
+        return twin
+
+
+class Middleware:
+    """
+    A stage of the request pipeline.  handle() gets the call and the rest of the pipeline as next_stage,
+    it can work before and after calling next_stage or answer without calling it.
+    Stages above 'process' get and return the processed result of the request, stages below it get
+    the raw response (and exceptions).  The default implementations just pass the call on.
+    """
+    name = ""
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        return next_stage(call)
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        return await next_stage(call)
+
+
+class TracingStage(Middleware):
+    """Logs the start, end and duration of each request"""
+    name = "tracing"
+
+    def _start(self, call: RequestCall) -> Tuple[str, float]:
+        trace_id = f"{random.getrandbits(32):08x}"
+        call.request.j_mngr.log_events(f"Trace {trace_id}: {call.request.__class__.__name__} "
+                                       f"{call.prepared.params.get('model', '')} to {call.url or 'service default'}",
+                                       is_trouble=True)
+        return trace_id, time.perf_counter()
+
+    def _end(self, call: RequestCall, trace_id: str, started: float, result: Any) -> None:
+        outcome = "failed" if result in Request.FAILED_RESULTS else "done"
+        call.request.j_mngr.log_events(f"Trace {trace_id}: {outcome} in {time.perf_counter() - started:.3f}s",
+                                       is_trouble=True)
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        trace_id, started = self._start(call)
+        result = next_stage(call)
+        self._end(call, trace_id, started, result)
+        return result
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        trace_id, started = self._start(call)
+        result = await next_stage(call)
+        self._end(call, trace_id, started, result)
+        return result
+
+
+class CacheStage(Middleware):
+    """Answers from the response cache, stores successful results"""
+    name = "cache"
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        cache_key = call.request._cache_key(call.prepared, **call.kwargs)
+        cached = call.request._cached_result(cache_key)
+        if cached is not None:
+            return cached
+        result = next_stage(call)
+        call.request._store_result(cache_key, result)
+        return result
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        cache_key = call.request._cache_key(call.prepared, **call.kwargs)
+        cached = call.request._cached_result(cache_key)
+        if cached is not None:
+            return cached
+        result = await next_stage(call)
+        call.request._store_result(cache_key, result)
+        return result
+
+
+class SingleFlightStage(Middleware):
+    """Identical concurrent requests share one call"""
+    name = "single_flight"
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        flight_key = call.request._flight_key(call.prepared, **call.kwargs)
+        if flight_key is None:
+            return next_stage(call)
+        return call.request.flights.run(flight_key, next_stage, call)
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        flight_key = call.request._flight_key(call.prepared, **call.kwargs)
+        if flight_key is None:
+            return await next_stage(call)
+        return await call.request.flights.run_async(flight_key, next_stage, call)
+
+
+class ProcessStage(Middleware):
+    """
+    Turns the raw response into the node's result with the Request subclass's _process_response(),
+    and exceptions into its error result.  Always part of the pipeline.
+    """
+    name = "process"
+
+
+    @staticmethod
+    def _error_result(call: RequestCall, e: Exception) -> Any:
+        if Interruption.is_interruption(e):
+            raise e  # ComfyUI ends the run as cancelled, not with a failed result
+        if isinstance(e, CircuitOpenError):
+            return call.request._circuit_open_result(e.breaker)
+        return call.request._handle_request_error(e)
+
+    def _result(self, call: RequestCall, response: Any) -> Any:
+        try:
+            return call.request._process_response(response)
+        except Exception as e:
+            return self._error_result(call, e)
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        if call.kwargs.get('stream', False):  # The async path isn't streamed
+            call.request._enable_streaming(call.prepared, call.kwargs.get('node_id'))
+        try:
+            response = next_stage(call)
+        except Exception as e:
+            return self._error_result(call, e)
+        return self._result(call, response)
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        try:
+            response = await next_stage(call)
+        except Exception as e:
+            return self._error_result(call, e)
+        return self._result(call, response)
+
+
+class CircuitBreakerStage(Middleware):
+    """Fails fast while the endpoint's breaker is open, reports the outcome to the breaker and health table"""
+    name = "circuit_breaker"
+
+    def _open(self, call: RequestCall) -> bool:
+        if call.prepared.endpoints:  # Pools have a breaker per endpoint, see EndpointPoolStage
+            return False
+        call.breaker = call.request._get_breaker(call.prepared)
+        if call.breaker and not call.breaker.allow_request():
+            raise CircuitOpenError(call.breaker)
+        return True
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        if not self._open(call):
+            return next_stage(call)
+        try:
+            response = next_stage(call)
+        except BaseException as e:
+            call.request._record_outcome(call.breaker, call.retry_handler, e, call.url)
+            raise
+        call.request._record_outcome(call.breaker, call.retry_handler, url=call.url)
+        return response
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        if not self._open(call):
+            return await next_stage(call)
+        try:
+            response = await next_stage(call)
+        except BaseException as e:
+            call.request._record_outcome(call.breaker, call.retry_handler, e, call.url)
+            raise
+        call.request._record_outcome(call.breaker, call.retry_handler, url=call.url)
+        return response
+
+
+class HedgeStage(Middleware):
+    """
+    Sends a duplicate of a request that's slower than its service and model usually are, within the
+    HedgingSgltn budget, and returns whichever copy answers first.  Below this stage each copy gets its own
+    endpoint (a pool gives the duplicate the least busy one), retries, scheduler slot and metrics.  The losing
+    copy is cancelled.  Synchronous requests run on the caller's thread, only the duplicate runs on the
+    HedgingSgltn executor, and copies are cancelled through an Interruption.cancel_scope().
+    Streamed requests aren't hedged.
+    """
+    name = "hedge"
+
+    @staticmethod
+    def _delay(call: RequestCall) -> Tuple[str, Optional[float]]:
+        service, model = call.request._rate_limit_key(call.prepared.params)
+        if call.kwargs.get('stream', False):
+            return service, None
+        return service, call.request.hedging.hedge_delay(service, model)
+
+    @staticmethod
+    def _log_hedge(call: RequestCall, delay: float) -> None:
+        call.request.j_mngr.log_events(f"No reply after {delay:.2f} seconds, sending a duplicate request",
+                                       TroubleSgltn.Severity.INFO,
+                                       True)
+
+    @staticmethod
+    def _log_winner(call: RequestCall, service: str, hedged: bool) -> None:
+        if hedged:
+            call.request.hedging.won(service)
+        call.request.j_mngr.log_events(f"The {'duplicate' if hedged else 'original'} request answered first",
+                                       is_trouble=True)
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        service, delay = self._delay(call)
+        if delay is None:
+            return next_stage(call)
+        hedging = call.request.hedging
+        cancel_primary, cancel_hedge = threading.Event(), threading.Event()
+        lock = threading.Lock()
+        state = {"finished": False, "hedge": None}
+        context = contextvars.copy_context()
+        twin = call.fork()
+
+        def _run_hedge() -> Any:
+            with Interruption.cancel_scope(cancel_hedge):
+                return next_stage(twin)
+
+        def _hedge_done(future: concurrent.futures.Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                cancel_primary.set()  # The duplicate answered first
+
+        def _launch() -> None:
+            with lock:
+                if state["finished"] or not hedging.spend(service):
+                    return
+                self._log_hedge(call, delay)
+                state["hedge"] = hedging.executor.submit(context.copy().run, _run_hedge)
+            state["hedge"].add_done_callback(_hedge_done)
+
+        timer = hedging.schedule(delay, _launch)
+        error = None
+        try:
+            with Interruption.cancel_scope(cancel_primary):
+                response = next_stage(call)
+        except Exception as e:  # pylint: disable=broad-except
+            error = e
+        finally:
+            hedging.cancel(timer)
+            with lock:
+                state["finished"] = True
+                hedge = state["hedge"]
+
+        if hedge is None:
+            if error is not None:
+                raise error
+            return response
+        if error is None:
+            cancel_hedge.set()
+            self._log_winner(call, service, False)
+            return response
+        if Interruption.is_interruption(error) and not cancel_primary.is_set():
+            cancel_hedge.set()  # The run itself was cancelled
+            raise error
+        try:
+            response = Interruption.result(hedge)
+        except Exception as hedge_error:  # pylint: disable=broad-except
+            if Interruption.is_interruption(hedge_error):
+                cancel_hedge.set()
+                raise
+            raise error from None  # Both failed, raises the original's error
+        self._log_winner(call, service, True)
+        return response
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        service, delay = self._delay(call)
+        if delay is None:
+            return await next_stage(call)
+        tasks = [asyncio.ensure_future(next_stage(call))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not call.request.hedging.spend(service):
+                return await tasks[0]
+
+            self._log_hedge(call, delay)
+            tasks.append(asyncio.ensure_future(next_stage(call.fork())))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done and not task.cancelled() and task.exception() is None:
+                        self._log_winner(call, service, task is not tasks[0])
+                        return task.result()
+            return await tasks[0]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+class EndpointPoolStage(Middleware):
+    """
+    Sends a request with several endpoints to the one the pool picks, and if that endpoint fails
+    (connection error, timeout, server error) fails over to the next one.
+    """
+    name = "endpoint_pool"
+
+    @staticmethod
+    def _next_endpoint(call: RequestCall, tried: List[str], is_async: bool) -> Optional[str]:
+        """Binds the call to the next usable endpoint, None once every endpoint has been tried"""
+        request = call.request
+        while len(tried) < len(call.prepared.endpoints):
+            url = request._pool_candidates(call.prepared, tried)
+            tried.append(url)
+            breaker = request._pool_breaker(url)
+            if breaker and not breaker.allow_request():
+                continue
+            request._bind_endpoint(call.prepared, url, is_async=is_async)
+            call.url, call.breaker, call.async_client = url, breaker, None
+            return url
+        return None
+
+    @staticmethod
+    def _failed(call: RequestCall, url: str, e: BaseException) -> None:
+        """Records a failed endpoint, re-raises errors that another endpoint wouldn't fix"""
+        call.request._record_outcome(call.breaker, call.retry_handler, e, url)
+        if not call.request._is_endpoint_failure(e, call.retry_handler):
+            raise e
+        call.request._log_failover(url, e)
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        if not call.prepared.endpoints:
+            return next_stage(call)
+        tried, last_error = [], None
+        while True:
+            url = self._next_endpoint(call, tried, False)
+            if url is None:
+                break
+            with call.request.pool.track(url):
+                try:
+                    response = next_stage(call)
+                except BaseException as e:
+                    self._failed(call, url, e)
+                    last_error = e
+                    continue
+            call.request._record_outcome(call.breaker, call.retry_handler, url=url)
+            return response
+        raise last_error or RuntimeError("No endpoint in the pool is accepting requests")
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        if not call.prepared.endpoints:
+            return await next_stage(call)
+        tried, last_error = [], None
+        while True:
+            url = self._next_endpoint(call, tried, True)
+            if url is None:
+                break
+            with call.request.pool.track(url):
+                try:
+                    response = await next_stage(call)
+                except BaseException as e:
+                    self._failed(call, url, e)
+                    last_error = e
+                    continue
+            call.request._record_outcome(call.breaker, call.retry_handler, url=url)
+            return response
+        raise last_error or RuntimeError("No endpoint in the pool is accepting requests")
+
+
+class MetricsStage(Middleware):
+    """Records the request, all attempts included, in the RequestMetricsSgltn registry"""
+    name = "metrics"
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        with call.request._measured(call.prepared, call.url) as stats:
+            stats['response'] = next_stage(call)
+        return stats['response']
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        with call.request._measured(call.prepared, call.url) as stats:
+            stats['response'] = await next_stage(call)
+        return stats['response']
+
+
+class RetryStage(Middleware):
+    """Repeats failed attempts with the call's RetryHandler"""
+    name = "retry"
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        return call.retry_handler.execute_with_retry(next_stage, call)
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        return await call.retry_handler.execute_with_retry_async(next_stage, call)
+
+
+class RateLimitStage(Middleware):
+    """
+    Waits for rate limiter capacity before each attempt, feeds the response's rate limit headers back.
+    Runs above the scheduler so a request doesn't hold a scheduler slot while it waits for capacity, and
+    refunds the capacity of an attempt that's abandoned (deadline, cancel, no slot) before it's sent.
+    """
+    name = "rate_limit"
+
+    @staticmethod
+    def _observe(call: RequestCall, response: Any) -> None:
+        if is_http_response(response):
+            call.request._observe_rate_limits(call.prepared.params, response.headers)
+
+    @staticmethod
+    def _check_wait(call: RequestCall, wait: float) -> None:
+        if call.deadline is not None and not call.deadline.allows(wait):
+            raise DeadlineExceededError(f"Rate limit wait of {wait:.2f} seconds would run past the "
+                                        f"{call.deadline.seconds:g} second deadline")
+
+    @staticmethod
+    def _failed(call: RequestCall, e: BaseException) -> None:
+        if not call.sent:
+            call.request._refund_admission(call.prepared.params)
+        if isinstance(e, Exception):
+            call.request._observe_rate_limits(call.prepared.params, ErrorParser.get_headers(e))
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        wait = call.request._admission_wait(call.prepared.params)
+        call.sent = False
+        try:
+            if wait > 0:
+                self._check_wait(call, wait)
+                Interruption.sleep(wait)
+            response = next_stage(call)
+        except BaseException as e:
+            self._failed(call, e)
+            raise
+        self._observe(call, response)
+        return response
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        wait = call.request._admission_wait(call.prepared.params)
+        call.sent = False
+        try:
+            if wait > 0:
+                self._check_wait(call, wait)
+                await Interruption.sleep_async(wait)
+            response = await next_stage(call)
+        except BaseException as e:
+            self._failed(call, e)
+            raise
+        self._observe(call, response)
+        return response
+
+
+class SchedulerStage(Middleware):
+    """Waits for a slot in the service/endpoint's RequestSchedulerSgltn lane before each attempt"""
+    name = "scheduler"
+
+    @staticmethod
+    def _ticket_args(call: RequestCall) -> dict:
+        mode = call.request.cFig.lm_request_mode
+        scheduler = call.request.scheduler
+        size = call.request._estimate_tokens(call.prepared.params) if scheduler.shortest_job_first else 0
+        return {"service": mode.name if mode else "",
+                "endpoint": TransportSgltn.base_url(call.url) or call.url,
+                "priority": call.priority,
+                "size": size,
+                "deadline": call.deadline}
+
+    @staticmethod
+    def _feedback(outcome: Any, started: float) -> dict:
+        """What the attempt tells the adaptive limit: overloaded on a 429/503, otherwise a successful call's latency"""
+        if ErrorParser.get_error_code(outcome) in RequestSchedulerSgltn.OVERLOAD_STATUS:
+            return {"overloaded": True}
+        if isinstance(outcome, Exception):
+            return {}
+        return {"latency": time.perf_counter() - started}
+
+    def handle(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        ticket = call.request.scheduler.acquire(**self._ticket_args(call))
+        started = time.perf_counter()
+        feedback = {}
+        pending = None
+        try:
+            response = next_stage(call)
+            feedback = self._feedback(response, started)
+            return response
+        except BaseException as e:
+            if isinstance(e, Exception):
+                feedback = self._feedback(e, started)
+            pending = Interruption.pending(e)
+            raise
+        finally:
+            if pending is None:
+                call.request.scheduler.release(ticket, **feedback)
+            else:
+                # A cancelled attempt that couldn't be aborted keeps the slot until its worker is done,
+                # so the server doesn't get more concurrent work than the lane allows
+                pending.add_done_callback(lambda _: call.request.scheduler.release(ticket))
+
+    async def handle_async(self, call: RequestCall, next_stage: Callable[[RequestCall], Any]) -> Any:
+        ticket = await call.request.scheduler.acquire_async(**self._ticket_args(call))
+        started = time.perf_counter()
+        feedback = {}
+        try:
+            response = await next_stage(call)
+            feedback = self._feedback(response, started)
+            return response
+        except Exception as e:
+            feedback = self._feedback(e, started)
+            raise
+        finally:
+            call.request.scheduler.release(ticket, **feedback)
+
+
+class RequestPipelineSgltn:
+    """
+    Singleton middleware pipeline every request passes through on its way to Request._make_request().
+    Stages always run in the order of STAGES (outermost first), the 'request_pipeline' section of
+    config.json lists the stages used for each RequestMode name with "default" for the rest.
+    'process' is always included.  register_stage() adds a custom Middleware.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    STAGES = (TracingStage, CacheStage, SingleFlightStage, ProcessStage, CircuitBreakerStage, HedgeStage,
+              EndpointPoolStage, MetricsStage, RetryStage, RateLimitStage, SchedulerStage)
+
+    DEFAULT_STAGES = ("cache", "single_flight", "circuit_breaker", "hedge", "endpoint_pool", "metrics", "retry",
+                      "rate_limit", "scheduler")
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self._stages = [stage() for stage in self.STAGES]
+
+        settings = ImportedSgltn().cfig.get_setting('request_pipeline', {})
+        self.settings = settings if isinstance(settings, dict) else {}
+        known = {stage.name for stage in self._stages}
+        for mode_name, names in self.settings.items():
+            unknown = [name for name in names or [] if name not in known]
+            if unknown:
+                self.j_mngr.log_events(f"Unknown request_pipeline stage(s) for {mode_name}: {unknown}",
+                                       TroubleSgltn.Severity.WARNING)
+
+    def register_stage(self, stage: Middleware, before: Optional[str] = None) -> None:
+        """Adds stage to the pipeline ahead of the stage named 'before', or innermost.  List its name in the config to use it."""
+        with self._lock:
+            names = [existing.name for existing in self._stages]
+            position = names.index(before) if before in names else len(self._stages)
+            self._stages.insert(position, stage)
+
+    def stages_for(self, mode: Optional[RequestMode]) -> List[Middleware]:
+        mode_name = mode.name if mode else ""
+        names = self.settings.get(mode_name, self.settings.get("default", self.DEFAULT_STAGES))
+        enabled = set(names or ()) | {"process"}
+        return [stage for stage in self._stages if stage.name in enabled]
+
+    def _chain(self, stages: List[Middleware], terminal: Callable, is_async: bool) -> Callable:
+        handler = terminal
+        for stage in reversed(stages):
+            handler = functools.partial(stage.handle_async if is_async else stage.handle, next_stage=handler)
+        return handler
+
+    def _call_stages(self, call: RequestCall, send_only: bool) -> List[Middleware]:
+        stages = self.stages_for(call.request.cFig.lm_request_mode)
+        if send_only:
+            names = [stage.name for stage in stages]
+            stages = stages[names.index("process") + 1:]
+        return stages
+
+    def run(self, call: RequestCall, send_only: bool = False) -> Any:
+        """
+        Runs the call through the stages for the current RequestMode and returns the processed result.
+        With send_only the stages above 'process' are skipped and the raw response is returned (or raised).
+        """
+        return self._chain(self._call_stages(call, send_only), call.request._attempt, False)(call)
+
+    async def run_async(self, call: RequestCall, send_only: bool = False) -> Any:
+        return await self._chain(self._call_stages(call, send_only), call.request._attempt_async, True)(call)
+
+
+class Request(ABC):
+    """Abstract base class for all request types"""
+
+    class RequestType(Enum):
+        COMPLETION = "completion"
+        POST = "post"
+        IMAGE = "image"
+        ANTHROPIC = "claude"
+        COMPLETION_STREAM = "completion_stream"
+        POST_STREAM = "post_stream"
+        ANTHROPIC_STREAM = "claude_stream"
+
+    # Services whose requests go to cFig.lm_url
+    LM_URL_MODES = frozenset({RequestMode.OPENSOURCE, RequestMode.OLLAMA, RequestMode.GROQ, RequestMode.LMSTUDIO,
+                              RequestMode.OOBABOOGA, RequestMode.OSSIMPLE})
+
+    # Text values returned to the node when a request fails, these are never cached
+    FAILED_RESULTS = frozenset({
+        "Server was unable to process the request",
+        "No valid data was returned",
+    })
+
+    def __init__(self):
+        self.imps = ImportedSgltn()
+        self.utils = request_utils()
+        self.cFig = self.imps.cfig
+        self.mode = RequestMode
+        self.dalle = self.imps.dalle
+        self.j_mngr = json_manager()
+        self.transport = TransportSgltn()
+        self.cache = ResponseCacheSgltn()
+        self.breakers = CircuitBreakerSgltn()
+        self.flights = SingleFlightSgltn()
+        self.limiter = RateLimiterSgltn()
+        self.pool = EndpointPoolSgltn()
+        self.prober = HealthProberSgltn()
+        self.metrics = RequestMetricsSgltn()
+        self.scheduler = RequestSchedulerSgltn()
+        self.hedging = HedgingSgltn()
+        self.tokens = TokenEstimatorSgltn()
+        self.pipeline = RequestPipelineSgltn()
+        self._async_clients = {}
+        
+        # Initialize retry configuration and handler
+        retry_config = RetryConfigFactory.create_config(self.cFig.lm_request_mode)
+        self.retry_handler = RetryHandler(retry_config, self.j_mngr)
+
+    def _build_retry_handler(self, **kwargs) -> RetryHandler:
+        """Build a retry handler with optional override from kwargs"""
+        # Get base configuration
+        retry_config = RetryConfigFactory.create_config(self.cFig.lm_request_mode)
+        
+        # Override max_retries if provided in kwargs otherwise use default
+        if 'tries' in kwargs and kwargs['tries']:
+            tries = kwargs['tries']
+            if isinstance(tries, str) and tries != "default":
+                retry_config.max_retries = int(tries)
+
+        # Optional time budget in seconds for the whole request, all attempts and waits included
+        deadline = Deadline.from_seconds(kwargs.get('deadline'))
+               
+        return RetryHandler(retry_config, self.j_mngr, deadline=deadline)
+
+    def _initialize_retry_handler(self, **kwargs):
+        """Initialize retry handler with optional override from kwargs"""
+        self.retry_handler = self._build_retry_handler(**kwargs)
+
+    # (connect, read) timeouts in seconds for the web (POST) requests
+    POST_TIMEOUT = (12, 120)
+
+    @classmethod
+    def _post_timeout(cls, timeout: Optional[float]) -> tuple:
+        if timeout is None:
+            return cls.POST_TIMEOUT
+        return tuple(min(limit, timeout) for limit in cls.POST_TIMEOUT)
+
+    @staticmethod
+    def _timeout_option(timeout: Optional[float]) -> dict:
+        """The SDKs and httpx read timeout=None as 'no timeout', so it's only passed when there's a deadline"""
+        return {} if timeout is None else {'timeout': timeout}
+
+    def _make_request(self, request_type: RequestType, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Unified request method handling different request types.
+        timeout is the request's remaining time budget in seconds, the clients' defaults apply if it's None.
+        """
+        if request_type == self.RequestType.COMPLETION:
+            client, params = args
+            raw_response = client.chat.completions.with_raw_response.create(**params, **self._timeout_option(timeout))
+            self._observe_rate_limits(params, raw_response.headers)
+            return self._parse_raw(raw_response)
+        
+        elif request_type == self.RequestType.ANTHROPIC:
+            client, params = args
+            raw_response = client.messages.with_raw_response.create(**params, **self._timeout_option(timeout))
+            self._observe_rate_limits(params, raw_response.headers)
+            return self._parse_raw(raw_response)
+        
+        elif request_type == self.RequestType.POST:
+            url, headers, payload = args
+            return HttpEnvelope(self.transport.session.post(url, headers=payload.headers(headers), data=payload.data,
+                                                            timeout=self._post_timeout(timeout)))
+        
+        elif request_type == self.RequestType.IMAGE:
+            client, params = args
+            return client.images.generate(**params, **self._timeout_option(timeout))
+
+        elif request_type == self.RequestType.COMPLETION_STREAM:
+            client, params, relay = args
+            return self._stream_completion(client, params, relay, timeout)
+
+        elif request_type == self.RequestType.ANTHROPIC_STREAM:
+            client, params, relay = args
+            return self._stream_anthropic(client, params, relay, timeout)
+
+        elif request_type == self.RequestType.POST_STREAM:
+            url, headers, payload, relay = args
+            return self._stream_post(url, headers, payload, relay, timeout)
+        
+        else:
+            raise ValueError(f"Unsupported request type: {request_type}")        
+
+    def _enable_streaming(self, prepared: PreparedRequest, node_id: Any = None) -> None:
+        """Switches a prepared request to its streaming variant, if it has one"""
+        stream_types = {
+            self.RequestType.COMPLETION: self.RequestType.COMPLETION_STREAM,
+            self.RequestType.ANTHROPIC: self.RequestType.ANTHROPIC_STREAM,
+            self.RequestType.POST: self.RequestType.POST_STREAM,
+        }
+        stream_type = stream_types.get(prepared.request_type)
+        if stream_type is None:
+            return
+
+        prepared.request_type = stream_type
+        prepared.relay = StreamRelay(node_id)
+        if stream_type != self.RequestType.ANTHROPIC_STREAM:
+            prepared.params = {**prepared.params, "stream": True}
+            if self.cFig.lm_request_mode == self.mode.OPENAI:
+                # Only OpenAI reliably accepts stream_options, others may reject the request
+                prepared.params["stream_options"] = {"include_usage": True}
+        self.j_mngr.log_events("Streaming response", is_trouble=True)
+
+    def _stream_completion(self, client: Any, params: dict, relay: StreamRelay,
+                           timeout: Optional[float] = None) -> StreamedResponse:
+        relay.reset(timeout)
+        model = None
+        usage = None
+        raw_response = client.chat.completions.with_raw_response.create(**params, **self._timeout_option(timeout))
+        self._observe_rate_limits(params, raw_response.headers)
+        for chunk in raw_response.parse():
+            model = getattr(chunk, 'model', None) or model
+            usage = getattr(chunk, 'usage', None) or usage
+            if chunk.choices:
+                relay.add(chunk.choices[0].delta.content)
+        relay.finish()
+        self._log_stream_stats(relay, usage)
+        return StreamedResponse(relay.text, model, usage)
+
+    def _stream_anthropic(self, client: Any, params: dict, relay: StreamRelay, timeout: Optional[float] = None) -> Any:
+        relay.reset(timeout)
+        with client.messages.stream(**params, **self._timeout_option(timeout)) as stream:
+            self._observe_rate_limits(params, getattr(getattr(stream, 'response', None), 'headers', None))
+            for text in stream.text_stream:
+                relay.add(text)
+            message = stream.get_final_message()
+        relay.finish()
+        self._log_stream_stats(relay, getattr(message, 'usage', None))
+        return message
+
+    def _stream_post(self, url: str, headers: dict, payload: JsonPayload, relay: StreamRelay,
+                     timeout: Optional[float] = None) -> Any:
+        """
+        Sends a request with 'stream': True and reads the reply, Server-Sent Events from OpenAI compatible
+        servers or newline delimited JSON from Ollama's native API.
+        Error statuses, and servers that ignore 'stream' and answer with plain JSON, are handed back as the
+        raw response so the normal handling applies.
+        """
+        relay.reset(timeout)
+        response = self.transport.session.post(url, headers=payload.headers(headers), data=payload.data,
+                                               timeout=self._post_timeout(timeout), stream=True)
+        self._observe_rate_limits(payload.params, response.headers)
+        content_type = response.headers.get('Content-Type', '')
+        is_sse = 'text/event-stream' in content_type
+        if not 200 <= response.status_code < 300 or not (is_sse or 'ndjson' in content_type):
+            _ = response.content  # Read the body so the connection goes back to the pool
+            return HttpEnvelope(response)
+
+        model = None
+        usage = None
+        response.encoding = response.encoding or 'utf-8'
+        with response:
+            for event in self._stream_events(response, is_sse):
+                if 'error' in event:
+                    relay.finish()
+                    return StreamedResponse(relay.text, model, usage, error=event['error'])
+                model = event.get('model') or model
+                usage = event.get('usage') or self._native_usage(event) or usage
+                choices = event.get('choices') or []
+                if choices:
+                    delta = choices[0].get('delta') or {}
+                    relay.add(delta.get('content'))
+                elif isinstance(event.get('message'), dict):  # Ollama
+                    relay.add(event['message'].get('content'))
+
+        relay.finish()
+        self._log_stream_stats(relay, usage)
+        return StreamedResponse(relay.text, model, usage)
+
+    @staticmethod
+    def _stream_events(response: Any, is_sse: bool) -> Any:
+        """Yields the JSON events of a streamed reply, either Server-Sent Events or newline delimited JSON"""
+        # chunk_size=None yields each chunk as it arrives instead of waiting to fill a buffer
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line:
+                continue
+            if is_sse:
+                if not line.startswith('data:'):
+                    continue
+                line = line[len('data:'):].strip()
+                if line == '[DONE]':
+                    return
+            try:
+                event = decode_json(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict):
+                yield event
+
+    @staticmethod
+    def _native_usage(data: dict) -> Optional[dict]:
+        """Usage data in OpenAI's format from a final Ollama native reply, None for other replies"""
+        if not isinstance(data, dict) or 'eval_count' not in data:
+            return None
+        return {"prompt_tokens": data.get('prompt_eval_count', 0), "completion_tokens": data['eval_count']}
+
+    @staticmethod
+    def _usage_value(usage: Any, names: Tuple[str, ...]) -> Optional[int]:
+        if not usage:
+            return None
+        for name in names:
+            value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+            if isinstance(value, int):
+                return value
+        return None
+
+    @staticmethod
+    def _completion_tokens(usage: Any) -> Optional[int]:
+        """Output token count from OpenAI, Anthropic or plain JSON usage data"""
+        return Request._usage_value(usage, ('completion_tokens', 'output_tokens'))
+
+    @staticmethod
+    def _prompt_tokens(usage: Any) -> Optional[int]:
+        """Input token count from OpenAI, Anthropic or plain JSON usage data"""
+        return Request._usage_value(usage, ('prompt_tokens', 'input_tokens'))
+
+    @staticmethod
+    def _note_call(ttfb: Optional[float] = None, response_bytes: Optional[int] = None) -> None:
+        """Notes details of the call in progress for the metrics registry"""
+        stats = _CALL_STATS.get()
+        if stats is None:
+            return
+        if ttfb is not None:
+            stats['ttfb'] = ttfb
+        if response_bytes is not None:
+            stats['response_bytes'] = response_bytes
+
+    def _parse_raw(self, raw_response: Any) -> Any:
+        """Parses an SDK raw response, noting its size"""
+        parsed = raw_response.parse()
+        try:
+            self._note_call(response_bytes=len(raw_response.http_response.content))
+        except Exception:
+            pass
+        return parsed
+
+    def _response_usage(self, response: Any) -> Any:
+        if is_http_response(response):
+            if not 200 <= response.status_code < 300:
+                return None
+            try:
+                response_json = response.json()
+                return response_json.get('usage') or self._native_usage(response_json)
+            except (ValueError, AttributeError):
+                return None
+        return getattr(response, 'usage', None)
+
+    @contextlib.contextmanager
+    def _measured(self, prepared: PreparedRequest, url: str = ""):
+        """
+        Records a request sent inside the with block (all attempts) in the metrics registry.
+        The block sets stats['response'] to the final response, an exception is recorded as a failure.
+        """
+        stats = {'attempts': 0, 'ttfb': None, 'response_bytes': 0, 'response': None}
+        token = _CALL_STATS.set(stats)
+        started = time.perf_counter()
+        error = None
+        cancelled = False
+        try:
+            yield stats
+        except BaseException as e:
+            # A cancelled call (the losing copy of a hedged request, or a run cancelled in ComfyUI) isn't an
+            # outcome of the service
+            cancelled = isinstance(e, asyncio.CancelledError) or Interruption.is_interruption(e)
+            error = e.__class__.__name__
+            raise
+        finally:
+            _CALL_STATS.reset(token)
+            if not cancelled:
+                self._record_metrics(prepared, url, time.perf_counter() - started, stats, error)
+
+    def _record_metrics(self, prepared: PreparedRequest, url: str, latency: float, stats: dict,
+                        error: Optional[str]) -> None:
+        try:
+            usage = self._response_usage(stats['response']) if stats['response'] is not None else None
+            service, model = self._rate_limit_key(prepared.params)
+            self.metrics.record(
+                service, model, TransportSgltn.base_url(url) or url,
+                latency=latency,
+                ttfb=stats['ttfb'],
+                retries=stats['attempts'] - 1,
+                error=error,
+                prompt_tokens=self._prompt_tokens(usage),
+                completion_tokens=self._completion_tokens(usage),
+                request_bytes=len(prepared.payload),
+                response_bytes=stats['response_bytes']
+            )
+        except Exception as e:
+            self.j_mngr.log_events(f"Unable to record request metrics: {e}", TroubleSgltn.Severity.INFO)
+
+    def _log_stream_stats(self, relay: StreamRelay, usage: Any) -> None:
+        self._note_call(ttfb=relay.ttft, response_bytes=len(relay.text.encode('utf-8')))
+        ttft = relay.ttft
+        tps = relay.tokens_per_second(self._completion_tokens(usage))
+        ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+        tps_text = f"{tps:.1f}" if tps is not None else "n/a"
+        self.j_mngr.log_events(
+            f"Streamed response: time to first token {ttft_text}, {tps_text} tokens/sec",
+            is_trouble=True
+        )
 
-    def _make_request(self, request_type: RequestType, *args) -> Any:
-        """Unified request method handling different request types"""
+    async def _make_request_async(self, request_type: RequestType, *args, timeout: Optional[float] = None) -> Any:
+        """Async counterpart of _make_request(), expects the SDKs' async clients"""
         if request_type == self.RequestType.COMPLETION:
             client, params = args
-            return client.chat.completions.create(**params)
-        
+            raw_response = await client.chat.completions.with_raw_response.create(**params,
+                                                                                  **self._timeout_option(timeout))
+            self._observe_rate_limits(params, raw_response.headers)
+            return self._parse_raw(raw_response)
+
         elif request_type == self.RequestType.ANTHROPIC:
             client, params = args
-            return client.messages.create(**params)
-        
+            raw_response = await client.messages.with_raw_response.create(**params, **self._timeout_option(timeout))
+            self._observe_rate_limits(params, raw_response.headers)
+            return self._parse_raw(raw_response)
+
         elif request_type == self.RequestType.POST:
-            url, headers, params = args
-            return requests.post(url, headers=headers, json=params, timeout=(12, 120))
-        
+            url, headers, payload = args
+            return HttpEnvelope(await self._get_http_client().post(url, headers=payload.headers(headers),
+                                                                   content=payload.data,
+                                                                   **self._timeout_option(timeout)))
+
         elif request_type == self.RequestType.IMAGE:
             client, params = args
-            return client.images.generate(**params)
-        
+            return await client.images.generate(**params, **self._timeout_option(timeout))
+
         else:
-            raise ValueError(f"Unsupported request type: {request_type}")        
+            raise ValueError(f"Unsupported request type: {request_type}")
+
+    def _rate_limit_key(self, params: dict) -> Tuple[str, str]:
+        mode = self.cFig.lm_request_mode
+        return (mode.name if mode else ""), str(params.get('model', ''))
+
+    def _estimate_tokens(self, params: dict) -> int:
+        """Estimated token count of a request: the input plus the output allowance"""
+        messages = params.get('messages')
+        model = str(params.get('model') or "")
+        input_tokens = self.tokens.count_messages(messages if isinstance(messages, list) else [], model,
+                                                  params.get('system', ""))
+        return input_tokens + self.tokens.output_tokens(params)
+
+    def _fit_context(self, prepared: PreparedRequest) -> PreparedRequest:
+        """Trims the oldest example turns of a request that's over its model's context budget"""
+        messages = prepared.params.get('messages')
+        if prepared.result is not None or not self.tokens.enabled or not isinstance(messages, list):
+            return prepared
+        model = prepared.params.get('model')
+        tokens, budget, actions = self.tokens.fit(prepared.params)
+        if not budget:
+            return prepared
+        if actions:
+            self.j_mngr.log_events(f"Request was over the {budget} token input budget of {model}: "
+                                   f"{'; '.join(actions)}",
+                                   TroubleSgltn.Severity.WARNING,
+                                   True)
+        if tokens > budget:
+            self.j_mngr.log_events(f"Estimated input of {tokens} tokens is over the {budget} token budget of {model}, "
+                                   "the service may reject the request",
+                                   TroubleSgltn.Severity.WARNING,
+                                   True)
+        else:
+            self.j_mngr.log_events(f"Estimated input: {tokens} of {budget} tokens available to {model}",
+                                   is_trouble=True)
+        return prepared
+
+    def _admission_wait(self, params: dict) -> float:
+        """Reserves capacity for one call with the rate limiter, returns the seconds to wait before sending it"""
+        service, model = self._rate_limit_key(params)
+        wait = self.limiter.reserve(service, model, self._estimate_tokens(params))
+        if wait > 0:
+            self.j_mngr.log_events(f"Rate limit for {service} {model}: waiting {wait:.2f} seconds before sending.",
+                                   TroubleSgltn.Severity.INFO,
+                                   True)
+        return wait
+
+    def _refund_admission(self, params: dict) -> None:
+        """Gives back the capacity _admission_wait() reserved for a call that was never sent"""
+        self.limiter.refund(*self._rate_limit_key(params), self._estimate_tokens(params))
+
+    def _observe_rate_limits(self, params: dict, headers: Any) -> None:
+        if headers:
+            self.limiter.observe(*self._rate_limit_key(params), headers)
+
+    @staticmethod
+    def _count_attempt() -> None:
+        stats = _CALL_STATS.get()
+        if stats is not None:
+            stats['attempts'] += 1
+
+    def _note_http_response(self, response: Any) -> None:
+        """requests' elapsed is the time until the response headers arrived, httpx's the full response time"""
+        elapsed = getattr(response, 'elapsed', None)
+        self._note_call(ttfb=elapsed.total_seconds() if elapsed is not None else None,
+                        response_bytes=len(response.content))
+
+    @abstractmethod
+    def _prepare_request(self, **kwargs) -> PreparedRequest:
+        """Builds the client/url, headers and params for a call"""
 
     @abstractmethod
+    def _process_response(self, response: Any) -> Any:
+        """Turns a successful raw response into the value returned to the node"""
+
+    def _handle_request_error(self, e: Exception) -> Any:
+        """Value returned to the node when the request raised after all retries"""
+        self.j_mngr.log_events(
+            f"Request failed: {str(e)}",
+            TroubleSgltn.Severity.ERROR,
+            True
+        )
+        return "Server was unable to process the request"
+
+    def _cache_key(self, prepared: PreparedRequest, **kwargs) -> Optional[str]:
+        """
+        Cache key for a prepared request, or None if the cache shouldn't be used for it.
+        The key covers the service, endpoint and the full params dict, plus the node's seed
+        so a user can force a fresh generation by changing the seed.
+        """
+        if not self.cache.enabled or kwargs.get('bypass_cache', False):
+            return None
+        return self._request_key(prepared, **kwargs)
+
+    def _flight_key(self, prepared: PreparedRequest, **kwargs) -> Optional[str]:
+        """
+        Key used to coalesce identical concurrent requests, or None if this request must be sent
+        on its own.  Bypass_Cache asks for a fresh generation, so it opts out of sharing too.
+        """
+        if kwargs.get('bypass_cache', False):
+            return None
+        return self._request_key(prepared, **kwargs)
+
+    def _request_key(self, prepared: PreparedRequest, **kwargs) -> str:
+        """Canonical hash identifying a prepared request"""
+        mode = self.cFig.lm_request_mode
+        return ResponseCacheSgltn.make_key(
+            self.__class__.__name__,
+            mode.name if mode else "",
+            self._endpoint(prepared),
+            prepared.params,
+            kwargs.get('seed')
+        )
+
+    def _endpoint(self, prepared: PreparedRequest) -> str:
+        """The url a prepared request is sent to, empty for OpenAI's own service"""
+        if prepared.endpoints:
+            return ",".join(sorted(prepared.endpoints))
+        return prepared.url or (self.cFig.lm_url if self.cFig.lm_request_mode in self.LM_URL_MODES else "")
+
+    def _get_breaker(self, prepared: PreparedRequest) -> Optional[Any]:
+        mode = self.cFig.lm_request_mode
+        return self.breakers.get(mode.name if mode else "", self._endpoint(prepared))
+
+    def _circuit_open_result(self, breaker: Any) -> str:
+        """Value returned to the node when the breaker refuses a request"""
+        self.j_mngr.log_events(
+            f"Request not sent, circuit breaker for {breaker.name} is {breaker.state.value}. "
+            f"Next attempt allowed in {breaker.retry_in:.0f} seconds.",
+            TroubleSgltn.Severity.WARNING,
+            True
+        )
+        return "Server was unable to process the request"
+
+    @staticmethod
+    def _is_inconclusive(e: Optional[BaseException]) -> bool:
+        """
+        A call that was cancelled (by the user, a hedge or the event loop) or ran out of its own deadline
+        says nothing about the endpoint, whether it had answered yet or not.
+        """
+        return e is not None and (not isinstance(e, Exception) or Interruption.is_interruption(e)
+                                  or isinstance(e, DeadlineExceededError))
+
+    @classmethod
+    def _is_endpoint_failure(cls, e: BaseException, retry_handler: RetryHandler) -> bool:
+        """
+        Only connection errors, timeouts and retryable (rate limit/server) errors count as endpoint
+        failures, an error like a bad key means the endpoint itself is up.  Neither does a cancelled call
+        or running out of the request's own deadline.
+        """
+        if cls._is_inconclusive(e):
+            return False
+        return isinstance(e, RetryExhaustedError) or retry_handler.should_retry(e)
+
+    def _record_outcome(self, breaker: Any, retry_handler: RetryHandler, e: Optional[BaseException] = None,
+                        url: str = "") -> None:
+        """
+        Reports a finished call to the endpoint's breaker and the health table.  An inconclusive call
+        records nothing, it only frees the breaker's half-open probe slot for the next request.
+        """
+        if self._is_inconclusive(e):
+            if breaker is not None:
+                breaker.release_probe()
+            return
+        failed = e is not None and self._is_endpoint_failure(e, retry_handler)
+        if url:
+            self.prober.record(url, not failed)
+        if breaker is None:
+            return
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _bind_endpoint(self, prepared: PreparedRequest, url: str, is_async: bool = False) -> None:
+        """Points a pooled request at one endpoint, subclasses using SDK clients swap the client"""
+        prepared.url = url
+
+    def _pool_breaker(self, url: str) -> Optional[Any]:
+        mode = self.cFig.lm_request_mode
+        return self.breakers.get(mode.name if mode else "", url)
+
+    def _pool_candidates(self, prepared: PreparedRequest, tried: List[str]) -> Optional[str]:
+        remaining = [url for url in prepared.endpoints if url not in tried]
+
+        def _is_healthy(url: str) -> bool:
+            self.prober.watch(url)
+            if self.prober.is_healthy(url) is False:
+                return False
+            breaker = self._pool_breaker(url)
+            return breaker is None or not breaker.is_open
+        return self.pool.choose(remaining, _is_healthy)
+
+    def _log_failover(self, url: str, e: Exception) -> None:
+        self.j_mngr.log_events(f"Endpoint {url} failed ({e.__class__.__name__}), trying the next endpoint in the pool.",
+                               TroubleSgltn.Severity.WARNING,
+                               True)
+
+    def _cached_result(self, cache_key: Optional[str]) -> Optional[Any]:
+        if not cache_key:
+            return None
+        value, tier = self.cache.get(cache_key)
+        if value is not None:
+            self.j_mngr.log_events(f"Response served from the {tier} cache, no request was sent.",
+                                   is_trouble=True)
+        return value
+
+    @staticmethod
+    def _is_cacheable(result: Any) -> bool:
+        """Only successful text results are cached, error messages returned to the node are not"""
+        return isinstance(result, str) and bool(result) and result not in Request.FAILED_RESULTS
+
+    def _store_result(self, cache_key: Optional[str], result: Any) -> None:
+        if cache_key and self._is_cacheable(result):
+            self.cache.put(cache_key, result)
+
+    def _batch_service(self) -> Optional[str]:
+        """The BatchJobSgltn service ('openai' or 'anthropic') this request type can be batched on, None if there isn't one"""
+        return None
+
+    def submit_batch(self, kwargs_list: List[dict]) -> Optional[str]:
+        """
+        Prepares one request per kwargs dict (same format as request_completion()) and submits them
+        all as a single offline batch job.
+
+        Returns:
+            str: The batch job id to collect the results with, None if the job couldn't be submitted
+        """
+        service = self._batch_service()
+        if service is None:
+            self.j_mngr.log_events("Batch jobs are only available for the ChatGPT and Anthropic services",
+                                   TroubleSgltn.Severity.ERROR,
+                                   True)
+            return None
+        prepared_list = [self._fit_context(self._prepare_request(**kwargs)) for kwargs in kwargs_list]
+        return BatchJobSgltn().submit(service, prepared_list)
+
     def request_completion(self, **kwargs) -> Any:
-        pass
+        """Execute completion request through the request pipeline"""
+        self._initialize_retry_handler(**kwargs)
+        prepared = self._fit_context(self._prepare_request(**kwargs))
+        if prepared.result is not None:
+            return prepared.result
+
+        return self.pipeline.run(RequestCall(self, prepared, self.retry_handler, kwargs))
+
+    def _attempt(self, call: RequestCall) -> Any:
+        """Innermost pipeline stage: a single call to _make_request()"""
+        call.sent = True
+        self._count_attempt()
+        response = Interruption.call(self._make_request, call.prepared.request_type,
+                                     *call.prepared.request_args(call.async_client), abort=self.transport.abort,
+                                     timeout=self._attempt_timeout(call))
+        if is_http_response(response):
+            self._note_http_response(response)
+        return response
+
+    @staticmethod
+    def _attempt_timeout(call: RequestCall) -> Optional[float]:
+        """The call's remaining time budget, None without a deadline (the clients' own timeouts apply)"""
+        return call.deadline.check() if call.deadline is not None else None
+
+    async def _attempt_async(self, call: RequestCall) -> Any:
+        call.sent = True
+        self._count_attempt()
+        response = await self._make_request_async(call.prepared.request_type,
+                                                  *call.prepared.request_args(call.async_client),
+                                                  timeout=self._attempt_timeout(call))
+        if is_http_response(response):
+            self._note_http_response(response)
+        return response
+
+    def _get_async_client(self) -> Optional[Any]:
+        """
+        Returns the SDK async client for this request type, or None if the subclass has no
+        native async path.  Clients are cached until aclose() is called.
+        """
+        return None
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Returns the pooled async http client used for POST requests"""
+        client = self._async_clients.get('http')
+        if client is None:
+            pool_size = int(self.transport.settings.get('pool_maxsize', 16))
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(120.0, connect=12.0),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+            self._async_clients['http'] = client
+        return client
+
+    async def aclose(self) -> None:
+        """Closes any async clients created by this request object"""
+        clients = list(self._async_clients.values())
+        self._async_clients = {}
+        for client in clients:
+            try:
+                close = getattr(client, 'aclose', None) or getattr(client, 'close', None)
+                if close:
+                    await close()
+            except Exception as e:
+                self.j_mngr.log_events(f"Unable to close async client: {e}",
+                                       TroubleSgltn.Severity.INFO)
+
+    async def request_completion_async(self, **kwargs) -> Any:
+        """
+        Async counterpart of request_completion().  Uses the SDKs' async clients (or an async http
+        client for POST requests) so many requests can be in flight on one event loop.
+        Request types without a native async client fall back to running the sync path in a thread.
+        Responses are not streamed on this path.
+        """
+        retry_handler = self._build_retry_handler(**kwargs)
+        prepared = self._fit_context(self._prepare_request(**kwargs))
+        if prepared.result is not None:
+            return prepared.result
+
+        async_client = None
+        if prepared.request_type != self.RequestType.POST:
+            async_client = self._get_async_client()
+            if async_client is None:
+                return await asyncio.to_thread(self.request_completion, **{**kwargs, 'stream': False})
+
+        return await self.pipeline.run_async(RequestCall(self, prepared, retry_handler, kwargs, async_client))
 
     def _process_image(self, image: Optional[Union[str, torch.Tensor]]) -> Optional[str]:
         """Common image processing logic"""
@@ -479,13 +4202,34 @@ class Request(ABC):
                 True
             )
 
+    def _process_web_response(self, response: Any) -> str:
+        """Common response handling for the OpenAI compatible web (POST) requests"""
+        if response.status_code in range(200, 300):
+            response_json = response.json()
+            if response_json and 'error' not in response_json:
+                self._log_completion_metrics(response_json, "json")
+                return self.utils.clean_response_text(
+                    response_json['choices'][0]['message']['content']
+                )
+
+            error_message = response_json.get('error', 'Unknown error')
+            self.j_mngr.log_events(
+                f"Server error in response: {error_message}",
+                TroubleSgltn.Severity.ERROR,
+                True
+            )
+            return "Server was unable to process the request"
+
+        self.j_mngr.log_events(
+            f"Server error status: {response.status_code}: {response.text}",
+            TroubleSgltn.Severity.ERROR,
+            True
+        )
+        return "Server was unable to process the request"
+
 class oai_object_request(Request):
     """Concrete class for OpenAI API object-based requests"""
     
-    # def _make_completion_request(self, client, params):
-    #     """Wrapped completion request for retry handling"""
-    #     return client.chat.completions.create(**params)
-
     def _get_client(self) -> Optional[Any]:
         """Get appropriate client based on request type"""
         request_type = self.cFig.lm_request_mode
@@ -531,8 +4275,26 @@ class oai_object_request(Request):
 
         return client
 
-    def request_completion(self, **kwargs) -> str:
-        """Execute completion request with retry handling"""
+    def _get_async_client(self) -> Optional[Any]:
+        """Async OpenAI client matching the client returned by _get_client()"""
+        request_type = self.cFig.lm_request_mode
+        if request_type == self.mode.OPENAI:
+            cache_key = ('openai', None)
+        else:
+            cache_key = ('openai', self.cFig.lm_url)
+
+        client = self._async_clients.get(cache_key)
+        if client is None:
+            if request_type == self.mode.OPENAI:
+                client = openai.AsyncOpenAI(api_key=self.cFig.key)
+            elif request_type == self.mode.GROQ:
+                client = openai.AsyncOpenAI(base_url=self.cFig.lm_url, api_key=self.cFig.groq_key or "No key necessary")
+            else:
+                client = openai.AsyncOpenAI(base_url=self.cFig.lm_url, api_key=self.cFig.lm_key or "No key necessary")
+            self._async_clients[cache_key] = client
+        return client
+
+    def _prepare_request(self, **kwargs) -> PreparedRequest:
         GPTmodel = kwargs.get('model')
         creative_latitude = kwargs.get('creative_latitude', 0.7)
         tokens = kwargs.get('tokens', 500)
@@ -543,12 +4305,10 @@ class oai_object_request(Request):
         example_list = kwargs.get('example_list', [])
         add_params = kwargs.get('add_params', None)
 
-        CGPT_response = ""
         client = self._get_client()
-        self._initialize_retry_handler(**kwargs)
 
         if not client:
-            return "Unable to process request, client initialization failed"
+            return PreparedRequest(result="Unable to process request, client initialization failed")
 
         # Process image if present
         image = self._process_image(image)
@@ -561,7 +4321,7 @@ class oai_object_request(Request):
 
         # Handle empty input case
         if not any([prompt, image, instruction, example_list]):
-            return "Photograph of a stained empty box with 'NOTHING' printed on its side in bold letters"
+            return PreparedRequest(result="Photograph of a stained empty box with 'NOTHING' printed on its side in bold letters")
 
         # Prepare request parameters
         params = {
@@ -574,43 +4334,58 @@ class oai_object_request(Request):
         if add_params:
             self.j_mngr.append_params(params, add_params, ['param', 'value'])
 
-        try:
-            response = self.retry_handler.execute_with_retry(
-                self._make_request,
-                self.RequestType.COMPLETION,
-                client,
-                params
-            )  #_make_request is passed as a wrapped function, the arguments that follow are passed into
-               #args which is unpacked as a tuple in _make_request()
-
-            if response and response.choices and 'error' not in response:
-                self._log_completion_metrics(response)
-                CGPT_response = self.utils.clean_response_text(
-                    response.choices[0].message.content
-                )
-            else:
-                err_mess = getattr(response, 'error', "Error message missing")
-                self.j_mngr.log_events(
-                    f"Server was unable to process this request. Error: {err_mess}",
-                    TroubleSgltn.Severity.ERROR,
-                    True
-                )
-                CGPT_response = "Server was unable to process the request"
-
-        except Exception as e:
-            self.j_mngr.log_events(
-                f"Request failed: {str(e)}",
-                TroubleSgltn.Severity.ERROR,
-                True
+        # Several local servers in LLM_URL are used as a load balanced pool
+        endpoints = []
+        if self.cFig.lm_request_mode in (self.mode.OPENSOURCE, self.mode.OLLAMA):
+            endpoints = self.utils.split_urls(kwargs.get('url', ""))
+        if len(endpoints) < 2:
+            endpoints = None
+
+        return PreparedRequest(self.RequestType.COMPLETION, params, client=client, endpoints=endpoints)
+
+    def _batch_service(self) -> Optional[str]:
+        return "openai" if self.cFig.lm_request_mode == self.mode.OPENAI else None
+
+    def _bind_endpoint(self, prepared: PreparedRequest, url: str, is_async: bool = False) -> None:
+        """Swaps in the OpenAI client for one endpoint of the pool"""
+        api_key = self.cFig.lm_key or "No key necessary"
+        if is_async:
+            cache_key = ('openai', url)
+            client = self._async_clients.get(cache_key)
+            if client is None:
+                client = openai.AsyncOpenAI(base_url=url, api_key=api_key)
+                self._async_clients[cache_key] = client
+        else:
+            mode = self.cFig.lm_request_mode
+            client = ClientPoolSgltn().get(url, api_key, mode.name if mode else "")
+        prepared.client = client
+
+    def _process_response(self, response: Any) -> str:
+        if response and response.choices and 'error' not in response:
+            self._log_completion_metrics(response)
+            return self.utils.clean_response_text(
+                response.choices[0].message.content
             )
-            CGPT_response = "Server was unable to process the request"
 
-        return CGPT_response
+        err_mess = getattr(response, 'error', "Error message missing")
+        self.j_mngr.log_events(
+            f"Server was unable to process this request. Error: {err_mess}",
+            TroubleSgltn.Severity.ERROR,
+            True
+        )
+        return "Server was unable to process the request"
 
 class claude_request(Request):
     """Concrete class for Claude/Anthropic API requests"""
-    
-    def request_completion(self, **kwargs) -> str:
+
+    def _get_async_client(self) -> Optional[Any]:
+        client = self._async_clients.get('anthropic')
+        if client is None:
+            client = anthropic.AsyncAnthropic(api_key=self.cFig.anthropic_key)
+            self._async_clients['anthropic'] = client
+        return client
+
+    def _prepare_request(self, **kwargs) -> PreparedRequest:
         claude_model = kwargs.get('model')
         creative_latitude = kwargs.get('creative_latitude', 0.7)
         tokens = kwargs.get('tokens', 500)
@@ -620,9 +4395,7 @@ class claude_request(Request):
         example_list = kwargs.get('example_list', [])
         add_params = kwargs.get('add_params', None)
 
-        claude_response = ""
         client = self.cFig.anthropic_client
-        self._initialize_retry_handler(**kwargs)
 
         if not client:
             self.j_mngr.log_events(
@@ -630,7 +4403,7 @@ class claude_request(Request):
                 TroubleSgltn.Severity.ERROR,
                 True
             )
-            return "Invalid or missing Anthropic API key"
+            return PreparedRequest(result="Invalid or missing Anthropic API key")
 
         # Process image if present
         image = self._process_image(image)
@@ -640,7 +4413,7 @@ class claude_request(Request):
 
         # Handle empty input case
         if not any([prompt, image, instruction, example_list]):
-            return "Empty request, no input provided"
+            return PreparedRequest(result="Empty request, no input provided")
 
         # Prepare request parameters
         params = {
@@ -654,50 +4427,46 @@ class claude_request(Request):
         if add_params:
             self.j_mngr.append_params(params, add_params, ['param', 'value'])
 
-        try:
-            response = self.retry_handler.execute_with_retry(
-                self._make_request,
-                self.RequestType.ANTHROPIC,
-                client,
-                params
-            )
+        return PreparedRequest(self.RequestType.ANTHROPIC, params, client=client)
 
-            if response and 'error' not in response:
-                self._log_completion_metrics(response)
-                try:
-                    claude_response = response.content[0].text
-                    claude_response = self.utils.clean_response_text(claude_response)
-                except (IndexError, AttributeError):
-                    claude_response = "No valid data was returned"
-                    self.j_mngr.log_events(
-                        "Claude response was not valid data",
-                        TroubleSgltn.Severity.WARNING,
-                        True
-                    )
-            else:
-                claude_response = "Server was unable to process the request"
+    def _batch_service(self) -> Optional[str]:
+        return "anthropic"
+
+    def _process_response(self, response: Any) -> str:
+        if response and 'error' not in response:
+            self._log_completion_metrics(response)
+            try:
+                claude_response = response.content[0].text
+                return self.utils.clean_response_text(claude_response)
+            except (IndexError, AttributeError):
                 self.j_mngr.log_events(
-                    'Server was unable to process this request.',
-                    TroubleSgltn.Severity.ERROR,
+                    "Claude response was not valid data",
+                    TroubleSgltn.Severity.WARNING,
                     True
                 )
+                return "No valid data was returned"
 
-        except Exception as e:
-            error_msg = self.utils.parse_anthropic_error(e)
-            self.j_mngr.log_events(
-                f"Request failed: {error_msg}",
-                TroubleSgltn.Severity.ERROR,
-                True
-            )
-            claude_response = "Server was unable to process the request"
+        self.j_mngr.log_events(
+            'Server was unable to process this request.',
+            TroubleSgltn.Severity.ERROR,
+            True
+        )
+        return "Server was unable to process the request"
 
-        return claude_response
+    def _handle_request_error(self, e: Exception) -> str:
+        error_msg = self.utils.parse_anthropic_error(e)
+        self.j_mngr.log_events(
+            f"Request failed: {error_msg}",
+            TroubleSgltn.Severity.ERROR,
+            True
+        )
+        return "Server was unable to process the request"
     
 
 class oai_web_request(Request):
     """Concrete class for OpenAI-compatible web requests"""
 
-    def request_completion(self, **kwargs) -> str:
+    def _prepare_request(self, **kwargs) -> PreparedRequest:
         GPTmodel = kwargs.get('model', "")
         creative_latitude = kwargs.get('creative_latitude', 0.7)
         url = kwargs.get('url', None)
@@ -708,13 +4477,16 @@ class oai_web_request(Request):
         example_list = kwargs.get('example_list', [])
         add_params = kwargs.get('add_params', None)
 
-        CGPT_response = ""
         request_type = self.cFig.lm_request_mode
-        self._initialize_retry_handler(**kwargs)
+
+        # Several urls are used as a load balanced pool
+        endpoints = self.utils.split_urls(url)
+        if endpoints:
+            url = endpoints[0]
 
         # URL setup and validation
         self.cFig.lm_url = url
-        if not self.cFig.is_lm_server_up:
+        if not self.cFig.is_lm_server_up():
             self.j_mngr.log_events(
                 "Local or remote server is not responding, may be unable to send data.",
                 TroubleSgltn.Severity.WARNING,
@@ -763,47 +4535,11 @@ class oai_web_request(Request):
         if add_params:
             self.j_mngr.append_params(params, add_params, ['param', 'value'])
 
-        try:
-            response = self.retry_handler.execute_with_retry(
-                self._make_request,
-                self.RequestType.POST,
-                url,
-                headers,
-                params
-            )
-
-            if response.status_code in range(200, 300):
-                response_json = response.json()
-                if response_json and 'error' not in response_json:
-                    CGPT_response = self.utils.clean_response_text(
-                        response_json['choices'][0]['message']['content']
-                    )
-                    self._log_completion_metrics(response_json, "json")
-                else:
-                    error_message = response_json.get('error', 'Unknown error')
-                    self.j_mngr.log_events(
-                        f"Server error in response: {error_message}",
-                        TroubleSgltn.Severity.ERROR,
-                        True
-                    )
-                    CGPT_response = "Server was unable to process the request"
-            else:
-                self.j_mngr.log_events(
-                    f"Server error status: {response.status_code}: {response.text}",
-                    TroubleSgltn.Severity.ERROR,
-                    True
-                )
-                CGPT_response = "Server was unable to process the request"
-
-        except Exception as e:
-            self.j_mngr.log_events(
-                f"Request failed: {str(e)}",
-                TroubleSgltn.Severity.ERROR,
-                True
-            )
-            CGPT_response = "Server was unable to process the request"
+        return PreparedRequest(self.RequestType.POST, params, url=url, headers=headers,
+                               endpoints=endpoints if len(endpoints) > 1 else None)
 
-        return CGPT_response
+    def _process_response(self, response: Any) -> str:
+        return self._process_web_response(response)
 
     def _get_key_for_request_type(self, request_type: RequestMode) -> str:
         """Get appropriate key based on request type"""
@@ -818,7 +4554,7 @@ class oai_web_request(Request):
 class ooba_web_request(Request):
     """Concrete class for Oobabooga web requests"""
 
-    def request_completion(self, **kwargs) -> str:
+    def _prepare_request(self, **kwargs) -> PreparedRequest:
         GPTmodel = kwargs.get('model', "")
         creative_latitude = kwargs.get('creative_latitude', 0.7)
         url = kwargs.get('url', None)
@@ -828,15 +4564,14 @@ class ooba_web_request(Request):
         example_list = kwargs.get('example_list', [])
         add_params = kwargs.get('add_params', None)
 
-        CGPT_response = ""
         request_type = self.cFig.lm_request_mode
-        self._initialize_retry_handler(**kwargs)
 
-        # URL setup and validation
-        url = self.utils.validate_and_correct_url(url)
+        # URL setup and validation, several urls are used as a load balanced pool
+        endpoints = [self.utils.validate_and_correct_url(endpoint) for endpoint in self.utils.split_urls(url)]
+        url = endpoints[0] if endpoints else self.utils.validate_and_correct_url(url)
         self.cFig.lm_url = url
 
-        if not self.cFig.is_lm_server_up:
+        if not self.cFig.is_lm_server_up():
             self.j_mngr.log_events(
                 "Local server is not responding, may be unable to send data.",
                 TroubleSgltn.Severity.WARNING,
@@ -872,152 +4607,343 @@ class ooba_web_request(Request):
         if add_params:
             self.j_mngr.append_params(params, add_params, ['param', 'value'])
 
+        return PreparedRequest(self.RequestType.POST, params, url=url, headers=headers,
+                               endpoints=endpoints if len(endpoints) > 1 else None)
+
+    def _process_response(self, response: Any) -> str:
+        return self._process_web_response(response)
+
+class dall_e_request(Request):
+    """Concrete class for DALL-E image generation requests"""
+
+    def __init__(self):
+        super().__init__()
+        self.trbl = TroubleSgltn()
+        self.iu = ImageUtils()
+        # Override with DALL-E specific retry config
+        retry_config = RetryConfigFactory.create_config(self.cFig.lm_request_mode)
+        self.retry_handler = RetryHandler(retry_config, self.j_mngr)
+
+    def _get_async_client(self) -> Optional[Any]:
+        client = self._async_clients.get('openai')
+        if client is None:
+            client = openai.AsyncOpenAI(api_key=self.cFig.key)
+            self._async_clients['openai'] = client
+        return client
+
+    # Largest n each model accepts in one images.generate call, models not listed take n=1
+    MAX_IMAGES_PER_REQUEST = {
+        "dall-e-2": 10,
+        "gpt-image-1": 10
+    }
+
+    # gpt-image models always return b64 and reject 'style' and 'response_format', their quality levels differ
+    GPT_IMAGE_QUALITY = {"hd": "high", "standard": "medium"}
+
+    @classmethod
+    def _build_params(cls, **kwargs) -> dict:
+        model = kwargs.get('model')
+        params = {
+            "model": model,
+            "prompt": kwargs.get('prompt'),
+            "size": kwargs.get('image_size'),
+            "quality": kwargs.get('image_quality'),
+            "n": 1
+        }
+        if str(model or "").startswith("dall-e"):
+            params["style"] = kwargs.get('style')
+            params["response_format"] = "b64_json"
+        else:
+            params["quality"] = cls.GPT_IMAGE_QUALITY.get(params["quality"], params["quality"])
+        return params
+
+    def _prepare_request(self, **kwargs) -> PreparedRequest:
+        """The batch's image call before it's split by _plan_batch()"""
+        return PreparedRequest(self.RequestType.IMAGE, self._build_params(**kwargs), client=self.cFig.openaiClient)
+
+    def _process_response(self, response: Any) -> Any:
+        """Image responses are decoded into the batch tensor by _collect_images()"""
+        return response
+
+    def _plan_batch(self, params: dict, batch_size: int) -> List[Tuple[dict, List[int]]]:
+        """
+        Splits a batch into API calls: models that accept n > 1 get as few calls as possible,
+        others one call per image.  Returns (params, batch indices the call fills) pairs.
+        """
+        per_request = max(1, int(self.MAX_IMAGES_PER_REQUEST.get(params.get('model'), 1)))
+        plan = []
+        for first in range(0, batch_size, per_request):
+            indices = list(range(first, min(first + per_request, batch_size)))
+            plan.append(({**params, "n": len(indices)}, indices))
+        return plan
+
+    def _max_concurrency(self) -> int:
+        settings = self.cFig.get_setting('dalle_batch', {})
+        if not isinstance(settings, dict):
+            settings = {}
+        return max(1, int(settings.get('max_concurrency', 4)))
+
+    @staticmethod
+    def _image_shape(size: Optional[str]) -> Optional[Tuple[int, int]]:
+        """(height, width) from a size string like '1792x1024' (width x height), None for e.g. 'auto'"""
         try:
-            response = self.retry_handler.execute_with_retry(
-                self._make_request,
-                self.RequestType.POST,
-                url,
-                headers,
-                params
+            width, height = (int(value) for value in str(size).lower().split('x'))
+            return height, width
+        except ValueError:
+            return None
+
+    def _first_image_shape(self, outcomes: list) -> Tuple[int, int]:
+        """(height, width) of the first image returned, for sizes the request doesn't spell out"""
+        for response in outcomes:
+            if isinstance(response, Exception) or not response or 'error' in response:
+                continue
+            for item in response.data or []:
+                if getattr(item, 'b64_json', None):
+                    try:
+                        return self.iu.b64_image_shape(item.b64_json)
+                    except Exception:  # pylint: disable=broad-except
+                        continue  # Reported as a failed image by _collect_images()
+        return 1024, 1024
+
+    def _start_batch(self, **kwargs) -> bool:
+        """Common setup and validation, returns False if the batch can't be run"""
+        self.trbl.set_process_header('Dall-e Request')
+
+        if not self.cFig.openaiClient:
+            self.j_mngr.log_events(
+                "OpenAI API key is missing or invalid. Key must be stored in an environment variable.",
+                TroubleSgltn.Severity.WARNING,
+                True
             )
+            self.trbl.pop_header()
+            return False
 
-            if response.status_code in range(200, 300):
-                response_json = response.json()
-                if response_json and 'error' not in response_json:
-                    CGPT_response = self.utils.clean_response_text(
-                        response_json['choices'][0]['message']['content']
-                    )
-                    self._log_completion_metrics(response_json, "json")
-                else:
-                    error_message = response_json.get('error', 'Unknown error')
-                    self.j_mngr.log_events(
-                        f"Server error in response: {error_message}",
-                        TroubleSgltn.Severity.ERROR,
-                        True
-                    )
-            else:
-                CGPT_response = "Server was unable to process the request"
+        self.j_mngr.log_events(
+            f"Talking to Dalle model: {kwargs.get('model')}",
+            is_trouble=True
+        )
+        return True
+
+    def _collect_images(self, outcomes: list, plan: List[Tuple[dict, List[int]]],
+                        batch_size: int, image_size: Optional[str]) -> Tuple[torch.Tensor, str]:
+        """
+        Decodes the per call outcomes (a response or the exception it raised) straight into a
+        preallocated [batch_size, H, W, 3] tensor.  Items that failed stay black so the batch keeps its
+        size and order, the failed item numbers are reported in the trouble log.
+        """
+        height, width = self._image_shape(image_size) or self._first_image_shape(outcomes)
+        batched_images = torch.zeros(batch_size, height, width, 3, dtype=torch.float32)
+        revised_prompt = "Image and mask could not be created"
+        have_rev_prompt = False
+        failures = {}
+
+        for (_, indices), response in zip(plan, outcomes):
+            if isinstance(response, Exception):
+                for index in indices:
+                    failures[index] = str(response)
+                continue
+
+            if not response or 'error' in response:
+                for index in indices:
+                    failures[index] = str(getattr(response, 'error', "No valid data was returned"))
+                continue
+
+            items = list(response.data or [])
+            for position, index in enumerate(indices):
+                if position >= len(items) or not items[position].b64_json:
+                    failures[index] = "No image data was returned"
+                    continue
+                item = items[position]
+                try:
+                    if not self.iu.b64_into_tensor(item.b64_json, batched_images[index]):
+                        failures[index] = "Unexpected image size"
+                        continue
+                except Exception as e:
+                    failures[index] = f"Unable to decode image: {e}"
+                    continue
+                if not have_rev_prompt and getattr(item, 'revised_prompt', None):
+                    revised_prompt = item.revised_prompt
+                    have_rev_prompt = True
+
+        succeeded = batch_size - len(failures)
+        if failures:
+            for index in sorted(failures):
                 self.j_mngr.log_events(
-                    f"Server error status: {response.status_code}: {response.text}",
+                    f"Failed to generate image {index + 1}/{batch_size}: {failures[index]}",
                     TroubleSgltn.Severity.ERROR,
                     True
                 )
-
-        except Exception as e:
+            failed_items = ", ".join(str(index + 1) for index in sorted(failures))
             self.j_mngr.log_events(
-                f"Request failed: {str(e)}",
-                TroubleSgltn.Severity.ERROR,
+                f"{succeeded} of {batch_size} images were created, item(s) {failed_items} failed and are left blank in the batch.",
+                TroubleSgltn.Severity.WARNING,
                 True
             )
-            CGPT_response = "Server was unable to process the request"
+        else:
+            self.j_mngr.log_events(
+                f'{succeeded} images were processed successfully in your batch of: {batch_size}',
+                is_trouble=True
+            )
+
+        self.trbl.pop_header()
+        return batched_images, revised_prompt
+
+    def request_completion(self, **kwargs) -> Tuple[torch.Tensor, str]:
+        """Submits the batch's API calls concurrently, up to the 'dalle_batch' max_concurrency setting"""
+        batch_size = kwargs.get('batch_size', 1)
+        self._initialize_retry_handler(**kwargs)
+
+        if not self._start_batch(**kwargs):
+            return torch.zeros(1, 1024, 1024, 3, dtype=torch.float32), "Image and mask could not be created"
 
-        return CGPT_response
+        batch = self._prepare_request(**kwargs)
+        plan = self._plan_batch(batch.params, batch_size)
 
-class dall_e_request(Request):
-    """Concrete class for DALL-E image generation requests"""
+        def _generate(params: dict) -> Any:
+            prepared = PreparedRequest(self.RequestType.IMAGE, params, client=batch.client)
+            return self.pipeline.run(RequestCall(self, prepared, self.retry_handler), send_only=True)
 
-    def __init__(self):
-        super().__init__()
-        self.trbl = TroubleSgltn()
-        self.iu = ImageUtils()
-        # Override with DALL-E specific retry config
-        retry_config = RetryConfigFactory.create_config(self.cFig.lm_request_mode)
-        self.retry_handler = RetryHandler(retry_config, self.j_mngr)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self._max_concurrency(), len(plan))) as executor:
+            futures = [executor.submit(_generate, params) for params, _ in plan]
+            outcomes = [future.exception() or future.result() for future in futures]
 
+        Interruption.check()  # Cancelled images aren't failures to report
+        return self._collect_images(outcomes, plan, batch_size, kwargs.get('image_size'))
 
-    def request_completion(self, **kwargs) -> Tuple[torch.Tensor, str]:
-        GPTmodel = kwargs.get('model')
-        prompt = kwargs.get('prompt')
-        image_size = kwargs.get('image_size')
-        image_quality = kwargs.get('image_quality')
-        style = kwargs.get('style')
+    async def request_completion_async(self, **kwargs) -> Tuple[torch.Tensor, str]:
+        """Async counterpart of request_completion()"""
         batch_size = kwargs.get('batch_size', 1)
+        retry_handler = self._build_retry_handler(**kwargs)
 
-        self.trbl.set_process_header('Dall-e Request')
-        batched_images = torch.zeros(1, 1024, 1024, 3, dtype=torch.float32)
-        revised_prompt = "Image and mask could not be created"
+        if not self._start_batch(**kwargs):
+            return torch.zeros(1, 1024, 1024, 3, dtype=torch.float32), "Image and mask could not be created"
 
-        client = self.cFig.openaiClient
-        self._initialize_retry_handler(**kwargs)
+        client = self._get_async_client()
+        plan = self._plan_batch(self._prepare_request(**kwargs).params, batch_size)
+        semaphore = asyncio.Semaphore(self._max_concurrency())
 
-        if not client:
-            self.j_mngr.log_events(
-                "OpenAI API key is missing or invalid. Key must be stored in an environment variable.",
-                TroubleSgltn.Severity.WARNING,
-                True
-            )
-            return batched_images, revised_prompt
+        async def _generate(params: dict) -> Any:
+            async with semaphore:
+                prepared = PreparedRequest(self.RequestType.IMAGE, params)
+                return await self.pipeline.run_async(RequestCall(self, prepared, retry_handler, async_client=client),
+                                                     send_only=True)
 
-        self.j_mngr.log_events(
-            f"Talking to Dalle model: {GPTmodel}",
-            is_trouble=True
-        )
+        outcomes = await asyncio.gather(*(_generate(params) for params, _ in plan), return_exceptions=True)
 
-        images_list = []
-        have_rev_prompt = False
+        return self._collect_images(list(outcomes), plan, batch_size, kwargs.get('image_size'))
 
-        for _ in range(batch_size):
-            params = {
-                "model": GPTmodel,
-                "prompt": prompt,
-                "size": image_size,
-                "quality": image_quality,
-                "style": style,
-                "n": 1,
-                "response_format": "b64_json"
-            }
 
-            try:
-                response = self.retry_handler.execute_with_retry(
-                    self._make_request,
-                    self.RequestType.IMAGE,
-                    client,
-                    params
-                )
+class ollama_chat_request(Request):
+    """
+    Concrete class for Ollama's native /api/chat endpoint.  Unlike Ollama's OpenAI compatible endpoint it
+    takes the model's keep_alive, its 'options' (e.g. num_ctx, num_predict) and images as plain base64.
+    """
 
-                if response and 'error' not in response:
-                    if not have_rev_prompt:
-                        revised_prompt = response.data[0].revised_prompt
-                        have_rev_prompt = True
+    # Add_Parameter names Ollama expects under 'options' instead of at the top level of the request
+    OPTION_NAMES = frozenset({
+        "num_ctx", "num_predict", "num_keep", "num_batch", "num_gpu", "num_thread", "seed", "temperature",
+        "top_k", "top_p", "min_p", "typical_p", "tfs_z", "repeat_last_n", "repeat_penalty", "presence_penalty",
+        "frequency_penalty", "mirostat", "mirostat_tau", "mirostat_eta", "stop"
+    })
 
-                    b64Json = response.data[0].b64_json
-                    if b64Json:
-                        png_image, _ = self.dalle.b64_to_tensor(b64Json)
-                        images_list.append(png_image)
-                    else:
-                        self.j_mngr.log_events(
-                            f"Dalle-e could not process an image in your batch of: {batch_size}",
-                            TroubleSgltn.Severity.WARNING,
-                            True
-                        )
+    def _prepare_request(self, **kwargs) -> PreparedRequest:
+        model = kwargs.get('model', "")
+        url = kwargs.get('url', None)
+        creative_latitude = kwargs.get('creative_latitude', 0.7)
+        tokens = kwargs.get('tokens', 500)
+        prompt = kwargs.get('prompt', None)
+        instruction = kwargs.get('instruction', "")
+        example_list = kwargs.get('example_list', [])
+        add_params = kwargs.get('add_params', None)
+        num_ctx = kwargs.get('num_ctx', None)
 
-            except Exception as e:
-                self.j_mngr.log_events(
-                    f"Failed to generate image {_ + 1}/{batch_size}: {str(e)}",
-                    TroubleSgltn.Severity.ERROR,
-                    True
-                )
+        # Several urls are used as a load balanced pool
+        endpoints = [self.utils.validate_and_correct_url(endpoint, '/api/chat')
+                     for endpoint in self.utils.split_urls(url)]
+        if not endpoints:
+            self.j_mngr.log_events("No URL provided for the Ollama server.",
+                                   TroubleSgltn.Severity.WARNING,
+                                   True)
+            return PreparedRequest(result="Server was unable to process the request")
 
-        if images_list:
-            count = len(images_list)
-            self.j_mngr.log_events(
-                f'{count} images were processed successfully in your batch of: {batch_size}',
-                is_trouble=True
-            )
-            batched_images = torch.cat(images_list, dim=0)
-        else:
+        image = self._process_image(kwargs.get('image', None))
+        messages = self.utils.build_data_ollama(prompt, example_list, instruction, image)
+        if not messages:
+            return PreparedRequest(result="Empty request, no input provided")
+
+        options = {
+            "temperature": creative_latitude,
+            "num_predict": tokens
+        }
+        if num_ctx:
+            options["num_ctx"] = int(num_ctx)
+
+        params = {
+            "model": model,
+            "messages": messages,
+            "stream": False,  # Ollama streams unless told otherwise
+            "options": options
+        }
+
+        keep_alive = ollama_unload_request.keep_alive_value(kwargs.get('keep_alive'))
+        if keep_alive is not None:
+            params["keep_alive"] = keep_alive
+
+        if add_params:
+            added = {}
+            self.j_mngr.append_params(added, add_params, ['param', 'value'])
+            for name, value in added.items():
+                if name in self.OPTION_NAMES:
+                    options[name] = value
+                else:
+                    params[name] = value
+
+        return PreparedRequest(self.RequestType.POST, params, url=endpoints[0], headers=self.utils.build_web_header(),
+                               endpoints=endpoints if len(endpoints) > 1 else None)
+
+    def _process_response(self, response: Any) -> str:
+        if not is_http_response(response):
+            # A streamed reply, reassembled in the OpenAI format
+            return self._process_web_response(response)
+
+        if response.status_code in range(200, 300):
+            response_json = response.json()
+            if isinstance(response_json, dict) and 'error' not in response_json \
+                    and isinstance(response_json.get('message'), dict):
+                self._log_load_time(response_json)
+                self._log_completion_metrics({"model": response_json.get('model'),
+                                              "usage": self._native_usage(response_json)}, "json")
+                return self.utils.clean_response_text(response_json['message'].get('content', ""))
+
+            error_message = response_json.get('error', 'Unknown error') if isinstance(response_json, dict) \
+                else 'Unknown error'
             self.j_mngr.log_events(
-                f'No images were processed in your batch of: {batch_size}',
-                TroubleSgltn.Severity.WARNING,
-                is_trouble=True
+                f"Server error in response: {error_message}",
+                TroubleSgltn.Severity.ERROR,
+                True
             )
+            return "Server was unable to process the request"
 
-        self.trbl.pop_header()
-        return batched_images, revised_prompt
+        self.j_mngr.log_events(
+            f"Server error status: {response.status_code}: {response.text}",
+            TroubleSgltn.Severity.ERROR,
+            True
+        )
+        return "Server was unable to process the request"
+
+    def _log_load_time(self, response_json: dict) -> None:
+        """Ollama reports how long loading the model took, a cold start shows up here"""
+        load_duration = response_json.get('load_duration')
+        if isinstance(load_duration, (int, float)):
+            self.j_mngr.log_events(f"Ollama model load time: {load_duration / 1e9:.2f} seconds",
+                                   is_trouble=True)
 
 
 class ollama_unload_request(Request):
-    """Concrete class for model unload requests"""
+    """
+    Sets how long Ollama keeps a model in memory: unloads it, keeps it loaded indefinitely, or with
+    preload() loads it ahead of the first real job so that job doesn't pay for the model's cold start.
+    """
 
     class ModelTTL(Enum):
         KILL = 0
@@ -1028,15 +4954,22 @@ class ollama_unload_request(Request):
         super().__init__()
         self.trbl = TroubleSgltn()
 
+    @classmethod
+    def keep_alive_value(cls, keep_alive: Any) -> Any:
+        """
+        The keep_alive value sent to Ollama for a ModelTTL, or a value in Ollama's own format
+        (seconds or a duration like "10m").  None means Ollama's default applies.
+        """
+        if isinstance(keep_alive, cls.ModelTTL):
+            return None if keep_alive == cls.ModelTTL.NOSET else keep_alive.value
+        if keep_alive is None or keep_alive == "":
+            return None
+        return keep_alive
+
     def request_completion(self, **kwargs) -> bool:
 
         model = kwargs.get('model')
         url = kwargs.get('url', None)
-        tokens = kwargs.get('tokens', 500)
-        prompt = kwargs.get('prompt', None)
-        instruction = kwargs.get('instruction', "")
-        example_list = kwargs.get('example_list', [])
-        add_params = kwargs.get('add_params', None)
 
         req_mode = self.cFig.lm_request_mode
 
@@ -1051,83 +4984,483 @@ class ollama_unload_request(Request):
         if keep_alive == self.ModelTTL.NOSET: #Don't change the current TTL setting
             return True
         
-        self.trbl.set_process_header("Ollama Unload Model Setting")
-        
         if req_mode not in {RequestMode.OLLAMA, RequestMode.OPENSOURCE}:
             self.j_mngr.log_events("Model Unloading does not work with this AI Service type.",
                                    TroubleSgltn.Severity.WARNING,
                                    True)
             return False        
 
-        
+        self.trbl.set_process_header("Ollama Unload Model Setting")
+        try:
+            return self._load(model, url, keep_alive.value, kwargs)
+        finally:
+            self.trbl.pop_header()
 
-        if not model:
-            self.j_mngr.log_events("No model specified for unload", 
+    def preload(self, model: str, url: str, keep_alive: Any = None, **kwargs) -> bool:
+        """
+        Loads the model into Ollama's memory before the first real job.
+        keep_alive is how long it stays loaded afterwards (see keep_alive_value()), None for Ollama's default.
+        Returns True if the model is loaded.
+        """
+        self.trbl.set_process_header("Ollama Model Preload")
+        try:
+            return self._load(model, url, self.keep_alive_value(keep_alive), kwargs)
+        finally:
+            self.trbl.pop_header()
+
+    def _prepare_request(self, **kwargs) -> PreparedRequest:
+        """A generate request without a prompt to Ollama's native endpoint, only the first server of a pool is used"""
+        base_url = self.utils.validate_and_correct_url(self.utils.split_urls(kwargs.get('url'))[0], '/api/generate')
+        params = {"model": kwargs.get('model')}
+        if kwargs.get('keep_alive') is not None:
+            params["keep_alive"] = kwargs['keep_alive']
+        return PreparedRequest(self.RequestType.POST, params, url=base_url, headers=self.utils.build_web_header())
+
+    def _process_response(self, response: Any) -> Any:
+        """The raw response is checked by _load()"""
+        return response
+
+    def _load(self, model: str, url: str, keep_alive: Any, kwargs: dict) -> bool:
+        """
+        Sends a generate request without a prompt.  Ollama then only loads the model, or unloads it
+        if keep_alive is 0, and sets how long it stays in memory.  kwargs are the request kwargs, e.g. 'tries'.
+        """
+        if not model or model == "none":
+            self.j_mngr.log_events("No Ollama model specified to load or unload.", 
                                     TroubleSgltn.Severity.WARNING,
                                     True)
             return False
 
-        # replace the URL path with Ollama's native endpoint
-        base_url = self.utils.validate_and_correct_url(url, '/api/generate')
-        headers = self.utils.build_web_header()
+        if not url:
+            self.j_mngr.log_events("No URL provided for the Ollama server.",
+                                   TroubleSgltn.Severity.WARNING,
+                                   True)
+            return False
+
+        self._initialize_retry_handler(**kwargs)
+        prepared = self._prepare_request(model=model, url=url, keep_alive=keep_alive)
+        action = "unload" if keep_alive == 0 else "load"
+        try:
+            response = self.pipeline.run(RequestCall(self, prepared, self.retry_handler, kwargs), send_only=True)
+        except Exception as e:
+            self.j_mngr.log_events(f"Model {action} request failed: {e.__class__.__name__}: {str(e)}", 
+                                    TroubleSgltn.Severity.WARNING, 
+                                    True)
+            return False
+
+        if response.status_code in range(200, 300):
+            try:
+                response_json = response.json()
+            except ValueError:
+                response_json = {}
+            load_duration = response_json.get('load_duration') if isinstance(response_json, dict) else None
+            took = f" in {load_duration / 1e9:.2f} seconds" if isinstance(load_duration, (int, float)) else ""
+            keep_text = f", keep alive: {keep_alive}" if keep_alive is not None and action == "load" else ""
+            self.j_mngr.log_events(f"Ollama model {model} {action}ed{took}{keep_text}",
+                                   TroubleSgltn.Severity.INFO,
+                                   True)
+            return True
+
+        self.j_mngr.log_events(f"Model {action} failed with status: {response.status_code}, Response: {response.text}", 
+                            TroubleSgltn.Severity.WARNING,
+                            True)
+        return False
+
+class BatchClient(ABC):
+    """
+    Submits prepared request params to a provider's batch API and collects the replies.
+    Subclasses are built by BatchJobSgltn with (api_key, base_url), a different client class
+    can be registered with BatchJobSgltn().register_client(), e.g. one for a local test server.
+    """
 
-        messages = self.utils.build_data_multi(prompt, instruction, example_list, image)
+    @abstractmethod
+    def submit(self, items: List[Tuple[str, dict]]) -> str:
+        """Submits (custom_id, params) pairs, returns the provider's batch id"""
 
-        params = {
-            "model": model,
-            "messages": messages,
-            "temperature": creative_latitude,
-            "max_tokens": tokens,
-            "keep_alive": keep_alive.value
-        }
+    @abstractmethod
+    def poll(self, remote_id: str) -> Tuple[str, bool]:
+        """Returns (status, finished) for the batch"""
 
-        if add_params:
-            self.j_mngr.append_params(params, add_params, ['param', 'value'])
+    @abstractmethod
+    def results(self, remote_id: str) -> dict:
+        """Returns {custom_id: (text, error)} for a finished batch"""
+
+    @abstractmethod
+    def cancel(self, remote_id: str) -> None:
+        pass
+
+
+class OpenAIBatchClient(BatchClient):
+    """OpenAI batch API: the requests are uploaded as a JSONL file, results are downloaded the same way"""
+
+    ENDPOINT = "/v1/chat/completions"
+    FINISHED = frozenset({"completed", "failed", "expired", "cancelled"})
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, completion_window: str = "24h"):
+        self.api_key = api_key
+        self.base_url = base_url or ""
+        self.completion_window = completion_window
+
+    @property
+    def client(self) -> Any:
+        # Fetched from the pool on each use, the pool closes clients that sit idle between polls
+        return ClientPoolSgltn().get(self.base_url, self.api_key, "OPENAI_BATCH")
+
+    def submit(self, items: List[Tuple[str, dict]]) -> str:
+        lines = [json.dumps({"custom_id": custom_id, "method": "POST", "url": self.ENDPOINT, "body": params},
+                            ensure_ascii=False, default=str)
+                 for custom_id, params in items]
+        upload = self.client.files.create(file=("plush_batch.jsonl", "\n".join(lines).encode('utf-8')),
+                                          purpose="batch")
+        batch = self.client.batches.create(input_file_id=upload.id, endpoint=self.ENDPOINT,
+                                           completion_window=self.completion_window)
+        return batch.id
+
+    def poll(self, remote_id: str) -> Tuple[str, bool]:
+        batch = self.client.batches.retrieve(remote_id)
+        return batch.status, batch.status in self.FINISHED
+
+    def results(self, remote_id: str) -> dict:
+        batch = self.client.batches.retrieve(remote_id)
+        replies = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    replies[entry.get('custom_id')] = self._parse_line(entry)
+        return replies
+
+    @staticmethod
+    def _parse_line(entry: dict) -> Tuple[Optional[str], Optional[str]]:
+        response = entry.get('response') or {}
+        body = response.get('body') or {}
+        if entry.get('error'):
+            return None, str(entry['error'].get('message', entry['error']))
+        if response.get('status_code') != 200:
+            error = body.get('error') or {}
+            return None, str(error.get('message', f"HTTP status {response.get('status_code')}"))
+        try:
+            return body['choices'][0]['message']['content'], None
+        except (KeyError, IndexError, TypeError):
+            return None, "Reply contained no message"
+
+    def cancel(self, remote_id: str) -> None:
+        self.client.batches.cancel(remote_id)
+
+
+class AnthropicBatchClient(BatchClient):
+    """Anthropic Message Batches API"""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, completion_window: str = "24h"):
+        self.client = anthropic.Anthropic(api_key=api_key, base_url=base_url or None)
+
+    def submit(self, items: List[Tuple[str, dict]]) -> str:
+        batch = self.client.messages.batches.create(
+            requests=[{"custom_id": custom_id, "params": params} for custom_id, params in items]
+        )
+        return batch.id
+
+    def poll(self, remote_id: str) -> Tuple[str, bool]:
+        batch = self.client.messages.batches.retrieve(remote_id)
+        return batch.processing_status, batch.processing_status == "ended"
+
+    def results(self, remote_id: str) -> dict:
+        replies = {}
+        for entry in self.client.messages.batches.results(remote_id):
+            result = entry.result
+            if result.type == "succeeded":
+                try:
+                    replies[entry.custom_id] = (result.message.content[0].text, None)
+                except (IndexError, AttributeError):
+                    replies[entry.custom_id] = (None, "Reply contained no message")
+            else:
+                error = getattr(getattr(result, 'error', None), 'error', None)
+                replies[entry.custom_id] = (None, getattr(error, 'message', None) or result.type)
+        return replies
+
+    def cancel(self, remote_id: str) -> None:
+        self.client.messages.batches.cancel(remote_id)
+
+
+class BatchJobSgltn:
+    """
+    Singleton that runs offline batch jobs against the OpenAI and Anthropic batch APIs.
+    Jobs and their requests are kept in a SQLite file in the Plush 'cache' directory, a daemon
+    thread polls unfinished jobs and stores the replies against the request that produced them.
+    Unfinished jobs are picked up again after a ComfyUI restart.  Settings come from the
+    'batch_jobs' section of config.json.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    DEFAULTS = {
+        "poll_interval": 60,
+        "completion_window": "24h",
+        "keep_days": 30,
+        "openai_base_url": "",
+        "anthropic_base_url": ""
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
 
+    def __init__(self):
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self.settings = dict(self.DEFAULTS)
+        self._factories = {"openai": OpenAIBatchClient, "anthropic": AnthropicBatchClient}
+        self._clients = {}
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._thread = None
+        self._wake = threading.Event()
+        self._open_db()
+
+    def configure(self, settings: Optional[dict]) -> None:
+        """Applies the 'batch_jobs' config section, then resumes polling any unfinished jobs"""
+        if isinstance(settings, dict):
+            self.settings.update({k: v for k, v in settings.items() if k in self.DEFAULTS})
+        self._clients.clear()
+        self._purge()
+        if self._unfinished():
+            self._start()
+
+    def register_client(self, service: str, factory: Callable[..., BatchClient]) -> None:
+        """Replaces the BatchClient class used for service ('openai' or 'anthropic')"""
+        self._factories[service] = factory
+        self._clients.pop(service, None)
+
+    def _open_db(self) -> None:
+        cache_dir = self.j_mngr.find_child_directory(self.j_mngr.script_dir, 'cache', True)
+        if not cache_dir:
+            self.j_mngr.log_events("Unable to create the cache directory, batch jobs are unavailable",
+                                   TroubleSgltn.Severity.WARNING)
+            return
         try:
-            response = self.retry_handler.execute_with_retry(
-                self._make_request,
-                self.RequestType.POST,
-                base_url,
-                headers,
-                params
+            db_path = self.j_mngr.append_filename_to_path(cache_dir, 'batch_jobs.db')
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, service TEXT NOT NULL, remote_id TEXT, status TEXT NOT NULL, "
+                "finished INTEGER NOT NULL DEFAULT 0, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                "job_id TEXT NOT NULL, position INTEGER NOT NULL, custom_id TEXT NOT NULL, params TEXT, "
+                "result TEXT, error TEXT, PRIMARY KEY (job_id, position))"
             )
+        except sqlite3.Error as e:
+            self._db = None
+            self.j_mngr.log_events(f"Unable to open the batch jobs database, batch jobs are unavailable: {e}",
+                                   TroubleSgltn.Severity.WARNING)
+
+    def _execute(self, sql: str, args: tuple = ()) -> list:
+        with self._db_lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def _client(self, service: str) -> Optional[BatchClient]:
+        client = self._clients.get(service)
+        if client is not None:
+            return client
+        cfig = ImportedSgltn().cfig
+        api_key = cfig.key if service == "openai" else cfig.anthropic_key
+        factory = self._factories.get(service)
+        if factory is None or not api_key:
+            self.j_mngr.log_events(f"No API key or batch client available for the '{service}' batch service",
+                                   TroubleSgltn.Severity.ERROR,
+                                   True)
+            return None
+        client = factory(api_key, self.settings.get(f"{service}_base_url") or None,
+                         completion_window=self.settings['completion_window'])
+        self._clients[service] = client
+        return client
 
-            if response.status_code in range(200, 300):
-                response_json = response.json()
-                if response_json and 'error' not in response_json:
-                    CGPT_response = self.utils.clean_response_text(
-                        response_json['choices'][0]['message']['content']
-                    )
-                    self._log_completion_metrics(response_json, "json")
-                else:
-                    error_message = response_json.get('error', 'Unknown error')
-                    self.j_mngr.log_events(
-                        f"Server error in response: {error_message}",
-                        TroubleSgltn.Severity.ERROR,
-                        True
-                    )
-                    CGPT_response = "Server was unable to process the request"
+    def submit(self, service: str, prepared_list: List[PreparedRequest]) -> Optional[str]:
+        """
+        Submits prepared requests as one batch job.  Requests that were short-circuited while being
+        prepared (PreparedRequest.result is set) keep that result and aren't sent.
+
+        Returns:
+            str: The local job id used with status() and results(), None if the job couldn't be submitted
+        """
+        if self._db is None or not prepared_list:
+            return None
+        client = self._client(service)
+        if client is None:
+            return None
 
+        job_id = f"{service}-{int(time.time())}-{random.getrandbits(32):08x}"
+        now = time.time()
+        rows, items = [], []
+        for position, prepared in enumerate(prepared_list):
+            custom_id = f"plush-{position}"
+            if prepared.result is not None:
+                rows.append((job_id, position, custom_id, None, str(prepared.result), None))
             else:
-                self.j_mngr.log_events(
-                    f"Server error status: {response.status_code}: {response.text}",
-                    TroubleSgltn.Severity.ERROR,
-                    True
-                )
-                CGPT_response = "Server was unable to process the request"
+                rows.append((job_id, position, custom_id, json.dumps(prepared.params, default=str), None, None))
+                items.append((custom_id, prepared.params))
 
-        except requests.RequestException as e:
-            self.j_mngr.log_events(f"Model unload request failed: {e.__class__.__name__}: {str(e)}", 
-                                    TroubleSgltn.Severity.WARNING, 
-                                    True)
+        remote_id, status, error = None, "completed", None
+        if items:
+            try:
+                remote_id = client.submit(items)
+                status = "submitted"
+            except Exception as e:
+                status, error = "failed", str(e)
+                self.j_mngr.log_events(f"Batch job submission to {service} failed: {e}",
+                                       TroubleSgltn.Severity.ERROR,
+                                       True)
+
+        with self._db_lock:
+            self._db.execute("INSERT INTO jobs (id, service, remote_id, status, finished, error, created, updated) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (job_id, service, remote_id, status, int(status != "submitted"), error, now, now))
+            self._db.executemany("INSERT INTO items (job_id, position, custom_id, params, result, error) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+        if status == "failed":
+            return None
+        self.j_mngr.log_events(f"Batch job {job_id}: {len(items)} of {len(rows)} requests sent to {service} "
+                               f"(batch id: {remote_id})",
+                               is_trouble=True)
+        if remote_id:
+            self._start()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Job state and item counts, None for an unknown job id"""
+        if self._db is None:
+            return None
+        job = self._execute("SELECT service, remote_id, status, finished, error, created FROM jobs WHERE id = ?",
+                            (job_id,))
+        if not job:
+            return None
+        service, remote_id, status, finished, error, created = job[0]
+        total, answered, failed = self._execute(
+            "SELECT COUNT(*), COUNT(result), COUNT(error) FROM items WHERE job_id = ?", (job_id,))[0]
+        return {"id": job_id, "service": service, "remote_id": remote_id, "status": status,
+                "finished": bool(finished), "error": error, "created": created,
+                "total": total, "succeeded": answered, "failed": failed}
+
+    def results(self, job_id: str) -> List[Tuple[Optional[str], Optional[str]]]:
+        """(text, error) for each request, in submission order.  Both are None while a request is pending."""
+        if self._db is None:
+            return []
+        return [(result, error) for result, error in self._execute(
+            "SELECT result, error FROM items WHERE job_id = ? ORDER BY position", (job_id,))]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.status(job_id)
+        if not job or job['finished'] or not job['remote_id']:
             return False
+        client = self._client(job['service'])
+        if client is None:
+            return False
+        try:
+            client.cancel(job['remote_id'])
+        except Exception as e:
+            self.j_mngr.log_events(f"Unable to cancel batch job {job_id}: {e}",
+                                   TroubleSgltn.Severity.WARNING,
+                                   True)
+            return False
+        self._wake.set()
+        return True
+
+    def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Blocks until the job has finished or timeout seconds have passed, returns status()"""
+        deadline = time.monotonic() + timeout
+        job = self.status(job_id)
+        while job and not job['finished'] and time.monotonic() < deadline:
+            Interruption.sleep(min(max(1.0, float(self.settings['poll_interval'])), max(0.0, deadline - time.monotonic())))
+            self.poll_once()
+            job = self.status(job_id)
+        return job
+
+    def _unfinished(self) -> list:
+        if self._db is None:
+            return []
+        return self._execute("SELECT id, service, remote_id FROM jobs WHERE finished = 0")
+
+    def _purge(self) -> None:
+        """Deletes finished jobs older than keep_days"""
+        if self._db is None:
+            return
+        cutoff = time.time() - float(self.settings['keep_days']) * 86400
+        with self._db_lock:
+            doomed = [row[0] for row in
+                      self._db.execute("SELECT id FROM jobs WHERE finished = 1 AND updated < ?", (cutoff,))]
+            for job_id in doomed:
+                self._db.execute("DELETE FROM items WHERE job_id = ?", (job_id,))
+                self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def poll_once(self) -> int:
+        """Polls every unfinished job once, collecting the replies of jobs that have finished.  Returns the number still running."""
+        running = 0
+        for job_id, service, remote_id in self._unfinished():
+            client = self._client(service)
+            if client is None:
+                running += 1
+                continue
+            try:
+                status, finished = client.poll(remote_id)
+                replies = client.results(remote_id) if finished else {}
+            except Exception as e:
+                self.j_mngr.log_events(f"Unable to poll batch job {job_id}: {e}",
+                                       TroubleSgltn.Severity.WARNING)
+                running += 1
+                continue
+            self._store(job_id, status, finished, replies)
+            if not finished:
+                running += 1
+        return running
+
+    def _store(self, job_id: str, status: str, finished: bool, replies: dict) -> None:
+        now = time.time()
+        with self._db_lock:
+            for custom_id, (text, error) in replies.items():
+                self._db.execute("UPDATE items SET result = ?, error = ? WHERE job_id = ? AND custom_id = ?",
+                                 (text, error, job_id, custom_id))
+            if finished:
+                # Requests the provider never answered (expired or cancelled batches)
+                self._db.execute("UPDATE items SET error = ? WHERE job_id = ? AND result IS NULL AND error IS NULL",
+                                 (f"No reply, batch {status}", job_id))
+            self._db.execute("UPDATE jobs SET status = ?, finished = ?, updated = ? WHERE id = ?",
+                             (status, int(finished), now, job_id))
+        if finished:
+            self.j_mngr.log_events(f"Batch job {job_id} finished with status: {status}, {len(replies)} replies received",
+                                   TroubleSgltn.Severity.INFO)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="plush-batch-jobs", daemon=True)
+                self._thread.start()
+            else:
+                self._wake.set()
 
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(max(1.0, float(self.settings['poll_interval'])))
+            self._wake.clear()
+            try:
+                if not self.poll_once():
+                    with self._lock:
+                        if not self._unfinished():
+                            self._thread = None
+                            return
+            except Exception as e:
+                self.j_mngr.log_events(f"Batch job polling error: {e}", TroubleSgltn.Severity.WARNING)
 
-        self.j_mngr.log_events(f"Model unload failed with status: {response.status_code}, Response: {response_text}", 
-                            TroubleSgltn.Severity.WARNING,
-                            True)
-        return CGPT_response
 
 class request_context:
     def __init__(self)-> None:
@@ -1150,6 +5483,85 @@ class request_context:
                                TroubleSgltn.Severity.ERROR,
                                True)
         return None
+
+    async def execute_request_async(self, **kwargs):
+        if self._request is not None:
+            return await self._request.request_completion_async(**kwargs)
+
+        self.j_mngr.log_events("No request strategy object was set",
+                               TroubleSgltn.Severity.ERROR,
+                               True)
+        return None
+
+    def submit_batch(self, kwargs_list: List[dict]) -> Optional[str]:
+        """Submits the kwargs dicts as one offline batch job, returns the job id (see BatchJobSgltn)"""
+        if self._request is not None:
+            return self._request.submit_batch(kwargs_list)
+
+        self.j_mngr.log_events("No request strategy object was set",
+                               TroubleSgltn.Severity.ERROR,
+                               True)
+        return None
+
+    def execute_many(self, kwargs_list: List[dict], max_concurrency: int = 8) -> list:
+        """
+        Runs the request strategy once for each kwargs dict in kwargs_list, with up to
+        max_concurrency requests in flight at the same time.  The requests have 'batch' priority
+        in the RequestSchedulerSgltn unless their kwargs set 'priority'.
+
+        Args:
+            kwargs_list (list): One dict of request kwargs per request, same format as execute_request()
+            max_concurrency (int): Maximum number of simultaneous requests
+        Returns:
+            list: The results in the same order as kwargs_list.  A request that raised returns None.
+        """
+        if self._request is None:
+            self.j_mngr.log_events("No request strategy object was set",
+                                   TroubleSgltn.Severity.ERROR,
+                                   True)
+            return []
+
+        if not kwargs_list:
+            return []
+
+        return self.run_coroutine(self._gather(kwargs_list, max(1, int(max_concurrency))))
+
+    async def _gather(self, kwargs_list: List[dict], max_concurrency: int) -> list:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _run_one(kwargs: dict):
+            async with semaphore:
+                # Bulk runs give way to interactive requests unless told otherwise
+                return await self._request.request_completion_async(**{"priority": "batch", **kwargs})
+
+        try:
+            results = await asyncio.gather(*(_run_one(kwargs) for kwargs in kwargs_list),
+                                           return_exceptions=True)
+        finally:
+            await self._request.aclose()
+
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                self.j_mngr.log_events(f"Request {index + 1}/{len(kwargs_list)} failed: {result}",
+                                       TroubleSgltn.Severity.ERROR,
+                                       True)
+                results[index] = None
+        return results
+
+    @staticmethod
+    def run_coroutine(coro):
+        """
+        Runs coro to completion from synchronous code.  If the calling thread already has a
+        running event loop (asyncio.run() isn't allowed there) it's run on a worker thread instead.
+        If the ComfyUI run is cancelled meanwhile coro is cancelled, in-flight requests included.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(Interruption.guard(coro))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, Interruption.guard(coro)).result()
     
 class request_utils:
 
@@ -1267,6 +5679,27 @@ class request_utils:
 
         return messages
 
+    def build_data_ollama(self, prompt:str, examples:list=None, instruction:str="", image:str=None)-> list:
+        """
+        Builds a list of message dicts in the format of Ollama's native /api/chat endpoint.
+        - image: Base64-encoded string or None.  Sent as is (no data URL) in the user message's 'images' list.
+        - prompt: String to be included as the 'role:user' content.
+        - examples: List of additional example dicts to be included.
+        - instruction: Instruction string to be included under 'system' role.
+        """
+        messages = self.build_data_basic(prompt, examples, instruction)
+
+        if image:
+            if image.startswith('data:') and ',' in image:
+                image = image.split(',', 1)[1]
+            if messages and messages[-1].get('role') == 'user' and prompt:
+                messages[-1] = {**messages[-1], "images": [image]}
+            else:
+                messages.append({"role": "user", "content": "", "images": [image]})
+
+        return messages
+
+
 
     def process_image(self, image: str, request_type:RequestMode=RequestMode.OPENAI) :
         if not image:
@@ -1305,6 +5738,16 @@ class request_utils:
 
         return headers    
 
+    @staticmethod
+    def split_urls(user_urls:str)-> list:
+        """
+        Splits a url field that may hold several urls (separated by commas, semicolons or whitespace)
+        into a list of distinct urls, in the order entered.
+        """
+        if not user_urls:
+            return []
+        return list(dict.fromkeys(url for url in re.split(r'[\s,;]+', str(user_urls)) if url))
+
     def validate_and_correct_url(self, user_url:str, required_path:str='/v1/chat/completions'):
         """
         Takes the user's url and make sure it has the correct path for the connection
@@ -1370,3 +5813,32 @@ class request_utils:
             return e.message
         else:
             return str(e)
+
+
+def register_metrics_routes() -> None:
+    """
+    Serves the metrics registry, the request scheduler's queues and the hedge counts from the ComfyUI server:
+    /plush/metrics in the Prometheus text format and /plush/metrics.json as a JSON snapshot
+    (which also includes circuit breaker states and the endpoint health table).
+    """
+    server = getattr(PromptServer, 'instance', None) if PromptServer is not None else None
+    routes = getattr(server, 'routes', None)
+    if routes is None or web is None:
+        return
+
+    @routes.get("/plush/metrics")
+    async def plush_metrics(request):
+        return web.Response(text=RequestMetricsSgltn().prometheus() + RequestSchedulerSgltn().prometheus()
+                            + HedgingSgltn().prometheus(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    @routes.get("/plush/metrics.json")
+    async def plush_metrics_json(request):
+        snapshot = RequestMetricsSgltn().snapshot()
+        snapshot["circuit_breakers"] = CircuitBreakerSgltn().states()
+        snapshot["endpoint_health"] = HealthProberSgltn().snapshot()
+        snapshot["scheduler"] = RequestSchedulerSgltn().snapshot()
+        snapshot["hedging"] = HedgingSgltn().snapshot()
+        return web.json_response(snapshot)
+
+register_metrics_routes()
@@ -117,6 +117,8 @@ class helpSgltn:
         self._add_params_help = ""
         self._extract_json_help = ""
         self._type_convert_help = ""
+        self._batch_help = ""
+        self._ollama_preload_help = ""
         # Empty help text is not a critical issue for the app
         if not help_data:
             j_mmgr.log_events('Help data file is empty or missing.',
@@ -132,6 +134,8 @@ class helpSgltn:
         self._add_params_help = help_data.get('add_params_help', '')
         self._extract_json_help = help_data.get('extract_json_help', '')
         self._type_convert_help = help_data.get('type_convert_help', '')
+        self._batch_help = help_data.get('batch_help', '')
+        self._ollama_preload_help = help_data.get('ollama_preload_help', '')
 
     @property
     def style_prompt_help(self)->str:
@@ -167,7 +171,15 @@ class helpSgltn:
     
     @property
     def type_convert_help (self)->str:
-        return self._type_convert_help    
+        return self._type_convert_help
+
+    @property
+    def batch_help (self)->str:
+        return self._batch_help
+
+    @property
+    def ollama_preload_help (self)->str:
+        return self._ollama_preload_help
 
 class json_manager:
 
@@ -15,8 +15,6 @@ from PIL import Image, ImageOps, TiffImagePlugin, UnidentifiedImageError
 import numpy as np
 import torch
 import requests
-from requests.adapters import HTTPAdapter, Retry
-from openai import OpenAI
 import anthropic
 
 # -----------------------
@@ -26,6 +24,7 @@ import folder_paths
 from .mng_json import json_manager, helpSgltn, TroubleSgltn
 from . import api_requests as rqst
 from .fetch_models import FetchModels, ModelUtils, RequestMode
+from .utils import TransportSgltn, CircuitBreakerSgltn, ClientPoolSgltn, HealthProberSgltn
 
 
 
@@ -47,7 +46,7 @@ class cFigSingleton:
     def __new__(cls): 
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._lm_client = None
+            cls._lm_client_key = None #Key of the local/Groq client in the client pool, None until the client is set up
             cls._anthropic_client = None
             cls._lm_url = ""
             cls._lm_request_mode = None
@@ -62,7 +61,12 @@ class cFigSingleton:
             cls._ollama_models = None
             cls._optional_models = None
             cls._written_url = ""
+            cls._config_data = {}
             cls.j_mngr = json_manager()
+            cls._transport = TransportSgltn()
+            cls._breakers = CircuitBreakerSgltn()
+            cls._clients = ClientPoolSgltn()
+            cls._prober = HealthProberSgltn()
             cls._model_fetch = FetchModels()
             cls._model_prep = ModelUtils()
             cls._pyexiv2 = None
@@ -93,6 +97,13 @@ class cFigSingleton:
         #check if file is empty
         if not config_data:
             raise ValueError("Plush - Error: config.json contains no valid JSON data")
+
+        self._config_data = config_data
+        #Apply connection pool settings before any web traffic (model fetches) happens
+        self._transport.configure(config_data.get('http_transport'))
+        self._breakers.configure(config_data.get('circuit_breaker'))
+        self._clients.configure(config_data.get('client_pool'))
+        self._prober.configure(config_data.get('health_prober'))
        
         # Try getting API key from Plush environment variable
         self._fig_key = os.getenv('OAI_KEY',"") or os.getenv('OPENAI_API_KEY',"")            
@@ -106,6 +117,9 @@ class cFigSingleton:
         self._groq_key = os.getenv("GROQ_API_KEY", "")
         self._claude_key = os.getenv("ANTHROPIC_API_KEY", "")
         self._gemini_key = os.getenv("GEMINI_API_KEY", "")
+
+        #Resumes polling batch jobs left unfinished by the last session, needs the keys above
+        rqst.BatchJobSgltn().configure(config_data.get('batch_jobs'))
             
         #Get user saved Open Source URL from the text file  
         #At this point all this does is pre-populate new instances of the node. 
@@ -133,7 +147,7 @@ class cFigSingleton:
         
         if self._fig_key:
             try:
-                self.figOAIClient = OpenAI(api_key= self._fig_key)
+                self._clients.get("", self._fig_key, RequestMode.OPENAI.name)
             except Exception as e:
                 self.j_mngr.log_events(f"Invalid or missing OpenAI API key.  Please note, keys must now be kept in an environment variable (see: ReadMe) {e}",
                                   severity=TroubleSgltn.Severity.ERROR)
@@ -152,6 +166,13 @@ class cFigSingleton:
         self._gemini_models = self._model_fetch.fetch_models(RequestMode.GEMINI, self._gemini_key)
         self._ollama_models =  self._model_fetch.fetch_models(RequestMode.OLLAMA, "")  
         self._optional_models = self._model_fetch.fetch_models(RequestMode.OPENSOURCE, "")          
+
+        #Open pooled connections to the endpoints we already know about
+        self._transport.warm_up([self._lm_url, self._model_prep.url_file("urls.json", "ollama_url")])
+
+    def get_setting(self, name:str, default=None):
+        """Returns a top level value from config.json, or default if it's not present"""
+        return self._config_data.get(name, default)
    
     def get_chat_models(self, sort_it:bool=False, filter_str:tuple=())->list:
         return self._model_prep.prep_models_list(self._fig_gpt_models, sort_it, filter_str)      
@@ -171,10 +192,26 @@ class cFigSingleton:
     def get_optional_models(self, sort_it:bool=False, filter_str:tuple=())->list: 
         return self._model_prep.prep_models_list(self._optional_models, sort_it, filter_str)   
         
+    def _lm_api_key(self, request_type:RequestMode)-> str:
+        """The key the OpenAI API object uses for the local/Groq request_type"""
+        if request_type in (RequestMode.OOBABOOGA, RequestMode.OPENSOURCE) and self._lm_key:
+            return self._lm_key
+        if request_type == RequestMode.GROQ and self._groq_key:
+            return self._groq_key
+        return "No key necessary" #Default value used in LLM front-ends that don't require a key
+
     def _set_llm_client(self, url:str, request_type:RequestMode=RequestMode.OPENSOURCE)-> bool:
+
+        mode_name = request_type.name if request_type else ""
+        client_key = (url, self._lm_api_key(request_type), mode_name)
+        if url and self._clients.contains(*client_key):
+            #A client for this service is already warm, reuse it without another server check
+            self._lm_url = url
+            self._lm_client_key = client_key
+            return True
         
         if not self.is_lm_server_up() or not url:
-            self._lm_client = None
+            self._lm_client_key = None
             self._lm_url = url
             self._lm_models = None
             self.j_mngr.log_events("Local LLM server is not running; aborting client setup.",
@@ -182,17 +219,12 @@ class cFigSingleton:
                           True)
             return False
         
-        lm_object = OpenAI
-        key = "No key necessary" #Default value used in LLM front-ends that don't require a key
         #Use the requested API
-        
-
         if request_type in (RequestMode.OOBABOOGA, RequestMode.OPENSOURCE):
             if not self._lm_key:
                 self.j_mngr.log_events("Setting Openai client with URL, no key.",
                     is_trouble=True)
             else:
-                key = self._lm_key
                 self.j_mngr.log_events("Setting Openai client with URL and key.",
                     is_trouble=True)
         elif request_type == RequestMode.GROQ:
@@ -201,15 +233,14 @@ class cFigSingleton:
                                        TroubleSgltn.Severity.ERROR,
                                        True)
             else:
-                key = self._groq_key
                 self.j_mngr.log_events("Setting Openai client with URL and Groq key.",
                                        is_trouble=True)
 
         
         try:
-            lm_client = lm_object(base_url=url, api_key=key) 
+            self._clients.get(*client_key)
             self._lm_url = url
-            self._lm_client = lm_client
+            self._lm_client_key = client_key
         except Exception as e:
             self.j_mngr.log_events(f"Unable to create LLM client object using URL. Unable to communicate with LLM: {e}",
                             TroubleSgltn.Severity.ERROR,
@@ -220,7 +251,9 @@ class cFigSingleton:
 
     @property
     def lm_client(self):
-        return self._lm_client
+        if self._lm_client_key is None:
+            return None
+        return self._clients.get(*self._lm_client_key)
     
     @property
     def lm_url(self):
@@ -240,11 +273,11 @@ class cFigSingleton:
     
     @lm_url.setter
     def lm_url(self, url: str):
-        if url != self._lm_url or not self._lm_client:  # Check if the new URL is different to avoid unnecessary operations
+        if url != self._lm_url or not self._lm_client_key:  # Check if the new URL is different to avoid unnecessary operations
 
             self._lm_url = url
             # Reset client and models only if a new URL is provided
-            self._lm_client = None
+            self._lm_client_key = None
             #self._lm_models = []
             if url:  # If the new URL is not empty, update the client
                 self._set_llm_client(url, self._lm_request_mode)
@@ -252,11 +285,34 @@ class cFigSingleton:
     
     
     def is_lm_server_up(self):  #should be util in api_requests.py
-        session = requests.Session()
-        retries = Retry(total=2, backoff_factor=0, status_forcelist=[500, 502, 503, 504])
-        session.mount('http://', HTTPAdapter(max_retries=retries))
+        mode_name = self._lm_request_mode.name if self._lm_request_mode else ""
+        breaker = self._breakers.get(mode_name, self._lm_url)
+        if breaker and breaker.is_open:
+            self.j_mngr.log_events(f"Skipping server check, circuit breaker for {breaker.name} is {breaker.state.value}.",
+                                   TroubleSgltn.Severity.WARNING,
+                                   True)
+            return False
+
+        if self._prober.enabled:
+            #Read the background prober's cached state rather than checking the server inline
+            self._prober.watch(self._lm_url)
+            healthy = self._prober.is_healthy(self._lm_url)
+            if healthy is False:
+                self.j_mngr.log_events(f"Local LLM Server is not responding: {self._lm_url}",
+                                       TroubleSgltn.Severity.WARNING,
+                                       True)
+                return False
+            self.write_url(self._lm_url) #Save url to a text file, only written when the url changes
+            if healthy is None:
+                self.j_mngr.log_events("Server status not known yet, the server is being probed in the background.",
+                                       is_trouble=True)
+            return True
+
+        session = self._transport.session
         try:
             response = session.head(self._lm_url, timeout=4)  # Use HEAD to minimize data transfer            
+            if response.status_code in (500, 502, 503, 504):
+                response = session.head(self._lm_url, timeout=4) #One more try on a server error
             if 200 <= response.status_code <= 300:
                 self.write_url(self._lm_url) #Save url to a text file
                 self.j_mngr.log_events(f"Local LLM Server is running with status code: {response.status_code}",
@@ -274,6 +330,8 @@ class cFigSingleton:
             self.j_mngr.log_events(f"Local LLM Server is not running: {e}",
                               TroubleSgltn.Severity.WARNING,
                               True)
+            if breaker:
+                breaker.record_failure()
         return False  
             
 
@@ -387,7 +445,7 @@ class cFigSingleton:
     @property
     def openaiClient(self)-> Optional[object]:
         if self._fig_key:
-            return self.figOAIClient
+            return self._clients.get("", self._fig_key, RequestMode.OPENAI.name)
         return None
 
 #********************End Singleton*********************
@@ -417,6 +475,12 @@ class AI_Chooser:
             "Oobabooga API (URL)": RequestMode.OOBABOOGA
         }
         return mode_map.get(user_selection)
+
+    @staticmethod
+    def auto_routes(ChatGPT_model:str, Groq_model:str, Anthropic_model:str) -> list:
+        """The (service, model) pairs 'Auto (fastest healthy)' routes between: the models selected on the node"""
+        selections = ((RequestMode.OPENAI, ChatGPT_model), (RequestMode.GROQ, Groq_model), (RequestMode.CLAUDE, Anthropic_model))
+        return [(mode, model) for mode, model in selections if model and model != "none"]
         
 
     @classmethod
@@ -426,7 +490,7 @@ class AI_Chooser:
         #Floats have a problem, they go over the max value even when round and step are set, and the node fails.  So I set max a little over the expected input value
         return {
             "required": {
-                "AI_Service": (["ChatGPT", "Groq", "Anthropic"], {"default": "ChatGPT"}),
+                "AI_Service": (["ChatGPT", "Groq", "Anthropic", "Auto (fastest healthy)"], {"default": "ChatGPT", "tooltip": "Auto sends each request to whichever selected model is responding fastest"}),
                 "ChatGPT_model": (cFig.get_chat_models(True,gptfilter), {"default": ""}),
                 "Groq_model": (cFig.get_groq_models(True), {"default": ""}), 
                 "Anthropic_model": (cFig.get_claude_models(True), {"default": ""}),                                  
@@ -449,6 +513,11 @@ class AI_Chooser:
 
         ai_dict = {"service": AI_Chooser.select_request_mode(AI_Service), "model": None}
 
+        if AI_Service == "Auto (fastest healthy)":
+            # The route is picked per request by the node using the selection
+            ai_dict['routes'] = AI_Chooser.auto_routes(ChatGPT_model, Groq_model, Anthropic_model)
+            return (ai_dict,)
+
         if ai_dict['service'] == RequestMode.OPENAI and ChatGPT_model != "none":
             ai_dict['model'] = ChatGPT_model
         elif ai_dict['service'] == RequestMode.GROQ and Groq_model != "none":
@@ -469,6 +538,32 @@ class Enhancer:
         self.j_mngr = json_manager()
         self.trbl = TroubleSgltn()
         self.ctx = rqst.request_context()
+        self.router = rqst.ProviderRouterSgltn()
+
+
+    def use_service(self, service:RequestMode)-> None:
+        """Sets up the request object for the AI_Chooser service"""
+        self.cFig.lm_request_mode = service
+
+        if service == RequestMode.OPENAI:
+            self.ctx.request = rqst.oai_object_request()
+        elif service == RequestMode.GROQ:
+            self.ctx.request = rqst.oai_object_request()
+            # set the url so the function making the request will have a properly initialized object.               
+            self.cFig.lm_url = "https://api.groq.com/openai/v1" # Ugh!  I've embedded a 'magic value' URL here for the OPENAI API Object because the GROQ API object looks flakey...
+        elif service == RequestMode.CLAUDE:
+            self.ctx.request = rqst.claude_request()
+
+    def route_request(self, AI_Selection:dict, kwargs:dict)-> bool:
+        """For an 'Auto (fastest healthy)' selection picks the service and model for the next request. False if there's no route."""
+        if 'routes' not in AI_Selection:
+            return True
+        route = self.router.choose(AI_Selection['routes'])
+        if route is None:
+            return False
+        self.use_service(route[0])
+        kwargs['model'] = route[1]
+        return True
 
 
     def build_instruction(self, mode, style, prompt_style, elements, artist):
@@ -559,7 +654,10 @@ class Enhancer:
             "optional": {  
                 "AI_Selection":("DICTIONARY", {"default": None}),
                 "prompt": ("STRING",{"multiline": True, "default": ""}),          
-                "image" : ("IMAGE", {"default": None})
+                "image" : ("IMAGE", {"default": None}),
+                "Bypass_Cache": ("BOOLEAN", {"default": False, "tooltip": "Always send the request, even if an identical one has a cached response"}),
+                "Stream_Response": ("BOOLEAN", {"default": False, "tooltip": "Show the text on the node as it's generated"}),
+                "Deadline_Seconds": ("INT", {"default": 0, "min": 0, "max": 3600, "step": 1, "tooltip": "Give up if the node's requests aren't finished within this many seconds, all tries included. 0 = no deadline"})
             }
         } 
 
@@ -573,7 +671,7 @@ class Enhancer:
     CATEGORY = "Plush/Prompt"
  
 
-    def gogo(self, creative_latitude, tokens, style, artist, prompt_style, max_elements, style_info, AI_Selection=None, prompt="", image=None, unique_id=None):
+    def gogo(self, creative_latitude, tokens, style, artist, prompt_style, max_elements, style_info, AI_Selection=None, prompt="", image=None, Bypass_Cache=False, Stream_Response=False, Deadline_Seconds=0, unique_id=None):
 
         if unique_id:
             self.trbl.reset('Style Prompt, Node #'+unique_id)
@@ -615,16 +713,10 @@ class Enhancer:
 
         instruction = self.build_instruction(mode, style, prompt_style, max_elements, artist)  
 
-        self.cFig.lm_request_mode = AI_Selection['service']
-
-        if AI_Selection['service'] == RequestMode.OPENAI:
-            self.ctx.request = rqst.oai_object_request()
-        elif AI_Selection['service'] == RequestMode.GROQ:
-            self.ctx.request = rqst.oai_object_request()
-            # set the url so the function making the request will have a properly initialized object.               
-            self.cFig.lm_url = "https://api.groq.com/openai/v1" # Ugh!  I've embedded a 'magic value' URL here for the OPENAI API Object because the GROQ API object looks flakey...
-        elif AI_Selection['service'] == RequestMode.CLAUDE:
-            self.ctx.request = rqst.claude_request()
+        if 'routes' not in AI_Selection:
+            self.use_service(AI_Selection['service'])
+        # One time budget for both of the node's requests
+        deadline = rqst.Deadline.from_seconds(Deadline_Seconds)
 
         if style_info:
             self.trbl.set_process_header("Art Style Info:")
@@ -635,8 +727,11 @@ class Enhancer:
                 "creative_latitude": creative_latitude,
                 "tokens": tokens,
                 "prompt": sty_prompt,
+                "bypass_cache": Bypass_Cache,
+                "deadline": deadline,
             }    
-            CGPT_styleInfo = self.ctx.execute_request(**kwargs)
+            if self.route_request(AI_Selection, kwargs):
+                CGPT_styleInfo = self.ctx.execute_request(**kwargs)
             self.trbl.pop_header()
 
         kwargs = { "model": ais_model,
@@ -645,8 +740,16 @@ class Enhancer:
             "prompt": prompt,
             "instruction": instruction,
             "image": image,
+            "bypass_cache": Bypass_Cache,
+            "stream": Stream_Response,
+            "deadline": deadline,
+            "node_id": unique_id,
         }
 
+        if not self.route_request(AI_Selection, kwargs):
+            CGPT_prompt = "No models to choose from for 'Auto (fastest healthy)', select them on the Plush AI_Chooser"
+            return (CGPT_prompt, instruction, CGPT_styleInfo, _help, self.trbl.get_troubles())
+
         CGPT_prompt = self.ctx.execute_request(**kwargs)
     
         return (CGPT_prompt, instruction, CGPT_styleInfo, _help, self.trbl.get_troubles())
@@ -841,12 +944,16 @@ class addParams:
 class AdvPromptEnhancer:
     #Advance Prompt Enhancer: User entered Instruction, Prompt and Examples
 
+    # AI_service each 'Auto (fastest healthy)' route runs as
+    ROUTE_SERVICES = {RequestMode.OPENAI: "ChatGPT", RequestMode.GROQ: "Groq", RequestMode.CLAUDE: "Anthropic"}
+
     def __init__(self)-> None:
         self.cFig = cFigSingleton()
         self.help_data = helpSgltn()
         self.j_mngr = json_manager()
         self.trbl = TroubleSgltn()
         self.ctx = rqst.request_context()
+        self.router = rqst.ProviderRouterSgltn()
         self.m_ttl = rqst.ollama_unload_request.ModelTTL #Enum
 
     def get_model(self, GPT_model, Groq_model, Anthropic_model, Ollamm_model, Optional_model, connection_type)->str:
@@ -893,7 +1000,7 @@ class AdvPromptEnhancer:
 
         return {
             "required": {
-                "AI_service": (["ChatGPT", "Groq", "Anthropic", "LM_Studio (URL)", "Ollama (URL)","OpenAI API Connection (URL)", "Direct Web Connection (URL)", "Web Connection Simplified Data (URL)", "Oobabooga API (URL)"], {"default": "Groq", "tooltip": "Choose connection type/service, connections ending with '(URL)' require a URL to be entered below"}),
+                "AI_service": (["ChatGPT", "Groq", "Anthropic", "Auto (fastest healthy)", "LM_Studio (URL)", "Ollama (URL)","OpenAI API Connection (URL)", "Direct Web Connection (URL)", "Web Connection Simplified Data (URL)", "Oobabooga API (URL)"], {"default": "Groq", "tooltip": "Choose connection type/service, connections ending with '(URL)' require a URL to be entered below"}),
                 "ChatGPT_model": (cFig.get_chat_models(True,gptfilter), {"default": ""}),
                 "Groq_model": (cFig.get_groq_models(True), {"default": ""}), 
                 "Anthropic_model": (cFig.get_claude_models(True), {"default": ""}), 
@@ -904,7 +1011,7 @@ class AdvPromptEnhancer:
                 "tokens" : ("INT", {"max": 20000, "min": 20, "step": 10, "default": 800, "display": "number"}), 
                 "seed": ("INT", {"default": 9, "min": 0, "max": 0xffffffffffffffff}),
                 "examples_delimiter":(["Pipe |", "Two newlines", "Two colons ::"], {"default": "Two newlines"}),
-                "LLM_URL": ("STRING",{"default": cFig.lm_url, "tooltip": "Enter the url for your service here when using connections that end with: (URL)"}),
+                "LLM_URL": ("STRING",{"default": cFig.lm_url, "tooltip": "Enter the url for your service here when using connections that end with: (URL). Several urls separated by commas are used as a load balanced pool."}),
                 "Number_of_Tries": (["1","2","3","4","5","default"], {"default": "default"})            
                          
             },
@@ -917,7 +1024,11 @@ class AdvPromptEnhancer:
                 "Examples_or_Context": ("STRING",{"multiline": True, "default": "", "forceInput": True}),
                 "Prompt": ("STRING",{"multiline": True, "default": "", "forceInput": True}),
                 "Add_Parameter": ("LIST", {"default": None, "forceInput": True}),
-                "image" : ("IMAGE", {"default": None})                          
+                "image" : ("IMAGE", {"default": None}),
+                "Bypass_Cache": ("BOOLEAN", {"default": False, "tooltip": "Always send the request, even if an identical one has a cached response"}),
+                "Stream_Response": ("BOOLEAN", {"default": False, "tooltip": "Show the text on the node as it's generated"}),
+                "Deadline_Seconds": ("INT", {"default": 0, "min": 0, "max": 3600, "step": 1, "tooltip": "Give up if the node's requests aren't finished within this many seconds, all tries included. 0 = no deadline"}),
+                "Priority": (["interactive", "batch"], {"default": "interactive", "tooltip": "When a service is busy, interactive requests are sent ahead of batch requests"})
                 
             }
         } 
@@ -932,7 +1043,7 @@ class AdvPromptEnhancer:
     CATEGORY = "Plush/Prompt"
 
     def gogo(self, AI_service, ChatGPT_model, Groq_model, Anthropic_model, Ollama_model, Ollama_model_unload, Optional_model, creative_latitude, tokens, seed, examples_delimiter, 
-              Number_of_Tries:str="", Add_Parameter=None, LLM_URL:str="", Instruction:str="", Prompt:str = "", Examples_or_Context:str ="", image=None, unique_id=None):
+              Number_of_Tries:str="", Add_Parameter=None, LLM_URL:str="", Instruction:str="", Prompt:str = "", Examples_or_Context:str ="", image=None, Bypass_Cache=False, Stream_Response=False, Deadline_Seconds=0, Priority="interactive", unique_id=None):
 
         if unique_id:
             self.trbl.reset("Advanced Prompt Enhancer, Node #"+unique_id)
@@ -956,6 +1067,14 @@ class AdvPromptEnhancer:
                         TroubleSgltn.Severity.INFO,
                         True)
 
+        if AI_service == "Auto (fastest healthy)":
+            # Each run goes to whichever of the selected ChatGPT, Groq and Anthropic models is doing best right now
+            route = self.router.choose(AI_Chooser.auto_routes(ChatGPT_model, Groq_model, Anthropic_model))
+            if route is None:
+                return("No models to choose from for 'Auto (fastest healthy)', select them on the node", "", _help, self.trbl.get_troubles())
+            AI_service = self.ROUTE_SERVICES[route[0]]
+            ChatGPT_model = Groq_model = Anthropic_model = route[1]
+
         remote_model = self.get_model(ChatGPT_model, Groq_model, Anthropic_model, Ollama_model, Optional_model, AI_service)
         model_ttl = self.model_ttl(Ollama_model_unload)
       
@@ -996,7 +1115,12 @@ class AdvPromptEnhancer:
                 "image": image,
                 "example_list": example_list,
                 "add_params": Add_Parameter,
-                "tries": Number_of_Tries
+                "tries": Number_of_Tries,
+                "bypass_cache": Bypass_Cache,
+                "stream": Stream_Response,
+                "deadline": Deadline_Seconds,
+                "priority": Priority,
+                "node_id": unique_id
         }
         context_output = ""
         ctx_delimiter = "\n" + delimiter +"\n"
@@ -1004,8 +1128,6 @@ class AdvPromptEnhancer:
         context_output = (Examples + ctx_delimiter if Examples else "") + Prompt + ctx_delimiter
 
         if  AI_service == 'OpenAI API Connection (URL)' or AI_service == "Groq" or AI_service == "Ollama (URL)": 
-            
-            unload_ctx = None #Initialize Model Unload request for use if Ollama request
 
             if AI_service == 'OpenAI API Connection (URL)':
                 self.cFig.lm_request_mode = RequestMode.OPENSOURCE
@@ -1014,8 +1136,6 @@ class AdvPromptEnhancer:
                 LLM_URL = "https://api.groq.com/openai/v1" # Ugh!  I've embedded a 'magic value' URL here for the OPENAI API Object because the GROQ API object looks flakey...
             elif AI_service == "Ollama (URL)":
                 self.cFig.lm_request_mode = RequestMode.OLLAMA
-                unload_ctx = rqst.request_context()
-                unload_ctx.request = rqst.ollama_unload_request()
 
 
             if not LLM_URL:
@@ -1025,7 +1145,11 @@ class AdvPromptEnhancer:
                 return(llm_result,"", _help, self.trbl.get_troubles()) 
 
             # set the url so the function making the request will have a properly initialized object.               
-            self.cFig.lm_url = LLM_URL
+            # LLM_URL may list several servers (a load balanced pool), any one that's running will do here
+            for endpoint in rqst.request_utils.split_urls(LLM_URL):
+                self.cFig.lm_url = endpoint
+                if self.cFig.lm_client:
+                    break
             
             if not self.cFig.lm_client:
                 self.j_mngr.log_events("Open Source LLM server is not running.  Aborting request.",
@@ -1034,12 +1158,14 @@ class AdvPromptEnhancer:
                 return(llm_result,"", _help, self.trbl.get_troubles())
 
             llm_result = ""
-            self.ctx.request = rqst.oai_object_request( )
-
-            if unload_ctx: #If uload_ctx has been instantiated, execute the user's model unload setting
-                llm_result = unload_ctx.execute_request(model=remote_model, url=LLM_URL, model_TTL=model_ttl)
+            if AI_service == "Ollama (URL)":
+                # Ollama's native API, the user's model unload setting is sent along with the request
+                self.ctx.request = rqst.ollama_chat_request()
+                kwargs["keep_alive"] = model_ttl
             else:
-                llm_result = self.ctx.execute_request(**kwargs)
+                self.ctx.request = rqst.oai_object_request( )
+
+            llm_result = self.ctx.execute_request(**kwargs)
 
             context_output += llm_result
 
@@ -1129,6 +1255,174 @@ class AdvPromptEnhancer:
     
 
 
+class BatchPromptSubmit:
+    #Submits a list of prompts as one offline batch job to the OpenAI or Anthropic batch API
+
+    def __init__(self)-> None:
+        self.cFig = cFigSingleton()
+        self.help_data = helpSgltn()
+        self.j_mngr = json_manager()
+        self.trbl = TroubleSgltn()
+        self.ctx = rqst.request_context()
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        cFig = cFigSingleton()
+        gptfilter = ("gpt","o1")
+
+        return {
+            "required": {
+                "AI_service": (["ChatGPT", "Anthropic"], {"default": "ChatGPT", "tooltip": "Batch jobs are run by the service's batch API at a lower cost, results can take up to 24 hours"}),
+                "ChatGPT_model": (cFig.get_chat_models(True,gptfilter), {"default": ""}),
+                "Anthropic_model": (cFig.get_claude_models(True), {"default": ""}),
+                "creative_latitude" : ("FLOAT", {"max": 1.901, "min": 0.1, "step": 0.1, "display": "number", "round": 0.1, "default": 0.7, "tooltip": "temperature"}),
+                "tokens" : ("INT", {"max": 20000, "min": 20, "step": 10, "default": 800, "display": "number"}),
+                "prompts_delimiter":(["One per line", "Two newlines", "Pipe |", "Two colons ::"], {"default": "One per line"}),
+                "Prompts": ("STRING",{"multiline": True, "default": "", "tooltip": "Each prompt is sent as a separate request in the batch"})
+            },
+
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            },
+            "optional": {
+                "Instruction": ("STRING",{"multiline": True, "default": "", "forceInput": True}),
+                "Add_Parameter": ("LIST", {"default": None, "forceInput": True})
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING")
+    RETURN_NAMES = ("Job_ID", "Help","Troubleshooting")
+
+    FUNCTION = "gogo"
+
+    OUTPUT_NODE = False
+
+    CATEGORY = "Plush/Prompt"
+
+    def gogo(self, AI_service, ChatGPT_model, Anthropic_model, creative_latitude, tokens, prompts_delimiter, Prompts:str="",
+             Instruction:str="", Add_Parameter=None, unique_id=None):
+
+        if unique_id:
+            self.trbl.reset("Batch Prompt Submit, Node #"+unique_id)
+        else:
+            self.trbl.reset("Batch Prompt Submit")
+
+        _help = self.help_data.batch_help
+
+        Instruction = Enhancer.undefined_to_none(Instruction)
+        if not isinstance(Add_Parameter, list):
+            Add_Parameter = []
+
+        delimiter = {"Two newlines": "\n\n", "Pipe |": "|", "Two colons ::": "::"}.get(prompts_delimiter, "\n")
+        prompt_list = [prompt.strip() for prompt in (Prompts or "").split(delimiter) if prompt.strip()]
+
+        if not prompt_list:
+            self.j_mngr.log_events("No prompts to submit.",
+                                   TroubleSgltn.Severity.WARNING,
+                                   True)
+            return("", _help, self.trbl.get_troubles())
+
+        if AI_service == "Anthropic":
+            self.cFig.lm_request_mode = RequestMode.CLAUDE
+            self.ctx.request = rqst.claude_request()
+            model = Anthropic_model
+        else:
+            self.cFig.lm_request_mode = RequestMode.OPENAI
+            self.ctx.request = rqst.oai_object_request()
+            model = ChatGPT_model
+
+        kwargs_list = [{"model": model,
+                        "creative_latitude": creative_latitude,
+                        "tokens": tokens,
+                        "prompt": prompt,
+                        "instruction": Instruction,
+                        "add_params": Add_Parameter} for prompt in prompt_list]
+
+        job_id = self.ctx.submit_batch(kwargs_list)
+        if not job_id:
+            self.j_mngr.log_events("Batch job was not submitted.",
+                                   TroubleSgltn.Severity.ERROR,
+                                   True)
+            return("", _help, self.trbl.get_troubles())
+
+        self.j_mngr.log_events(f"Batch job submitted with {len(prompt_list)} prompts, Job_ID: {job_id}",
+                               is_trouble=True)
+        return(job_id, _help, self.trbl.get_troubles())
+
+
+class BatchPromptResults:
+    #Collects the results of a batch job submitted by Batch Prompt Submit
+
+    def __init__(self)-> None:
+        self.help_data = helpSgltn()
+        self.j_mngr = json_manager()
+        self.trbl = TroubleSgltn()
+        self.batches = rqst.BatchJobSgltn()
+
+    @classmethod
+    def INPUT_TYPES(cls):
+
+        return {
+            "required": {
+                "Job_ID": ("STRING", {"default": "", "tooltip": "The Job_ID output of Batch Prompt Submit"}),
+                "Wait_seconds": ("INT", {"max": 86400, "min": 0, "step": 60, "default": 0, "display": "number", "tooltip": "How long to wait for an unfinished job before returning, 0 returns at once"})
+            },
+
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("Results", "Status", "Help","Troubleshooting")
+    OUTPUT_IS_LIST = (True, False, False, False)
+
+    FUNCTION = "gogo"
+
+    OUTPUT_NODE = False
+
+    CATEGORY = "Plush/Prompt"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        #The job's state changes outside the workflow, so check it on every run
+        return float("nan")
+
+    def gogo(self, Job_ID:str, Wait_seconds:int=0, unique_id=None):
+
+        if unique_id:
+            self.trbl.reset("Batch Prompt Results, Node #"+unique_id)
+        else:
+            self.trbl.reset("Batch Prompt Results")
+
+        _help = self.help_data.batch_help
+        Job_ID = (Job_ID or "").strip()
+
+        job = self.batches.wait(Job_ID, Wait_seconds) if Job_ID else None
+        if not job:
+            self.j_mngr.log_events(f"Unknown batch Job_ID: '{Job_ID}'",
+                                   TroubleSgltn.Severity.WARNING,
+                                   True)
+            return([""], "unknown job", _help, self.trbl.get_troubles())
+
+        results = []
+        for position, (text, error) in enumerate(self.batches.results(Job_ID)):
+            if error:
+                self.j_mngr.log_events(f"Batch request {position + 1} failed: {error}",
+                                       TroubleSgltn.Severity.WARNING,
+                                       True)
+                text = "Server was unable to process the request"
+            results.append(rqst.request_utils().clean_response_text(text) if text else "")
+
+        status = f"{job['status']}: {job['succeeded']} of {job['total']} succeeded, {job['failed']} failed"
+        if not job['finished']:
+            status = f"{job['status']}: waiting for results, {job['total']} requests"
+        self.j_mngr.log_events(f"Batch job {Job_ID} {status}",
+                               is_trouble=True)
+
+        return(results or [""], status, _help, self.trbl.get_troubles())
+
+
 class DalleImage:
 #Accept a user prompt and parameters to produce a Dall_e generated image
 
@@ -1260,6 +1554,9 @@ class DalleImage:
             "hidden": {
                 "unique_id": "UNIQUE_ID",
             },
+            "optional": {
+                "Deadline_Seconds": ("INT", {"default": 0, "min": 0, "max": 3600, "step": 1, "tooltip": "Give up on images that aren't finished within this many seconds, all tries included. 0 = no deadline"})
+            }
         } 
 
     RETURN_TYPES = ("IMAGE", "STRING","STRING","STRING" )
@@ -1271,7 +1568,7 @@ class DalleImage:
 
     CATEGORY = "Plush/Image_Gen"
 
-    def gogo(self, GPTmodel, prompt, image_size, image_quality, style, batch_size, seed, Number_of_Tries:str, unique_id=None):
+    def gogo(self, GPTmodel, prompt, image_size, image_quality, style, batch_size, seed, Number_of_Tries:str, Deadline_Seconds=0, unique_id=None):
 
         if unique_id:
             self.trbl.reset('Dall-e Image, Node #' + unique_id)
@@ -1288,7 +1585,8 @@ class DalleImage:
                 "image_quality": image_quality,
                 "style": style,
                 "batch_size": batch_size,
-                "tries": Number_of_Tries
+                "tries": Number_of_Tries,
+                "deadline": Deadline_Seconds
         }
         batched_images, revised_prompt = self.ctx.execute_request(**kwargs)
 
@@ -1594,12 +1892,74 @@ class ImageInfoExtractor:
                
       
 
+class OllamaPreload:
+    #Loads an Ollama model into memory ahead of the first real job, so that job doesn't wait for a cold start
+
+    def __init__(self)-> None:
+        self.help_data = helpSgltn()
+        self.j_mngr = json_manager()
+        self.trbl = TroubleSgltn()
+        self.cFig = cFigSingleton()
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        cFig = cFigSingleton()
+
+        return {
+            "required": {
+                "Ollama_model": (cFig.get_ollama_models(True), {"default": ""}),
+                "LLM_URL": ("STRING",{"default": cFig.lm_url, "tooltip": "The Ollama server's url, e.g. http://localhost:11434"}),
+                "Keep_Alive": (["Ollama Default", "30 Minutes", "2 Hours", "Keep Alive Indefinitely"], {"default": "30 Minutes", "tooltip": "How long the model stays loaded after its last request"})
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            },
+            "optional": {
+                "Passthrough": ("STRING",{"multiline": True, "default": "", "forceInput": True, "tooltip": "Connect e.g. your prompt here and use the Passthrough output, to have the model loaded before the node that uses it runs"})
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "BOOLEAN", "STRING", "STRING")
+    RETURN_NAMES = ("Passthrough", "Loaded", "Help", "Troubleshooting")
+
+    FUNCTION = "gogo"
+
+    OUTPUT_NODE = True
+
+    CATEGORY = "Plush/Utils"
+
+    KEEP_ALIVE = {"Ollama Default": None, "30 Minutes": "30m", "2 Hours": "2h", "Keep Alive Indefinitely": -1}
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        #Always run, the model may have been unloaded since the last run
+        return float("nan")
+
+    def gogo(self, Ollama_model, LLM_URL, Keep_Alive, Passthrough="", unique_id=None):
+
+        if unique_id:
+            self.trbl.reset("Ollama Preload, Node #"+unique_id)
+        else:
+            self.trbl.reset("Ollama Preload")
+
+        _help = self.help_data.ollama_preload_help
+        Passthrough = Enhancer.undefined_to_none(Passthrough) or ""
+
+        self.cFig.lm_request_mode = RequestMode.OLLAMA
+        loaded = rqst.ollama_unload_request().preload(Ollama_model, LLM_URL, self.KEEP_ALIVE.get(Keep_Alive))
+
+        return (Passthrough, loaded, _help, self.trbl.get_troubles())
+
+
 # A dictionary that contains all nodes you want to export with their names
 # NOTE: names should be globally unique
 NODE_CLASS_MAPPINGS = {
     "Enhancer": Enhancer,
     "AI Chooser": AI_Chooser,
     "AdvPromptEnhancer": AdvPromptEnhancer,
+    "Batch Prompt Submit": BatchPromptSubmit,
+    "Batch Prompt Results": BatchPromptResults,
+    "Ollama Preload": OllamaPreload,
     "DalleImage": DalleImage,
     "Plush-Exif Wrangler" :ImageInfoExtractor,
     "Add Parameters": addParameters
@@ -1610,6 +1970,9 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "Enhancer": "Style Prompt",
     "AI Chooser": "AI_Chooser",
     "AdvPromptEnhancer": "Advanced Prompt Enhancer",
+    "Batch Prompt Submit": "Batch Prompt Submit",
+    "Batch Prompt Results": "Batch Prompt Results",
+    "Ollama Preload": "Ollama Preload",
     "DalleImage": "OAI Dall_e Image",
     "ImageInfoExtractor": "Exif Wrangler",
     "Add Parameters": "Add Parameters"
@@ -0,0 +1,37 @@
+"""
+Makes the repository importable as the package 'plush' without running its __init__.py, which registers
+the ComfyUI nodes and updates config.json.  Tests import modules as e.g. 'from plush import api_requests'.
+Loaded as a plugin (see addopts in pyproject.toml) so the directory hook below also covers the repository root.
+"""
+import pathlib
+import sys
+import types
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+if "plush" not in sys.modules:
+    package = types.ModuleType("plush")
+    package.__path__ = [str(ROOT)]
+    sys.modules["plush"] = package
+
+
+def pytest_collect_directory(path, parent):
+    """Collect the repository root as a plain directory so pytest doesn't import its __init__.py"""
+    if path == ROOT:
+        return pytest.Dir.from_parent(parent, path=path)
+
+
+@pytest.fixture(autouse=True)
+def log_to_tmp(tmp_path, monkeypatch):
+    """json_manager.log_events() writes to tmp_path instead of the repository's logs/Plush-Events.log"""
+    from plush.mng_json import json_manager
+
+    log_events = json_manager.log_events
+
+    def log_events_in_tmp(self, *args, **kwargs):
+        monkeypatch.setattr(self, "log_dir", str(tmp_path))
+        return log_events(self, *args, **kwargs)
+
+    monkeypatch.setattr(json_manager, "log_events", log_events_in_tmp)
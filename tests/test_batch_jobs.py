@@ -0,0 +1,172 @@
+"""BatchJobSgltn against a fake BatchClient: submit, poll, map replies back to requests, resume after a restart"""
+import types
+
+import pytest
+
+for _module in ("torch", "requests", "httpx", "openai", "anthropic", "PIL"):
+    pytest.importorskip(_module)
+
+from plush import api_requests
+from plush.api_requests import BatchClient, BatchJobSgltn, ImportedSgltn, PreparedRequest
+from plush.mng_json import json_manager
+
+
+class FakeBatchServer:
+    """Provider side of the batch API, outlives the clients so a 'restarted' BatchJobSgltn can reach it"""
+
+    def __init__(self):
+        self.batches = {}
+        self.submitted = []
+        self.polls = 0
+        self.fail_submit = False
+
+    def finish(self, remote_id, status="completed", replies=None):
+        self.batches[remote_id] = (status, True, replies or {})
+
+
+class FakeBatchClient(BatchClient):
+    server = None
+
+    def __init__(self, api_key, base_url=None, completion_window="24h"):
+        self.api_key = api_key
+        self.completion_window = completion_window
+
+    def submit(self, items):
+        if self.server.fail_submit:
+            raise RuntimeError("batch endpoint unavailable")
+        remote_id = f"batch_{len(self.server.submitted)}"
+        self.server.submitted.append((remote_id, items))
+        self.server.batches[remote_id] = ("in_progress", False, {})
+        return remote_id
+
+    def poll(self, remote_id):
+        self.server.polls += 1
+        status, finished, _ = self.server.batches[remote_id]
+        return status, finished
+
+    def results(self, remote_id):
+        return dict(self.server.batches[remote_id][2])
+
+    def cancel(self, remote_id):
+        self.server.batches[remote_id] = ("cancelling", False, {})
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A fresh BatchJobSgltn with its database in tmp_path and FakeBatchClient as the 'openai' client"""
+    find_child_directory = json_manager.find_child_directory
+
+    def cache_in_tmp(self, parent, child, *args, **kwargs):
+        if child == 'cache':
+            return str(tmp_path)
+        return find_child_directory(self, parent, child, *args, **kwargs)
+
+    monkeypatch.setattr(json_manager, "find_child_directory", cache_in_tmp)
+    monkeypatch.setattr(ImportedSgltn, "_instance",
+                        types.SimpleNamespace(cfig=types.SimpleNamespace(key="sk-test", anthropic_key="")))
+    monkeypatch.setattr(BatchJobSgltn, "_instance", None)
+    fake = FakeBatchServer()
+    monkeypatch.setattr(FakeBatchClient, "server", fake)
+    return fake
+
+
+def start_jobs():
+    """Builds BatchJobSgltn as ComfyUI does at startup, the poll interval keeps the daemon thread out of the way"""
+    jobs = BatchJobSgltn()
+    jobs.register_client("openai", FakeBatchClient)
+    jobs.configure({"poll_interval": 3600})
+    return jobs
+
+
+def restart(monkeypatch):
+    monkeypatch.setattr(BatchJobSgltn, "_instance", None)
+    return start_jobs()
+
+
+def prepared(prompt):
+    return PreparedRequest(params={"model": "gpt-4o-mini", "messages": [{"role": "user", "content": prompt}]})
+
+
+def test_submit_poll_and_results_map_to_requests(server):
+    jobs = start_jobs()
+    requests = [prepared("first"), PreparedRequest(result="short-circuited"), prepared("third"), prepared("fourth")]
+    job_id = jobs.submit("openai", requests)
+
+    assert job_id is not None
+    remote_id, items = server.submitted[0]
+    assert [custom_id for custom_id, _ in items] == ["plush-0", "plush-2", "plush-3"]
+    assert items[1][1]["messages"][0]["content"] == "third"
+    assert jobs.status(job_id)["status"] == "submitted"
+    assert jobs.results(job_id) == [(None, None), ("short-circuited", None), (None, None), (None, None)]
+
+    assert jobs.poll_once() == 1
+    assert not jobs.status(job_id)["finished"]
+
+    # Replies arrive out of order, one request failed and one was never answered
+    server.finish(remote_id, replies={"plush-2": ("third reply", None),
+                                      "plush-0": (None, "context_length_exceeded")})
+    assert jobs.poll_once() == 0
+
+    status = jobs.status(job_id)
+    assert status["finished"] and status["status"] == "completed"
+    assert (status["total"], status["succeeded"], status["failed"]) == (4, 2, 2)
+    assert jobs.results(job_id) == [(None, "context_length_exceeded"), ("short-circuited", None),
+                                    ("third reply", None), (None, "No reply, batch completed")]
+
+
+def test_unfinished_job_resumes_after_restart(server, monkeypatch):
+    job_id = start_jobs().submit("openai", [prepared("first"), prepared("second")])
+    remote_id = server.submitted[0][0]
+
+    jobs = restart(monkeypatch)
+    assert jobs.status(job_id)["remote_id"] == remote_id
+    assert not jobs.status(job_id)["finished"]
+
+    server.finish(remote_id, replies={"plush-0": ("first reply", None), "plush-1": ("second reply", None)})
+    assert jobs.poll_once() == 0
+    assert jobs.results(job_id) == [("first reply", None), ("second reply", None)]
+
+    jobs = restart(monkeypatch)
+    polls = server.polls
+    assert jobs.poll_once() == 0
+    assert server.polls == polls
+    assert jobs.wait(job_id, timeout=5)["finished"]
+
+
+def test_failed_submission_is_recorded(server):
+    jobs = start_jobs()
+    server.fail_submit = True
+    assert jobs.submit("openai", [prepared("first")]) is None
+    assert jobs.poll_once() == 0
+    assert not server.submitted
+
+
+def test_only_short_circuited_requests_finish_immediately(server):
+    jobs = start_jobs()
+    job_id = jobs.submit("openai", [PreparedRequest(result="cached")])
+    assert not server.submitted
+    assert jobs.status(job_id)["finished"]
+    assert jobs.results(job_id) == [("cached", None)]
+
+
+def test_cancel_unfinished_job(server):
+    jobs = start_jobs()
+    job_id = jobs.submit("openai", [prepared("first")])
+    assert jobs.cancel(job_id)
+    remote_id = server.submitted[0][0]
+    assert server.batches[remote_id][0] == "cancelling"
+
+    server.finish(remote_id, status="cancelled")
+    assert jobs.poll_once() == 0
+    assert jobs.status(job_id)["status"] == "cancelled"
+    assert jobs.results(job_id) == [(None, "No reply, batch cancelled")]
+    assert not jobs.cancel(job_id)
+
+
+def test_missing_api_key_refuses_the_job(server, monkeypatch):
+    monkeypatch.setattr(ImportedSgltn, "_instance",
+                        types.SimpleNamespace(cfig=types.SimpleNamespace(key="", anthropic_key="")))
+    jobs = start_jobs()
+    assert jobs.submit("openai", [prepared("first")]) is None
+    assert not server.submitted
+    assert api_requests.BatchJobSgltn() is jobs
@@ -0,0 +1,93 @@
+"""Request._record_outcome(): which call outcomes move an endpoint's circuit breaker and health record"""
+import asyncio
+
+import pytest
+
+for _module in ("torch", "requests", "httpx", "openai", "anthropic", "PIL"):
+    pytest.importorskip(_module)
+
+import httpx
+
+from plush.api_requests import (DeadlineExceededError, RequestInterruptedError, RetryConfig, RetryHandler,
+                                oai_web_request)
+from plush.utils import CircuitBreaker
+
+URL = "http://localhost:11434/v1/chat/completions"
+REQUEST = httpx.Request("POST", URL)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProber:
+    def __init__(self):
+        self.records = []
+
+    def record(self, url, ok):
+        self.records.append((url, ok))
+
+
+class Log:
+    def log_events(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def request_():
+    request = object.__new__(oai_web_request)  # Only _record_outcome() is exercised, it needs no config
+    request.prober = FakeProber()
+    return request
+
+
+@pytest.fixture
+def half_open():
+    """A breaker whose probe request is in flight"""
+    clock = FakeClock()
+    breaker = CircuitBreaker("OLLAMA", failure_threshold=1, recovery_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now = 31
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.State.HALF_OPEN
+    return breaker
+
+
+def record(request, breaker, error=None):
+    request._record_outcome(breaker, RetryHandler(RetryConfig(), Log()), error, URL)
+
+
+@pytest.mark.parametrize("error", [
+    RequestInterruptedError("Request cancelled"),
+    DeadlineExceededError("deadline of 30 seconds exceeded"),
+    asyncio.CancelledError(),
+], ids=["cancelled scope", "deadline", "cancelled task"])
+def test_inconclusive_probe_only_frees_the_probe_slot(request_, half_open, error):
+    assert half_open.is_open
+    record(request_, half_open, error)
+    assert half_open.state == CircuitBreaker.State.HALF_OPEN
+    assert not half_open.is_open
+    assert request_.prober.records == []
+    assert half_open.allow_request()
+
+
+def test_successful_probe_closes_the_breaker(request_, half_open):
+    record(request_, half_open)
+    assert half_open.state == CircuitBreaker.State.CLOSED
+    assert request_.prober.records == [(URL, True)]
+
+
+def test_failed_probe_opens_the_breaker(request_, half_open):
+    record(request_, half_open, httpx.ConnectError("connection refused"))
+    assert half_open.state == CircuitBreaker.State.OPEN
+    assert request_.prober.records == [(URL, False)]
+
+
+def test_error_from_a_working_endpoint_closes_the_breaker(request_, half_open):
+    record(request_, half_open, httpx.HTTPStatusError("bad key", request=REQUEST,
+                                                      response=httpx.Response(401, request=REQUEST)))
+    assert half_open.state == CircuitBreaker.State.CLOSED
+    assert request_.prober.records == [(URL, True)]
@@ -0,0 +1,116 @@
+"""ErrorParser.classify() and the retry policy table on representative provider error payloads"""
+import types
+
+import pytest
+
+for _module in ("torch", "requests", "httpx", "openai", "anthropic", "PIL"):
+    pytest.importorskip(_module)
+
+import httpx
+import openai
+import anthropic
+import requests
+
+from plush.api_requests import (ErrorParser, RetryConfig, RetryConfigFactory, RetryHandler, DeadlineExceededError,
+                                ImportedSgltn)
+from plush.fetch_models import RequestMode
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+
+
+def http_error(status, body=None):
+    if body is None:
+        return httpx.Response(status, request=REQUEST)
+    return httpx.Response(status, json=body, request=REQUEST)
+
+
+def openai_error(status, error):
+    return openai.APIStatusError(error.get("message", ""), response=http_error(status, {"error": error}),
+                                 body=error)
+
+
+def anthropic_error(status, error_type, message):
+    body = {"type": "error", "error": {"type": error_type, "message": message}}
+    return anthropic.APIStatusError(message, response=http_error(status, body), body=body)
+
+
+CASES = [
+    ("openai context length", openai_error(400, {
+        "message": "This model's maximum context length is 8192 tokens. However, your messages resulted in 9000 tokens.",
+        "type": "invalid_request_error", "code": "context_length_exceeded"}), "context_length"),
+    ("anthropic prompt too long", anthropic_error(400, "invalid_request_error",
+                                                  "prompt is too long: 210000 tokens > 200000 maximum"),
+     "context_length"),
+    ("openai unknown model", openai_error(404, {
+        "message": "The model `gpt-9` does not exist or you do not have access to it.",
+        "type": "invalid_request_error", "code": "model_not_found"}), "invalid_model"),
+    ("anthropic unknown model", anthropic_error(404, "not_found_error", "model: claude-9"), "invalid_model"),
+    ("ollama model not pulled", http_error(404, {"error": "model \"llama3\" not found, try pulling it first"}),
+     "invalid_model"),
+    ("plain 404", http_error(404), "not_found"),
+    ("dall-e content policy", openai_error(400, {
+        "message": "Your request was rejected as a result of our safety system.",
+        "type": "invalid_request_error", "code": "content_policy_violation"}), "content_policy"),
+    ("openai bad key", openai_error(401, {
+        "message": "Incorrect API key provided: sk-abc.", "type": "invalid_request_error",
+        "code": "invalid_api_key"}), "auth"),
+    ("anthropic bad key", anthropic_error(401, "authentication_error", "invalid x-api-key"), "auth"),
+    ("plain 403", http_error(403), "auth"),
+    ("openai quota", openai_error(429, {
+        "message": "You exceeded your current quota, please check your plan and billing details.",
+        "type": "insufficient_quota", "code": "insufficient_quota"}), "quota"),
+    ("openai rate limit", openai_error(429, {
+        "message": "Rate limit reached for gpt-4o in organization org-x on tokens per min.",
+        "type": "tokens", "code": "rate_limit_exceeded"}), "rate_limit"),
+    ("groq rate limit web", http_error(429, {"error": {"message": "Rate limit reached", "type": "tokens"}}),
+     "rate_limit"),
+    ("anthropic overloaded", anthropic_error(529, "overloaded_error", "Overloaded"), "overloaded"),
+    ("503 body mentions an invalid model", http_error(503, {"error": {"message": "invalid model state, retry later"}}),
+     "overloaded"),
+    ("500 body mentions an invalid request", http_error(500, {"error": {"message": "Invalid request handler"}}),
+     "server_error"),
+    ("502 without body", http_error(502), "server_error"),
+    ("504 gateway timeout", http_error(504), "timeout"),
+    ("embedded error dict", {"error": {"code": 401, "message": "Invalid API key"}}, "auth"),
+    ("requests timeout", requests.exceptions.ReadTimeout("read timed out"), "timeout"),
+    ("httpx connect error", httpx.ConnectError("connection refused"), "connection"),
+    ("deadline", DeadlineExceededError("deadline of 30 seconds exceeded"), "deadline"),
+    ("unrelated exception", ValueError("bad value"), None),
+]
+
+
+@pytest.mark.parametrize("error, expected", [case[1:] for case in CASES], ids=[case[0] for case in CASES])
+def test_classify(error, expected):
+    assert ErrorParser.classify(error) == expected
+
+
+class Log:
+    def log_events(self, *args, **kwargs):
+        pass
+
+
+@pytest.mark.parametrize("error, retried", [
+    (openai_error(400, {"message": "maximum context length is 8192 tokens", "code": "context_length_exceeded"}), False),
+    (openai_error(401, {"message": "Incorrect API key provided", "code": "invalid_api_key"}), False),
+    (openai_error(429, {"message": "You exceeded your current quota", "code": "insufficient_quota"}), False),
+    (openai_error(429, {"message": "Rate limit reached", "code": "rate_limit_exceeded"}), True),
+    (anthropic_error(529, "overloaded_error", "Overloaded"), True),
+    (http_error(503, {"error": {"message": "invalid model state"}}), True),
+    (httpx.ConnectError("connection refused"), True),
+])
+def test_default_policy(error, retried):
+    assert RetryHandler(RetryConfig(), Log()).should_retry(error) is retried
+
+
+def test_policy_overrides_per_service():
+    missing = http_error(404)
+    assert RetryHandler(RetryConfig(), Log()).should_retry(missing) is False
+    assert RetryHandler(RetryConfig(error_policy={"not_found": "retry"}), Log()).should_retry(missing) is True
+
+
+def test_ollama_missing_model_fails_fast(monkeypatch):
+    monkeypatch.setattr(ImportedSgltn, "_instance",
+                        types.SimpleNamespace(cfig=types.SimpleNamespace(get_setting=lambda name, default=None: {})))
+    config = RetryConfigFactory.create_config(RequestMode.OLLAMA)
+    not_pulled = http_error(404, {"error": "model \"llama3\" not found, try pulling it first"})
+    assert RetryHandler(config, Log()).should_retry(not_pulled) is False
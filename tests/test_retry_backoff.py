@@ -0,0 +1,106 @@
+"""RetryHandler backoff on a fake clock: jitter spreads throttled workers out, server waits are honoured and capped"""
+import random
+import statistics
+
+import pytest
+
+for _module in ("torch", "requests", "httpx", "openai", "anthropic", "PIL"):
+    pytest.importorskip(_module)
+
+import httpx
+
+from plush.api_requests import RetryConfig, RetryHandler, RetryExhaustedError
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+WORKERS = 50
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Log:
+    def log_events(self, *args, **kwargs):
+        pass
+
+
+def throttled(headers=None):
+    return httpx.Response(429, headers=headers or {}, request=REQUEST)
+
+
+def ok():
+    return httpx.Response(200, json={"choices": []}, request=REQUEST)
+
+
+def run_worker(seed, first_response, **config):
+    """One worker that's throttled once then succeeds, returns the fake time its retry went out"""
+    clock = FakeClock()
+    handler = RetryHandler(RetryConfig(**config), Log(), sleep=clock.sleep, rng=random.Random(seed))
+    replies = iter([first_response, ok()])
+    sent_at = []
+
+    def send():
+        sent_at.append(clock.now)
+        return next(replies)
+
+    assert handler.execute_with_retry(send).status_code == 200
+    return sent_at[1]
+
+
+def test_throttled_workers_spread_their_retries():
+    retries = [run_worker(seed, throttled(), base_delay=1.0, max_delay=10.0) for seed in range(WORKERS)]
+    assert all(0.0 <= retry <= 1.0 for retry in retries)
+    assert len({round(retry, 3) for retry in retries}) > WORKERS * 0.9
+    assert statistics.pstdev(retries) > 0.2
+
+
+def test_without_jitter_workers_retry_together():
+    retries = [run_worker(seed, throttled(), base_delay=1.0, jitter="none") for seed in range(WORKERS)]
+    assert set(retries) == {1.0}
+
+
+def test_retry_after_is_honoured_with_jitter():
+    retries = [run_worker(seed, throttled({"retry-after": "5"}), base_delay=1.0) for seed in range(WORKERS)]
+    assert all(5.0 <= retry <= 6.0 for retry in retries)
+    assert statistics.pstdev(retries) > 0.1
+
+
+def test_retry_after_ms():
+    retry = run_worker(0, throttled({"retry-after-ms": "1500"}), base_delay=0.5)
+    assert 1.5 <= retry <= 2.0
+
+
+@pytest.mark.parametrize("headers, wait", [
+    ({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "6s"}, 6.0),
+    ({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "1m30s",
+      "x-ratelimit-remaining-requests": "12", "x-ratelimit-reset-requests": "400ms"}, 60.0),
+    ({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "750ms"}, 0.75),
+])
+def test_rate_limit_reset_headers(headers, wait):
+    retry = run_worker(0, throttled(headers), base_delay=1.0, max_retry_after=60.0)
+    assert wait <= retry <= wait + 1.0
+
+
+def test_server_wait_is_capped():
+    retry = run_worker(0, throttled({"retry-after": "600"}), base_delay=1.0, max_retry_after=30.0)
+    assert 30.0 <= retry <= 31.0
+
+
+def test_server_wait_ignored_when_disabled():
+    retry = run_worker(0, throttled({"retry-after": "600"}), base_delay=1.0, respect_retry_after=False)
+    assert retry <= 1.0
+
+
+def test_backoff_grows_and_is_capped():
+    clock = FakeClock()
+    handler = RetryHandler(RetryConfig(max_retries=6, base_delay=1.0, max_delay=8.0, jitter="none"), Log(),
+                           sleep=clock.sleep, rng=random.Random(0))
+    with pytest.raises(RetryExhaustedError):
+        handler.execute_with_retry(throttled)
+    assert clock.sleeps == [1.0, 2.0, 4.0, 8.0, 8.0]
@@ -0,0 +1,77 @@
+"""RequestSchedulerSgltn gives a lane slot back when a waiting request is cancelled"""
+import threading
+import time
+import types
+
+import pytest
+
+for _module in ("torch", "requests", "httpx", "openai", "anthropic", "PIL"):
+    pytest.importorskip(_module)
+
+from plush.api_requests import ImportedSgltn, Interruption, RequestInterruptedError, RequestSchedulerSgltn
+
+
+class InterruptProcessingException(Exception):
+    """Stands in for ComfyUI's exception, which isn't the RequestInterruptedError a cancel_scope() raises"""
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(ImportedSgltn, "_instance",
+                        types.SimpleNamespace(cfig=types.SimpleNamespace(get_setting=lambda name, default=None: {})))
+    monkeypatch.setattr(RequestSchedulerSgltn, "_instance", None)
+    monkeypatch.setattr(Interruption, "ERROR", InterruptProcessingException)
+    return RequestSchedulerSgltn()
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.01)
+
+
+def test_cancelled_scope_gives_up_its_place_in_a_full_lane(scheduler):
+    holder = scheduler.acquire("OLLAMA")
+    assert scheduler.lane_limit("OLLAMA") == 1
+
+    cancel = threading.Event()
+    raised = []
+
+    def hedge_copy():
+        with Interruption.cancel_scope(cancel):
+            try:
+                scheduler.acquire("OLLAMA")
+            except Exception as e:  # pylint: disable=broad-except
+                raised.append(e)
+
+    waiter = threading.Thread(target=hedge_copy)
+    waiter.start()
+    wait_for(lambda: scheduler.service_load("OLLAMA")["queued"] == 1)
+    cancel.set()
+    waiter.join(5)
+
+    assert len(raised) == 1 and isinstance(raised[0], RequestInterruptedError)
+    scheduler.release(holder)
+    load = scheduler.service_load("OLLAMA")
+    assert (load["active"], load["queued"]) == (0, 0)
+
+    ticket = scheduler.acquire("OLLAMA")
+    assert ticket.granted
+    scheduler.release(ticket)
+    assert scheduler.service_load("OLLAMA")["active"] == 0
+
+
+def test_slot_granted_while_cancelling_is_released(scheduler, monkeypatch):
+    holder = scheduler.acquire("OLLAMA")
+
+    def granted_then_cancelled(ticket, timeout=None):
+        scheduler.release(holder)  # The slot is handed to the waiting ticket ...
+        assert ticket.granted
+        raise RequestInterruptedError("Request cancelled")  # ... just as its scope is cancelled
+
+    monkeypatch.setattr("plush.api_requests.SchedulerTicket.wait", granted_then_cancelled)
+    with pytest.raises(RequestInterruptedError):
+        scheduler.acquire("OLLAMA")
+    load = scheduler.service_load("OLLAMA")
+    assert (load["active"], load["queued"]) == (0, 0)
@@ -1,8 +1,17 @@
 import requests   
+import socket
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from enum import Enum
-from requests.adapters import HTTPAdapter, Retry 
+from urllib.parse import urlparse, urlunparse
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 #from typing import Optional
 from .mng_json import json_manager, TroubleSgltn 
+import httpx
+from openai import OpenAI, DefaultHttpxClient
 from io import BytesIO
 from PIL import Image, ImageOps
 import torch
@@ -14,50 +23,625 @@ class ImageFormat(Enum):
     BYTE_IMAGE = "byte-image"  # Raw byte image (JPEG/PNG)
     UNKNOWN = "unknown"  # Neither base64 nor raw image
 
-class CommUtils:
+class ConnectionTracker:
+    """
+    Records which thread has each pooled connection checked out so a blocked request can be aborted from
+    another thread: shutting the connection's socket down makes the worker's pending read fail at once.
+    """
+    _owners = weakref.WeakKeyDictionary()  # connection: ident of the thread using it
+    _lock = threading.Lock()
+
+    @classmethod
+    def checked_out(cls, conn)->None:
+        if conn is not None:
+            with cls._lock:
+                cls._owners[conn] = threading.get_ident()
+
+    @classmethod
+    def returned(cls, conn)->None:
+        if conn is not None:
+            with cls._lock:
+                cls._owners.pop(conn, None)
+
+    @classmethod
+    def abort(cls, thread_id:int)->int:
+        """Shuts down the sockets of the connections thread_id has checked out, returns how many"""
+        with cls._lock:
+            conns = [conn for conn, owner in cls._owners.items() if owner == thread_id]
+        aborted = 0
+        for conn in conns:
+            sock = getattr(conn, 'sock', None)
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+                aborted += 1
+            except OSError:
+                pass #Already closed
+        return aborted
+
+
+class _TrackedPoolMixin:
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        ConnectionTracker.checked_out(conn)
+        return conn
+
+    def _put_conn(self, conn):
+        ConnectionTracker.returned(conn)
+        return super()._put_conn(conn)
+
+
+class _TrackedHTTPConnectionPool(_TrackedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _TrackedHTTPSConnectionPool(_TrackedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class AbortableHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections are recorded in ConnectionTracker so in-flight requests can be aborted"""
+    def init_poolmanager(self, *args, **kwargs)->None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TrackedHTTPConnectionPool,
+                                                   "https": _TrackedHTTPSConnectionPool}
+
+
+class TransportSgltn:
+    """
+    Singleton that owns the process-wide pooled keep-alive requests.Session.
+    All Plush http(s) traffic: completions, health checks and model fetches go through
+    this session so repeated calls to the same host reuse an open connection instead of
+    paying for a new TCP connection (and TLS handshake) on every request.
+    Pool settings come from the 'http_transport' section of config.json.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    DEFAULTS = {
+        "pool_connections": 10,     # Number of per-host pools kept open
+        "pool_maxsize": 16,         # Max connections kept alive per host
+        "pool_block": False,        # Block when a host's pool is exhausted rather than opening overflow connections
+        "keep_alive": True,
+        "warm_up": True,            # Open connections to known endpoints at startup
+        "warm_up_timeout": 2
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
     def __init__(self)->None:
-        self.j_mngr = json_manager()        
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self._settings = dict(self.DEFAULTS)
+        self._session = None
+        self._build_session()
 
-    def is_lm_server_up(self, endpoint:str, comm_retries:int=2, timeout:int=4):  #should be util in api_requests.py
+    def _build_session(self)->None:
         session = requests.Session()
-        retries = Retry(total=comm_retries, backoff_factor=0, status_forcelist=[500, 502, 503, 504])
-        session.mount('http://', HTTPAdapter(max_retries=retries))
-        try:
-            response = session.head(endpoint, timeout=timeout)  # Use HEAD to minimize data transfer            
-            if 200 <= response.status_code <= 300:
-                self.write_url(endpoint) #Save url to a text file
-                self.j_mngr.log_events(f"Local LLM Server is running with status code: {response.status_code}",
-                              TroubleSgltn.Severity.INFO,
-                              True)
+        adapter = AbortableHTTPAdapter(pool_connections=int(self._settings['pool_connections']),
+                              pool_maxsize=int(self._settings['pool_maxsize']),
+                              pool_block=bool(self._settings['pool_block']),
+                              max_retries=0) #Retries are handled by the callers
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({"Connection": "keep-alive" if self._settings['keep_alive'] else "close"})
+
+        # The old session may still be in use on other threads, it's left to close when no longer referenced
+        self._session = session
+
+    def configure(self, settings:dict|None)->None:
+        """
+        Applies user settings (the 'http_transport' section of config.json) and rebuilds
+        the session if they differ from the current ones.
+        """
+        if not isinstance(settings, dict):
+            return
+        new_settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+        if new_settings != self._settings:
+            self._settings = new_settings
+            self._build_session()
+            self.j_mngr.log_events(f"Http transport configured with: {self._settings}")
+
+    @property
+    def session(self)->requests.Session:
+        return self._session
+
+    @property
+    def settings(self)->dict:
+        return dict(self._settings)
+
+    @staticmethod
+    def abort(thread_id:int)->int:
+        """Aborts the request the thread thread_id is making through the session, if any"""
+        return ConnectionTracker.abort(thread_id)
+
+    @staticmethod
+    def base_url(url:str)->str:
+        """Returns only the scheme and host portion of a url, e.g.: http://localhost:11434/"""
+        parsed_url = urlparse(url or "")
+        if not parsed_url.scheme or not parsed_url.netloc:
+            return ""
+        return urlunparse((parsed_url.scheme, parsed_url.netloc, '/', '', '', ''))
+
+    def warm_up(self, urls:list)->None:
+        """
+        Opens pooled connections to each distinct host in urls on a background thread
+        so the first real request doesn't pay for connection setup.
+        """
+        if not self._settings['warm_up']:
+            return
+        hosts = list(dict.fromkeys(self.base_url(url) for url in urls if url))
+        hosts = [host for host in hosts if host]
+        if not hosts:
+            return
+
+        def _warm():
+            for host in hosts:
+                try:
+                    self._session.head(host, timeout=self._settings['warm_up_timeout'])
+                except requests.RequestException:
+                    pass #Server isn't up, nothing to warm
+
+        threading.Thread(target=_warm, name="plush-transport-warmup", daemon=True).start()
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker for a single endpoint.
+    Closed: requests flow normally and consecutive endpoint failures are counted.
+    Open: after failure_threshold consecutive failures requests are refused immediately
+          for recovery_timeout seconds.
+    Half-open: once the timeout has elapsed a single probe request is let through, its
+          outcome either closes the breaker or opens it for another recovery_timeout.
+    """
+    class State(Enum):
+        CLOSED = "closed"
+        OPEN = "open"
+        HALF_OPEN = "half-open"
+
+    def __init__(self, name:str, failure_threshold:int=3, recovery_timeout:float=30.0, clock=time.monotonic)->None:
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_timeout = float(recovery_timeout)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.State.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.j_mngr = json_manager()
+
+    @property
+    def state(self)->'CircuitBreaker.State':
+        return self._state
+
+    @property
+    def retry_in(self)->float:
+        """Seconds until an open breaker will let a probe through, 0 if it isn't open"""
+        if self._state != self.State.OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (self._clock() - self._opened_at))
+
+    @property
+    def is_open(self)->bool:
+        """True while requests to the endpoint are being refused"""
+        with self._lock:
+            if self._state == self.State.OPEN:
+                return self.retry_in > 0
+            return self._state == self.State.HALF_OPEN and self._probe_in_flight
+
+    def allow_request(self)->bool:
+        """Returns True if a request may be sent now.  Moves an expired open breaker to half-open."""
+        with self._lock:
+            if self._state == self.State.CLOSED:
                 return True
+            if self._state == self.State.OPEN:
+                if self.retry_in > 0:
+                    return False
+                self._set_state(self.State.HALF_OPEN, "sending a probe request")
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self)->None:
+        """The endpoint answered; any open or half-open breaker closes"""
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != self.State.CLOSED:
+                self._set_state(self.State.CLOSED, "endpoint has recovered")
+
+    def release_probe(self)->None:
+        """The call ended without showing whether the endpoint works (e.g. it was cancelled), another probe may go"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self)->None:
+        """The endpoint was unreachable, timed out or returned a server error"""
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.State.HALF_OPEN:
+                self._open("probe request failed")
+            elif self._state == self.State.CLOSED and self._failures >= self.failure_threshold:
+                self._open(f"{self._failures} consecutive failures")
+
+    def _open(self, reason:str)->None:
+        self._opened_at = self._clock()
+        self._set_state(self.State.OPEN,
+                        f"{reason}, requests will be refused for {self.recovery_timeout:g} seconds")
+
+    def _set_state(self, state:'CircuitBreaker.State', reason:str)->None:
+        self._state = state
+        severity = TroubleSgltn.Severity.WARNING if state == self.State.OPEN else TroubleSgltn.Severity.INFO
+        self.j_mngr.log_events(f"Circuit breaker for {self.name} is {state.value.upper()}: {reason}.",
+                               severity,
+                               True)
+
+
+class CircuitBreakerSgltn:
+    """
+    Singleton registry of CircuitBreakers keyed by service (RequestMode name) and base url, so a
+    local server that is down fails fast instead of every queued node waiting out its timeouts and
+    retry schedule.  Thresholds come from the 'circuit_breaker' section of config.json.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    DEFAULTS = {
+        "enabled": True,
+        "failure_threshold": 3,     # Consecutive failed requests before the breaker opens
+        "recovery_timeout": 30      # Seconds an open breaker refuses requests before sending a probe
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self)->None:
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self._settings = dict(self.DEFAULTS)
+        self._breakers = {}
+        self._registry_lock = threading.Lock()
+
+    def configure(self, settings:dict|None)->None:
+        """Applies user settings (the 'circuit_breaker' section of config.json) to new and existing breakers"""
+        if not isinstance(settings, dict):
+            return
+        self._settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+        with self._registry_lock:
+            for breaker in self._breakers.values():
+                breaker.failure_threshold = max(1, int(self._settings['failure_threshold']))
+                breaker.recovery_timeout = float(self._settings['recovery_timeout'])
+
+    @property
+    def enabled(self)->bool:
+        return bool(self._settings['enabled'])
+
+    def get(self, service:str, url:str="")->CircuitBreaker|None:
+        """Returns the breaker for service + the base of url, or None if circuit breaking is disabled"""
+        if not self.enabled:
+            return None
+        base = TransportSgltn.base_url(url)
+        key = (service, base)
+        with self._registry_lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(f"{service} {base}".strip(),
+                                         self._settings['failure_threshold'],
+                                         self._settings['recovery_timeout'])
+                self._breakers[key] = breaker
+        return breaker
+
+    def states(self)->dict:
+        """Current state of every known breaker, by name"""
+        with self._registry_lock:
+            return {breaker.name: breaker.state.value for breaker in self._breakers.values()}
+
+
+class EndpointHealth:
+    """Health table entry for one endpoint"""
+    def __init__(self, url:str)->None:
+        self.url = url
+        self.healthy = None         # None until the endpoint has been probed or used
+        self.checked_at = 0.0
+        self.last_used = time.monotonic()
+        self.latency = None         # Seconds taken by the last successful probe
+        self.failures = 0           # Consecutive failed probes/requests
+        self.source = ""            # "probe" or "request"
+
+
+class HealthProberSgltn:
+    """
+    Singleton that keeps a health table for the local/remote endpoints Plush talks to.
+    A background thread probes each watched endpoint (HEAD on its base url, any http answer counts as up)
+    every 'interval' seconds, and the outcomes of real requests update the table as they happen, so the
+    request path only reads cached state instead of paying for a health check round trip.
+    Endpoints not used for 'forget_after' seconds stop being probed.
+    Settings come from the 'health_prober' section of config.json.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    DEFAULTS = {
+        "enabled": True,
+        "interval": 15,         # Seconds between probes of an endpoint
+        "timeout": 2,           # Probe timeout in seconds
+        "forget_after": 600     # Stop probing endpoints unused for this many seconds
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self)->None:
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self.transport = TransportSgltn()
+        self._settings = dict(self.DEFAULTS)
+        self._table = {}
+        self._table_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def configure(self, settings:dict|None)->None:
+        """Applies user settings (the 'health_prober' section of config.json)"""
+        if not isinstance(settings, dict):
+            return
+        self._settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+
+    @property
+    def enabled(self)->bool:
+        return bool(self._settings['enabled'])
+
+    def watch(self, url:str)->None:
+        """Adds url's endpoint to the health table (if needed) and makes sure the prober is running"""
+        base = TransportSgltn.base_url(url)
+        if not base or not self.enabled:
+            return
+        with self._table_lock:
+            entry = self._table.get(base)
+            if entry is None:
+                self._table[base] = EndpointHealth(base)
+                self._wake.set() #Probe the new endpoint right away
             else:
-                self.j_mngr.log_events(f"Server returned response code: {response.status_code}",
-                                       TroubleSgltn.Severity.INFO,
-                                       True)
-                return True
+                entry.last_used = time.monotonic()
+        self._start()
+
+    def is_healthy(self, url:str)->bool|None:
+        """Cached health of url's endpoint: True/False, or None if it's not known yet"""
+        entry = self._table.get(TransportSgltn.base_url(url))
+        return entry.healthy if entry else None
+
+    def record(self, url:str, ok:bool)->None:
+        """Updates a watched endpoint's entry from the outcome of a real request to url"""
+        with self._table_lock:
+            entry = self._table.get(TransportSgltn.base_url(url))
+            if entry is None:
+                return
+            entry.last_used = time.monotonic()
+        self._update(entry, ok, "request")
+
+    def snapshot(self)->dict:
+        """The health table as plain data"""
+        with self._table_lock:
+            entries = list(self._table.values())
+        return {entry.url: {"healthy": entry.healthy,
+                            "latency": entry.latency,
+                            "failures": entry.failures,
+                            "source": entry.source} for entry in entries}
+
+    def _update(self, entry:EndpointHealth, ok:bool, source:str, latency:float|None=None)->None:
+        changed = entry.healthy is not None and entry.healthy != ok
+        entry.healthy = ok
+        entry.checked_at = time.monotonic()
+        entry.source = source
+        entry.failures = 0 if ok else entry.failures + 1
+        if latency is not None:
+            entry.latency = latency
+        if changed:
+            self.j_mngr.log_events(f"Endpoint {entry.url} is now {'up' if ok else 'down'} (from {source}).",
+                                   TroubleSgltn.Severity.INFO if ok else TroubleSgltn.Severity.WARNING,
+                                   True)
+
+    def probe(self, entry:EndpointHealth)->None:
+        started = time.monotonic()
+        try:
+            self.transport.session.head(entry.url, timeout=self._settings['timeout'])
+        except requests.RequestException:
+            self._update(entry, False, "probe")
+            return
+        self._update(entry, True, "probe", time.monotonic() - started)
+
+    def _start(self)->None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="plush-health-prober", daemon=True)
+                self._thread.start()
+
+    def _run(self)->None:
+        while True:
+            now = time.monotonic()
+            interval = float(self._settings['interval'])
+            with self._table_lock:
+                for base in [b for b, e in self._table.items() if now - e.last_used > self._settings['forget_after']]:
+                    del self._table[base]
+                due = [e for e in self._table.values() if now - e.checked_at >= interval]
+            for entry in due:
+                self.probe(entry)
+            self._wake.wait(interval)
+            self._wake.clear()
+
+
+class ClientPoolSgltn:
+    """
+    Singleton pool of OpenAI API objects keyed by (base_url, api key, service).  Switching between
+    services (e.g. Groq and a local server) reuses the client, and its open connections, built the
+    first time instead of rebuilding it on every change.  Each client gets its own bounded httpx
+    connection pool.  The pool holds at most max_clients clients and closes clients idle longer
+    than idle_seconds.  Settings come from the 'client_pool' section of config.json.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    DEFAULTS = {
+        "max_clients": 8,
+        "idle_seconds": 900,            # Clients unused for this long are closed
+        "max_connections": 16,          # Per client httpx limits
+        "max_keepalive_connections": 8,
+        "keepalive_expiry": 30
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
 
-        except requests.RequestException as e:            
-            self.j_mngr.log_events(f"Local LLM Server is not running: {e}",
-                              TroubleSgltn.Severity.WARNING,
-                              True)
+    def __init__(self)->None:
+        if self._initialized: #pylint: disable=access-member-before-definition
+            return
+        self._initialized = True
+        self.j_mngr = json_manager()
+        self._settings = dict(self.DEFAULTS)
+        self._clients = OrderedDict()  # key: [client, last_used]
+        self._pool_lock = threading.Lock()
+
+    def configure(self, settings:dict|None)->None:
+        """Applies user settings (the 'client_pool' section of config.json) to clients built from now on"""
+        if not isinstance(settings, dict):
+            return
+        self._settings = {**self.DEFAULTS, **{k: v for k, v in settings.items() if k in self.DEFAULTS}}
+
+    @staticmethod
+    def _key(base_url:str, api_key:str, service:str)->tuple:
+        return (base_url or "", api_key or "", service or "")
+
+    def _build(self, base_url:str, api_key:str)->OpenAI:
+        limits = httpx.Limits(max_connections=int(self._settings['max_connections']),
+                              max_keepalive_connections=int(self._settings['max_keepalive_connections']),
+                              keepalive_expiry=float(self._settings['keepalive_expiry']))
+        return OpenAI(base_url=base_url or None, api_key=api_key, http_client=DefaultHttpxClient(limits=limits))
+
+    def contains(self, base_url:str, api_key:str, service:str)->bool:
+        """True if a client for this key is already built (warm)"""
+        with self._pool_lock:
+            return self._key(base_url, api_key, service) in self._clients
+
+    def get(self, base_url:str, api_key:str, service:str)->OpenAI:
+        """Returns the pooled client for base_url, api_key and service, building it if necessary"""
+        key = self._key(base_url, api_key, service)
+        now = time.monotonic()
+        with self._pool_lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = [self._build(base_url, api_key), now]
+                self._clients[key] = entry
+                self.j_mngr.log_events(f"Created pooled {service} client for: {base_url or 'default url'}",
+                                       is_trouble=True)
+            entry[1] = now
+            self._clients.move_to_end(key)
+            self._evict(now)
+            return entry[0]
+
+    def _evict(self, now:float)->None:
+        idle_seconds = float(self._settings['idle_seconds'])
+        for key in [k for k, (_, last_used) in self._clients.items() if now - last_used > idle_seconds]:
+            client, _ = self._clients.pop(key)
+            try:
+                client.close()
+            except Exception: #pylint: disable=broad-except
+                pass
+        # Over capacity clients were used recently and may still be serving a request on another
+        # thread, so they're only dropped from the pool and left to close when no longer referenced
+        while len(self._clients) > max(1, int(self._settings['max_clients'])):
+            self._clients.popitem(last=False)
+
+
+class CommUtils:
+    def __init__(self)->None:
+        self.j_mngr = json_manager()
+        self.transport = TransportSgltn()
+
+    def is_lm_server_up(self, endpoint:str, comm_retries:int=2, timeout:int=4):  #should be util in api_requests.py
+        session = self.transport.session
+        for attempt in range(comm_retries + 1):
+            try:
+                response = session.head(endpoint, timeout=timeout)  # Use HEAD to minimize data transfer
+                if response.status_code in (500, 502, 503, 504):
+                    if attempt < comm_retries:
+                        continue
+                    self.j_mngr.log_events(f"Local LLM Server is not available, status code: {response.status_code}",
+                                           TroubleSgltn.Severity.WARNING,
+                                           True)
+                    return False
+                if 200 <= response.status_code <= 300:
+                    self.write_url(endpoint) #Save url to a text file
+                    self.j_mngr.log_events(f"Local LLM Server is running with status code: {response.status_code}",
+                                  TroubleSgltn.Severity.INFO,
+                                  True)
+                    return True
+                else:
+                    self.j_mngr.log_events(f"Server returned response code: {response.status_code}",
+                                           TroubleSgltn.Severity.INFO,
+                                           True)
+                    return True
+
+            except requests.RequestException as e:
+                if attempt < comm_retries:
+                    continue
+                self.j_mngr.log_events(f"Local LLM Server is not running: {e}",
+                                  TroubleSgltn.Severity.WARNING,
+                                  True)
         return False  
     
     def get_data(self, endpoint:str="", timeout:int=8, retries:int=1, data_type:str="" )-> requests.Response | None:
-        session = requests.Session()
-        gretries = Retry(total=retries, backoff_factor=0, status_forcelist=[500, 502, 503, 504])
-        session.mount('http://', HTTPAdapter(max_retries=gretries))
+        session = self.transport.session
         stat_code = 0
-        try:
-            response = session.get(endpoint, timeout=timeout)
-            stat_code = response.status_code
-            response.raise_for_status()  # Raises an HTTPError if the response status code indicates an error
-            return response
-
-        except requests.RequestException as e:
-            self.j_mngr.log_events(f"Unable to fetch data for: {data_type}.  Server returned code: {stat_code}. Error: {e} ",
-            TroubleSgltn.Severity.WARNING,
-            True)
-            return None
+        for attempt in range(retries + 1):
+            try:
+                response = session.get(endpoint, timeout=timeout)
+                stat_code = response.status_code
+                if stat_code in (500, 502, 503, 504) and attempt < retries:
+                    continue
+                response.raise_for_status()  # Raises an HTTPError if the response status code indicates an error
+                return response
+
+            except requests.RequestException as e:
+                if attempt < retries and not isinstance(e, requests.HTTPError):
+                    continue
+                self.j_mngr.log_events(f"Unable to fetch data for: {data_type}.  Server returned code: {stat_code}. Error: {e} ",
+                TroubleSgltn.Severity.WARNING,
+                True)
+                return None
+        return None
         
     def write_url(self, url:str) -> bool:
         # Save the current open source url for startup retrieval of models
@@ -153,6 +737,34 @@ class ImageUtils:
         return tensor_image, mask
     
 
+    def b64_image_shape(self, b64_image: str) -> tuple[int, int]:
+        """(height, width) of a base64-encoded image, as b64_into_tensor() would decode it"""
+        image = ImageOps.exif_transpose(Image.open(BytesIO(base64.b64decode(b64_image))))
+        return image.height, image.width
+
+    def b64_into_tensor(self, b64_image: str, out: torch.Tensor) -> bool:
+        """
+        Decodes a base64-encoded image directly into out, one preallocated [H, W, 3] float slot of
+        a batch tensor, so batches can be assembled without building and concatenating per image tensors.
+
+        Args:
+            b64_image (str): The b64 image to decode.
+            out (torch.Tensor): The [H, W, 3] float32 tensor that receives the normalized RGB image.
+
+        Returns:
+            bool: True if the image was decoded into out, False if its size didn't match out's.
+        """
+        image = Image.open(BytesIO(base64.b64decode(b64_image)))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        if (image.height, image.width) != tuple(out.shape[:2]):
+            self.j_mngr.log_events(f"Image size {image.width}x{image.height} doesn't match the batch size {out.shape[1]}x{out.shape[0]}",
+                                   TroubleSgltn.Severity.WARNING,
+                                   True)
+            return False
+        out.copy_(torch.from_numpy(np.array(image)))  # uint8 -> float32 conversion happens in the copy
+        out.div_(255.0)
+        return True
+
     def tensor_to_base64(self, tensor: torch.Tensor) -> str:
         """
         Converts a PyTorch tensor to a base64-encoded image.